@@ -1,9 +1,11 @@
 import telebot
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 import random
 from telebot import types
 import os
+import json
 from collections import defaultdict
 
 # Bot token - replace with your actual bot token
@@ -35,16 +37,72 @@ CATEGORY_NAMES_RU = {
 
 # Prices are already in tenge
 
+# Clustered dataset: .parquet, or the older .csv.gz export
+BOOKS_DATA_PATH = r"C:\Users\User\Desktop\DATA SCIENCE\Github\flip_book\data\flip_books_data_embeded_clustered.parquet"
+
+# The bot only needs these columns, not the ~800 embedding columns
+BOOK_COLUMNS = ['title', 'price_original', 'discount', 'description', 'windows_image_path', 'category',
+                'kmeans21_cluster', 'book_url']
+# Read when the export has them; older exports get defaults in load_flip_books_data
+OPTIONAL_BOOK_COLUMNS = ['categories', 'image_available', 'publisher_code']
+
+# Publisher and binding code book from the cleaning stage (flip_book_data_codes.py)
+CODES_PATH = r"C:\Users\User\Desktop\DATA SCIENCE\Github\flip_book\data\flip_books_data_cleaned_codes.jsonl"
+
+# Near-identical cover groups from flip_book_data_cover_hash.py, written next to the cleaned dataset
+COVER_HASHES_PATH = r"C:\Users\User\Desktop\DATA SCIENCE\Github\flip_book\data\flip_books_data_cleaned_cover_hashes.parquet"
+
 # Load the embedded flip books data
 def load_flip_books_data():
     """
     Load your flip_books_data_embedded here
     """
-    data = pd.read_csv(r"C:\Users\User\Desktop\DATA SCIENCE\Github\flip_book\data\flip_books_data_embeded_clustered.csv.gz")
-    return pd.DataFrame(data)
+    if BOOKS_DATA_PATH.endswith('.parquet'):
+        available = pq.read_schema(BOOKS_DATA_PATH).names
+        columns = BOOK_COLUMNS + [column for column in OPTIONAL_BOOK_COLUMNS if column in available]
+        data = pd.read_parquet(BOOKS_DATA_PATH, columns=columns)
+    else:
+        available = pd.read_csv(BOOKS_DATA_PATH, nrows=0).columns
+        columns = BOOK_COLUMNS + [column for column in OPTIONAL_BOOK_COLUMNS if column in available]
+        data = pd.read_csv(BOOKS_DATA_PATH, usecols=columns)
+    data = pd.DataFrame(data)
+    if 'categories' not in data:
+        # Exports from before deduplication have one category per row
+        data['categories'] = data['category']
+    if 'image_available' not in data:
+        # Exports from before the cleaning stage recorded covers: check each file once here
+        data['image_available'] = data['windows_image_path'].map(
+            lambda path: isinstance(path, str) and os.path.exists(path))
+    if 'publisher_code' not in data:
+        # No code book codes; the publisher line is left out
+        data['publisher_code'] = -1
+    # Without cover hashes every book is its own cover group
+    data['cover_group'] = np.arange(len(data))
+    if os.path.exists(COVER_HASHES_PATH):
+        covers = pd.read_parquet(COVER_HASHES_PATH, columns=['book_url', 'cover_group'])
+        groups = covers.drop_duplicates('book_url').set_index('book_url')['cover_group']
+        known = data['book_url'].map(groups)
+        # Cover groups are row numbers of the cleaned table; keep unknown books apart from them
+        data['cover_group'] = known.fillna(data['cover_group'] + len(covers)).astype(np.int64)
+    return data
+
+def load_code_names(column):
+    """Names by code for one column of the code book; codes never change once written"""
+    names = {}
+    if os.path.exists(CODES_PATH):
+        with open(CODES_PATH, encoding='utf-8') as codes_file:
+            for line in codes_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry['column'] == column:
+                    names[entry['code']] = entry['value']
+    return names
 
 # Load data
 books_df = load_flip_books_data()
+publisher_names = load_code_names('publisher')
 
 def format_price_with_discount(price_kzt, discount):
     """Format price with discount in tenge"""
@@ -85,22 +143,32 @@ def create_book_action_keyboard():
     
     return keyboard
 
-def get_random_book_from_category(category):
-    """Get a random book from specified category"""
-    category_books = books_df[books_df['category'] == category]
-    if len(category_books) == 0:
+def sample_book(candidates, previous_book=None):
+    """Pick a random book, avoiding a cover that looks like the previous one when possible"""
+    if previous_book is not None:
+        different = candidates[candidates['cover_group'] != previous_book['cover_group']]
+        if len(different) > 0:
+            candidates = different
+    if len(candidates) == 0:
         return None
-    return category_books.sample(n=1).iloc[0]
+    return candidates.sample(n=1).iloc[0]
+
+def in_category(category):
+    """Rows listing the category; a book found in several categories is offered in each"""
+    return books_df['categories'].str.split('|').map(lambda names: category in names).astype(bool)
+
+def get_random_book_from_category(category, previous_book=None):
+    """Get a random book from specified category"""
+    category_books = books_df[in_category(category)]
+    return sample_book(category_books, previous_book)
 
-def get_similar_books(category, cluster_id):
+def get_similar_books(category, cluster_id, previous_book=None):
     """Get books from same category and cluster"""
     similar_books = books_df[
-        (books_df['category'] == category) & 
+        in_category(category) & 
         (books_df['kmeans21_cluster'] == cluster_id)
     ]
-    if len(similar_books) == 0:
-        return None
-    return similar_books.sample(n=1).iloc[0]
+    return sample_book(similar_books, previous_book)
 
 def send_book_info(chat_id, book):
     """Send book information to user"""
@@ -115,13 +183,16 @@ def send_book_info(chat_id, book):
     message = f"📖 *{title}*\n\n"
     message += f"💰 Цена: {formatted_price}\n\n"
     message += f"📝 Описание: {description}\n\n"
+    publisher = publisher_names.get(int(book['publisher_code']))
+    if publisher and publisher != 'unknown':
+        message += f"🏢 Издательство: {publisher}\n\n"
     message += f"📂 Категория: {CATEGORY_NAMES_RU[book['category']]}"
     
     keyboard = create_book_action_keyboard()
     
-    # Try to send image if path exists
+    # Try to send image if the cleaning stage found it
     try:
-        if os.path.exists(image_path):
+        if book['image_available']:
             with open(image_path, 'rb') as photo:
                 sent_message = bot.send_photo(
                     chat_id,
@@ -249,7 +320,7 @@ def handle_like(call):
     cluster_id = current_book['kmeans21_cluster']
     
     # Get similar book
-    similar_book = get_similar_books(category, cluster_id)
+    similar_book = get_similar_books(category, cluster_id, current_book)
     
     if similar_book is not None:
         user_states[user_id]['current_book'] = similar_book
@@ -257,7 +328,7 @@ def handle_like(call):
         send_book_info(chat_id, similar_book)
     else:
         # Fallback to random if no similar books
-        random_book = get_random_book_from_category(category)
+        random_book = get_random_book_from_category(category, current_book)
         if random_book is not None:
             user_states[user_id]['current_book'] = random_book
             user_states[user_id]['mode'] = 'random'
@@ -281,6 +352,7 @@ def handle_dislike(call):
     
     category = user_states[user_id]['category']
     current_mode = user_states[user_id]['mode']
+    current_book = user_states[user_id].get('current_book')
     
     # Check if user disliked 5 times in a row
     if user_dislikes[user_id] >= 5:
@@ -289,7 +361,7 @@ def handle_dislike(call):
         user_states[user_id]['current_cluster'] = None
         user_dislikes[user_id] = 0
         
-        random_book = get_random_book_from_category(category)
+        random_book = get_random_book_from_category(category, current_book)
         if random_book is not None:
             user_states[user_id]['current_book'] = random_book
             send_status_message(chat_id, "🔄 Давайте попробуем что-то совершенно другое! Вот случайная книга:")
@@ -302,10 +374,10 @@ def handle_dislike(call):
     if current_mode == 'cluster' and user_states[user_id].get('current_cluster') is not None:
         # Get another book from same cluster
         cluster_id = user_states[user_id]['current_cluster']
-        next_book = get_similar_books(category, cluster_id)
+        next_book = get_similar_books(category, cluster_id, current_book)
     else:
         # Get random book
-        next_book = get_random_book_from_category(category)
+        next_book = get_random_book_from_category(category, current_book)
     
     if next_book is not None:
         user_states[user_id]['current_book'] = next_book
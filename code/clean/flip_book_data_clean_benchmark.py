@@ -0,0 +1,331 @@
+"""Benchmark the cleaning stage against the notebook's original steps, and the dataset formats.
+
+The raw category CSVs are not kept in the repository, so raw-shaped inputs
+are rebuilt from a cleaned dataset: prices and discounts go back to page text
+("5 172 ₸", "-20%") and the other scraped columns are filled in. ``--scale``
+repeats every book under new product ids to simulate a larger crawl.
+
+    python flip_book_data_clean_benchmark.py ../../data/flip_books_data_cleaned.csv.gz --scales 1 50
+
+With ``--formats`` the cleaned table, and an embedded table made from it with
+random float32 embeddings shaped like the embedding notebook's, are also
+written and read back as gzip CSV and Parquet. With ``--dedup`` duplicate
+detection runs on the scaled table with near-duplicates injected under other
+categories and ids, and reports how many of them it found. With
+``--ingest-workers N`` the category CSVs are read with 1 and with N processes;
+``--scales`` makes the categories large. ``--validate`` times the
+validation stage against cleaning.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from flip_book_data_clean_prepare import (CATEGORY_MAPPING, INGEST_WORKERS, WINDOWS_IMAGE_ROOT, category_csv_path,
+                                          load_categories, run_clean)
+from flip_book_data_dedup import find_duplicates, merge_duplicates
+from flip_book_data_io import read_dataset, write_dataset
+from flip_book_data_validate import validate_books
+
+# The embedding notebook's autoencoder and LaBSE output widths
+IMAGE_EMBEDDING_DIM = 16
+TEXT_EMBEDDING_DIM = 768
+# What the bot reads from the clustered table
+PROJECTED_COLUMNS = ['title', 'price_original', 'discount', 'description', 'windows_image_path', 'category']
+
+# Columns of the scraper's CSV (BookInfo fields)
+SCRAPED_COLUMNS = ["title", "price_current", "price_original", "discount", "publisher", "language", "binding",
+                   "publication_date", "isbn", "pages", "height", "width", "thickness", "product_code",
+                   "availability", "rating", "reviews_count", "description", "main_image_url",
+                   "additional_images", "local_image_path", "book_url"]
+
+
+def format_price(prices: pd.Series) -> pd.Series:
+    """5172 -> ``"5 172 ₸"``"""
+    thousands, units = prices // 1000, prices % 1000
+    return (thousands.astype(str) + ' ' + units.astype(str).str.zfill(3) + ' ₸').where(thousands > 0,
+                                                                                   units.astype(str) + ' ₸')
+
+
+def write_raw_categories(cleaned_path: str, data_dir: str, scale: int = 1) -> int:
+    """Write raw-shaped category CSVs for ``scale`` copies of a cleaned dataset; returns the row count"""
+    cleaned = pd.read_csv(cleaned_path)
+    rng = np.random.default_rng(0)
+    rows = 0
+    for category, books in cleaned.groupby('category'):
+        prod_ids = books['book_url'].str.extract(r'prod=(\d+)', expand=False).astype(np.int64)
+        copies = []
+        for copy in range(scale):
+            raw = pd.DataFrame({
+                'title': books['title'],
+                'price_current': format_price(books['price_original'] * (100 - books['discount']) // 100),
+                'price_original': format_price(books['price_original']),
+                'discount': ('-' + books['discount'].astype(str) + '%').where(books['discount'] > 0, ''),
+                'publisher': books['publisher'].where(books['publisher'] != 'unknown', ''),
+                'language': 'Русский',
+                'binding': books['binding'],
+                'publication_date': '2020',
+                'isbn': '978-5-17-' + (prod_ids % 1000000).astype(str) + '-1',
+                'pages': rng.integers(100, 900, len(books)).astype(str) + ' стр.',
+                'height': '205 мм',
+                'width': '135 мм',
+                'thickness': '25 мм',
+                'product_code': (prod_ids + copy * 10_000_000).astype(str),
+                'availability': 'На складе',
+                'rating': '4.5',
+                'reviews_count': books['reviews_count'],
+                'description': books['description'],
+                'main_image_url': books['main_image_url'],
+                'additional_images': '',
+                'local_image_path': books['local_image_path'],
+                'book_url': 'https://www.flip.kz/catalog?prod=' + (prod_ids + copy * 10_000_000).astype(str),
+            }, columns=SCRAPED_COLUMNS)
+            copies.append(raw)
+        raw = pd.concat(copies, ignore_index=True)
+        os.makedirs(os.path.join(data_dir, category), exist_ok=True)
+        raw.to_csv(category_csv_path(data_dir, category), index=False)
+        rows += len(raw)
+    return rows
+
+
+def legacy_clean(data_dir: str) -> pd.DataFrame:
+    """Reference copy of the notebook's cleaning steps"""
+    dataframes = {}
+    for folder_name in os.listdir(data_dir):
+        csv_path = os.path.join(data_dir, folder_name, f"flip_books_{folder_name}.csv")
+        if os.path.exists(csv_path):
+            dataframes[folder_name] = pd.read_csv(csv_path)
+
+    filtered_columns = ["title", "price_original", "discount", "publisher",
+                        "binding", "reviews_count", "description",
+                        "book_url", "local_image_path", "main_image_url"]
+    binding_filter = lambda df: df[
+        df['binding'].str.lower().isin([
+            'твердая обложка',
+            'твердый переплет',
+            'мягкая обложка',
+            'мягкий переплет'
+        ])
+    ]
+    books = pd.concat([binding_filter(dataframes[category])[filtered_columns].assign(category=category)
+                       for category in CATEGORY_MAPPING if category in dataframes], ignore_index=True)
+    books['discount'] = (
+        books['discount'].fillna('0').astype(str).str.replace('%', '', regex=False).astype(float).astype(int)
+    )
+    books['discount'] = books['discount'].abs()
+    books['publisher'] = books['publisher'].fillna("unknown")
+    books = books.dropna()
+    books['price_original'] = (
+        books['price_original'].astype(str).str.extract(r'(\d[\d\s]*)').fillna('0')
+        [0].str.replace(r'\s+', '', regex=True).astype(int)
+    )
+    books['windows_image_path'] = books['local_image_path'].apply(
+        lambda x: r'C:\Users\User\Desktop\DATA SCIENCE\DataSets\flip_book_data' + x.split('/flip_book/data')[1].replace('/', '\\')
+    )
+    for column in ['publisher', 'binding']:
+        books[f'{column}_code'] = books[column].astype('category').cat.codes
+    books['category_id'] = books['category'].map(CATEGORY_MAPPING)
+    return books.reset_index(drop=True)
+
+
+def measure(function: Callable, *args) -> Tuple[object, float, float]:
+    """Run ``function`` twice: timed, then traced for peak memory in MiB
+
+    tracemalloc slows down allocation-heavy pandas code several times over,
+    so the time comes from the untraced run.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def benchmark_clean(cleaned_path: str, scale: int, work_dir: str) -> Dict:
+    data_dir = os.path.join(work_dir, f"raw_x{scale}")
+    raw_rows = write_raw_categories(cleaned_path, data_dir, scale)
+    output_path = os.path.join(work_dir, f"cleaned_x{scale}.csv.gz")
+
+    legacy, legacy_seconds, legacy_peak = measure(legacy_clean, data_dir)
+    start = time.perf_counter()
+    legacy.to_csv(output_path, compression='gzip', index=False)
+    legacy_write_seconds = time.perf_counter() - start
+
+    # tracemalloc cannot see worker processes, so the module reads in this one
+    result, seconds, peak = measure(run_clean, data_dir, None, None, WINDOWS_IMAGE_ROOT, 1)
+    books = result['books']
+    start = time.perf_counter()
+    run_clean(data_dir, output_path, None, WINDOWS_IMAGE_ROOT, 1)
+    write_seconds = time.perf_counter() - start - seconds
+
+    # The notebook did not keep the identifier columns
+    same = len(legacy) == len(books) and all(
+        (legacy[column].astype(str).to_numpy() == books[column].astype(str).to_numpy()).all()
+        for column in legacy.columns)
+    return {
+        'scale': scale,
+        'raw_rows': raw_rows,
+        'cleaned_rows': len(books),
+        'legacy_seconds': legacy_seconds,
+        'legacy_write_seconds': legacy_write_seconds,
+        'legacy_peak_mib': legacy_peak,
+        'seconds': seconds,
+        'read_seconds': result['timings']['read'],
+        'clean_seconds': result['timings']['clean'],
+        'write_seconds': write_seconds,
+        'peak_mib': peak,
+        'speedup': legacy_seconds / seconds,
+        'speedup_with_write': (legacy_seconds + legacy_write_seconds) / (seconds + write_seconds),
+        'same_output': same,
+    }
+
+
+def benchmark_ingest(scale: int, work_dir: str, workers: int = INGEST_WORKERS) -> Dict:
+    """Read the category CSVs of one scale with 1 and with ``workers`` processes"""
+    data_dir = os.path.join(work_dir, f"raw_x{scale}")
+    report = {'scale': scale, 'workers': workers}
+    frames = {}
+    for count in sorted({1, workers}):
+        start = time.perf_counter()
+        frames[count] = load_categories(data_dir, workers=count)
+        report[f'read_seconds_{count}_workers'] = time.perf_counter() - start
+    report['rows'] = len(frames[1])
+    report['speedup'] = report['read_seconds_1_workers'] / report[f'read_seconds_{workers}_workers']
+    report['same_output'] = frames[1].equals(frames[workers])
+    return report
+
+
+def benchmark_validate(scale: int, work_dir: str) -> Dict:
+    """Validation time against the clean stage of the same table, reading excluded
+
+    The synthetic covers do not exist, so every row fails ``missing_image``;
+    the other rules still run over every row.
+    """
+    cleaned = run_clean(os.path.join(work_dir, f"raw_x{scale}"), workers=1)
+    clean_seconds = cleaned['timings']['clean']
+    result = validate_books(cleaned['books'])
+    report = {'scale': scale, 'rows': result['rows'], 'passed': result['passed'],
+              'clean_seconds': clean_seconds, 'validate_seconds': result['seconds'],
+              'overhead': result['seconds'] / clean_seconds}
+    report.update({f'failed_{name}': count for name, count in result['failures_by_rule'].items()})
+    return report
+
+
+def embed_synthetic(books: pd.DataFrame) -> pd.DataFrame:
+    """Append random ``img_emb_*`` and ``txt_emb_*`` float32 columns, as the embedding notebook does"""
+    rng = np.random.default_rng(0)
+    image = pd.DataFrame(rng.standard_normal((len(books), IMAGE_EMBEDDING_DIM), dtype=np.float32)).add_prefix("img_emb_")
+    text = pd.DataFrame(rng.standard_normal((len(books), TEXT_EMBEDDING_DIM), dtype=np.float32)).add_prefix("txt_emb_")
+    return pd.concat([books.reset_index(drop=True), image, text], axis=1)
+
+
+def benchmark_formats(data: pd.DataFrame, name: str, scale: int, work_dir: str) -> Dict:
+    """Write time, read time, projected read time and size of one table per format"""
+    report = {'scale': scale, 'table': name, 'rows': len(data), 'columns': data.shape[1]}
+    for suffix in ('.csv.gz', '.parquet'):
+        path = os.path.join(work_dir, f"{name}_x{scale}{suffix}")
+        fmt = suffix.strip('.').replace('.', '_')
+        start = time.perf_counter()
+        write_dataset(data, path)
+        report[f'{fmt}_write_seconds'] = time.perf_counter() - start
+        report[f'{fmt}_mib'] = os.path.getsize(path) / 2 ** 20
+        start = time.perf_counter()
+        read_dataset(path)
+        report[f'{fmt}_read_seconds'] = time.perf_counter() - start
+        start = time.perf_counter()
+        read_dataset(path, columns=PROJECTED_COLUMNS)
+        report[f'{fmt}_projected_read_seconds'] = time.perf_counter() - start
+    return report
+
+
+def inject_duplicates(books: pd.DataFrame, scale: int, share: float = 0.01) -> Tuple[pd.DataFrame, np.ndarray]:
+    """``scale`` distinct copies of ``books`` plus near-duplicates of ``share`` of them
+
+    Copies get their own ids and a copy number in the title, so they are new
+    books. A near-duplicate is a sampled row under another category and new
+    ids, with the last word of its description dropped. Returns the table and
+    ``(original, duplicate)`` positions.
+    """
+    rng = np.random.default_rng(0)
+    prod_ids = books['book_url'].str.extract(r'prod=(\d+)', expand=False).astype(np.int64).to_numpy()
+    copies = []
+    for copy in range(scale):
+        ids = pd.Series(prod_ids + copy * 10_000_000).astype(str)
+        copies.append(books.reset_index(drop=True).assign(
+            title=books['title'].to_numpy() + f' {copy}',
+            book_url='https://www.flip.kz/catalog?prod=' + ids,
+            isbn='978-' + ids.str.zfill(9),
+            product_code=ids))
+    scaled = pd.concat(copies, ignore_index=True)
+
+    originals = rng.choice(len(scaled), int(len(scaled) * share), replace=False)
+    duplicates = scaled.iloc[originals].reset_index(drop=True)
+    ids = pd.Series(np.arange(len(duplicates)) + 90_000_000).astype(str)
+    categories = np.array(list(CATEGORY_MAPPING))
+    duplicates = duplicates.assign(
+        category=categories[(pd.Series(duplicates['category']).map(CATEGORY_MAPPING).to_numpy() + 1) % len(categories)],
+        book_url='https://www.flip.kz/catalog?prod=' + ids,
+        isbn='978-' + ids.str.zfill(9),
+        product_code=ids,
+        description=duplicates['description'].str.rsplit(n=1).str[0])
+    injected = np.column_stack([originals, len(scaled) + np.arange(len(duplicates))])
+    return pd.concat([scaled, duplicates], ignore_index=True), injected
+
+
+def benchmark_dedup(cleaned_path: str, scale: int) -> Dict:
+    books = pd.read_csv(cleaned_path)
+    data, injected = inject_duplicates(books, scale)
+    start = time.perf_counter()
+    pairs = find_duplicates(data)
+    find_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    merged = merge_duplicates(data, pairs)
+    merge_seconds = time.perf_counter() - start
+
+    found = pd.MultiIndex.from_frame(pairs[['left', 'right']])
+    recall = pd.MultiIndex.from_arrays([injected[:, 0], injected[:, 1]]).isin(found).mean()
+    report = {'scale': scale, 'rows': len(data), 'rows_after': len(merged), 'injected': len(injected),
+              'injected_found': float(recall), 'find_seconds': find_seconds, 'merge_seconds': merge_seconds}
+    report.update({f'pairs_{reason}': count for reason, count in pairs['reason'].value_counts().items()})
+    return report
+
+
+def print_report(report: Dict):
+    print(f"\n=== {report['scale']}x ===")
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning stage")
+    parser.add_argument('cleaned', help="a cleaned dataset to rebuild raw category CSVs from")
+    parser.add_argument('--scales', nargs='*', type=int, default=[1, 50])
+    parser.add_argument('--work-dir', help="where to write the synthetic CSVs (default: a temp dir)")
+    parser.add_argument('--formats', action='store_true', help="also benchmark CSV against Parquet")
+    parser.add_argument('--dedup', action='store_true', help="also benchmark duplicate detection")
+    parser.add_argument('--validate', action='store_true', help="also benchmark the validation stage")
+    parser.add_argument('--ingest-workers', type=int, default=0,
+                        help="also benchmark reading the category CSVs with 1 and with this many processes")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='flip_clean_bench_')
+    for scale in args.scales:
+        print_report(benchmark_clean(args.cleaned, scale, work_dir))
+        if args.ingest_workers:
+            print_report(benchmark_ingest(scale, work_dir, args.ingest_workers))
+        if args.validate:
+            print_report(benchmark_validate(scale, work_dir))
+        if args.formats:
+            books = run_clean(os.path.join(work_dir, f"raw_x{scale}"))['books']
+            print_report(benchmark_formats(books, 'cleaned', scale, work_dir))
+            print_report(benchmark_formats(embed_synthetic(books), 'embedded', scale, work_dir))
+        if args.dedup:
+            print_report(benchmark_dedup(args.cleaned, scale))
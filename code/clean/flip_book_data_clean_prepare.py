@@ -0,0 +1,496 @@
+"""Clean and prepare the scraped Flip.kz books for embedding.
+
+Script version of flip_book_data_clean_prepare.ipynb. Reads the per-category
+CSVs the scraper writes,
+
+    <data_dir>/<category>/flip_books_<category>.csv
+
+or, with ``--typed``, the column files of a crawl run with ``--typed``
+(``<data_dir>/<category>/typed/``, see flip_book_typed_records), whose prices,
+discounts and review counts are already numbers. Either way it
+keeps the hard/soft cover books, parses prices and discounts and writes one
+cleaned table with publisher, binding and category codes, and cover paths
+under ``--image-root`` with whether each cover exists (see flip_book_data_images).
+Publisher and binding codes stay the same between runs (see flip_book_data_codes):
+
+    python flip_book_data_clean_prepare.py <data_dir> --output flip_books_data_cleaned.parquet
+
+The output format follows the file name (see flip_book_data_io); pass a
+``.csv.gz`` output for the notebook's format.
+
+Only ``FILTERED_COLUMNS`` and ``ID_COLUMNS`` are read, with fixed dtypes, and
+every step is a column operation, so the notebook's result is reproduced
+without per-row Python code.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from flip_book_data_codes import CodeBook
+from flip_book_data_images import IMAGE_STATUS_COLUMNS, add_image_status, relative_image_paths, resolve_image_paths
+from flip_book_data_io import read_dataset, sidecar_path, write_dataset
+
+logger = logging.getLogger(__name__)
+
+FILTERED_COLUMNS = ["title", "price_original", "discount", "publisher",
+                    "binding", "reviews_count", "description",
+                    "book_url", "local_image_path", "main_image_url"]
+
+# Book identifiers kept for deduplication; unlike FILTERED_COLUMNS they may be empty
+ID_COLUMNS = ["isbn", "product_code"]
+
+ENCODED_COLUMNS = FILTERED_COLUMNS + ["category", "image_relative_path", "windows_image_path", "publisher_code",
+                                      "binding_code", "category_id"] + ID_COLUMNS
+
+# Coded with the persistent code book (flip_book_data_codes); category ids are the site's own
+CODED_COLUMNS = ['publisher', 'binding']
+
+# Image availability is a stat of the files at cleaning time, redone on every write
+CLEANED_COLUMNS = ENCODED_COLUMNS + IMAGE_STATUS_COLUMNS
+
+# Raw prices and discounts are page text ("5 172 ₸", "-20%"), parsed after reading
+CSV_DTYPES = {
+    'title': 'str',
+    'price_original': 'str',
+    'discount': 'str',
+    'publisher': 'str',
+    'binding': 'category',
+    'reviews_count': 'Int64',
+    'description': 'str',
+    'book_url': 'str',
+    'local_image_path': 'str',
+    'main_image_url': 'str',
+    'isbn': 'str',
+    'product_code': 'str',
+}
+
+BINDINGS = ['твердая обложка', 'твердый переплет', 'мягкая обложка', 'мягкий переплет']
+
+# Category folder names and their Flip.kz subsections, in category code order; the
+# scraper's orchestrator reads the same file
+CATEGORIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'categories.json')
+with open(CATEGORIES_PATH, encoding='utf-8') as categories_file:
+    CATEGORY_MAPPING: Dict[str, int] = json.load(categories_file)
+
+WINDOWS_IMAGE_ROOT = r'C:\Users\User\Desktop\DATA SCIENCE\DataSets\flip_book_data'
+
+CSV_CHUNK_ROWS = 65536
+# One process per category CSV, up to the number of cores
+INGEST_WORKERS = min(len(CATEGORY_MAPPING), os.cpu_count() or 1)
+# Below this much CSV, starting the processes and pickling the frames back costs more than
+# parsing in one process; at 1x (~10 MiB) a serial read takes ~0.25s
+PARALLEL_MIN_BYTES = 256 * 2 ** 20
+
+
+def category_csv_path(data_dir: str, category: str) -> str:
+    return os.path.join(data_dir, category, f"flip_books_{category}.csv")
+
+
+def category_typed_dir(data_dir: str, category: str) -> str:
+    return os.path.join(data_dir, category, 'typed')
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Stack frames with the same columns, one column at a time
+
+    ``pd.concat`` turns categoricals with different categories into object
+    columns of strings; here they are unioned on their codes instead. Arrow
+    string columns are joined as chunks of one chunked array, without copying
+    the string data; numpy columns with one ``np.concatenate`` (for object
+    columns that copies pointers, not strings).
+    """
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for column in frames[0].columns:
+        arrays = [frame[column].array for frame in frames]
+        if isinstance(arrays[0].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals(arrays)
+        elif isinstance(arrays[0], pd.arrays.NumpyExtensionArray):
+            columns[column] = np.concatenate([array.to_numpy() for array in arrays])
+        else:
+            columns[column] = type(arrays[0])._concat_same_type(arrays)
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_category(csv_path: str, category: str, chunk_rows: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
+    """Read one category CSV in chunks and keep the books with a known cover binding
+
+    Rows with other bindings are dropped chunk by chunk, so a large category
+    never holds all of its raw rows at once.
+    """
+    columns = FILTERED_COLUMNS + ID_COLUMNS
+    chunks = []
+    with pd.read_csv(csv_path, usecols=columns, dtype=CSV_DTYPES, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            chunks.append(_known_bindings(chunk)[columns])
+    books = concat_frames(chunks) if chunks else pd.DataFrame(columns=columns).astype(CSV_DTYPES)
+    return _with_category(books, category)
+
+
+def read_typed_category(typed_dir: str, category: str) -> pd.DataFrame:
+    """Read one category from the scraper's typed column files and keep the books with a known cover binding
+
+    Prices, discounts and review counts are read as numbers. Empty texts and
+    missing numbers (``int_missing`` in ``meta.json``) become missing values, as
+    empty CSV cells do, so ``clean_rows`` drops the same rows. Unlike the CSV
+    path, a price text without digits is missing rather than 0.
+    """
+    with open(os.path.join(typed_dir, 'meta.json'), encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+    rows, int_missing = meta['rows'], meta['int_missing']
+    columns = {}
+    for column in FILTERED_COLUMNS + ID_COLUMNS:
+        if column in meta['int_fields']:
+            values = np.fromfile(os.path.join(typed_dir, f"{column}.int64"), dtype=np.int64, count=rows)
+            columns[column] = pd.arrays.IntegerArray(values, values == int_missing)
+    text_columns = [column for column in FILTERED_COLUMNS + ID_COLUMNS if column not in columns]
+    positions = [meta['text_fields'].index(column) for column in text_columns]
+    with open(os.path.join(typed_dir, 'text.jsonl'), encoding='utf-8') as text_file:
+        text_rows = [json.loads(line) for _, line in zip(range(rows), text_file)]
+    for column, position in zip(text_columns, positions):
+        texts = pd.Series([row[position] for row in text_rows], dtype=object)
+        columns[column] = texts.where(texts != '').astype(CSV_DTYPES[column])
+    books = pd.DataFrame(columns)
+    # A missing discount is 0 on the typed side already; missing discounts only exist in CSVs
+    books['discount'] = books['discount'].fillna(0)
+    books = _known_bindings(books)[FILTERED_COLUMNS + ID_COLUMNS].reset_index(drop=True)
+    return _with_category(books, category)
+
+
+def _known_bindings(books: pd.DataFrame) -> pd.DataFrame:
+    # Lower-case the few distinct bindings instead of every row
+    bindings = books['binding'].cat.categories
+    kept = bindings[bindings.str.lower().isin(BINDINGS)]
+    return books.loc[books['binding'].isin(kept)]
+
+
+def _with_category(books: pd.DataFrame, category: str) -> pd.DataFrame:
+    codes = np.full(len(books), list(CATEGORY_MAPPING).index(category), dtype=np.int8)
+    return books.assign(category=pd.Categorical.from_codes(codes, categories=list(CATEGORY_MAPPING)))
+
+
+def _read_source(path: str, category: str) -> pd.DataFrame:
+    """A category from its CSV or, for a directory, its typed column files"""
+    return read_typed_category(path, category) if os.path.isdir(path) else read_category(path, category)
+
+
+def _source_bytes(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path)
+
+
+def ingest_workers(csv_paths: List[str]) -> int:
+    """``INGEST_WORKERS`` for ``PARALLEL_MIN_BYTES`` of input or more, otherwise 1"""
+    total_bytes = sum(_source_bytes(csv_path) for csv_path in csv_paths)
+    return INGEST_WORKERS if total_bytes >= PARALLEL_MIN_BYTES else 1
+
+
+def load_categories(data_dir: str, categories: Iterable[str] = None, workers: Optional[int] = None,
+                    typed: bool = False) -> pd.DataFrame:
+    """Read and combine the category CSVs under ``data_dir``; missing categories are skipped
+
+    With ``typed`` a category's ``typed/`` column files are read instead of its
+    CSV; a category without them falls back to the CSV.
+
+    With ``workers`` > 1 the inputs are parsed in a process pool, one category
+    per task; by default only when there is enough input to pay for the pool.
+    """
+    paths, found = [], []
+    for category in categories or CATEGORY_MAPPING:
+        typed_dir = category_typed_dir(data_dir, category)
+        if typed and os.path.exists(os.path.join(typed_dir, 'meta.json')):
+            paths.append(typed_dir)
+            found.append(category)
+            continue
+        csv_path = category_csv_path(data_dir, category)
+        if not os.path.exists(csv_path):
+            logger.warning("No CSV for category %s at %s", category, csv_path)
+            continue
+        if typed:
+            logger.info("No typed records for category %s, reading %s", category, csv_path)
+        paths.append(csv_path)
+        found.append(category)
+    if not paths:
+        raise FileNotFoundError(f"No category CSVs found under {data_dir}")
+    workers = workers or ingest_workers(paths)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(min(workers, len(paths))) as pool:
+            frames = list(pool.map(_read_source, paths, found))
+    else:
+        frames = [_read_source(path, category) for path, category in zip(paths, found)]
+    return concat_frames(frames)
+
+
+def parse_discount(discount: pd.Series) -> pd.Series:
+    """``"-20%"`` -> 20; a missing discount is 0. Typed input is already numeric"""
+    if pd.api.types.is_numeric_dtype(discount):
+        return discount.fillna(0).astype(np.int64).abs()
+    values = pd.to_numeric(discount.str.replace('%', '', regex=False))
+    return values.fillna(0).astype(np.int64).abs()
+
+
+def parse_price(price: pd.Series) -> pd.Series:
+    """``"5 172 ₸"`` -> 5172; a price without digits is 0. Typed input is already numeric"""
+    if pd.api.types.is_numeric_dtype(price):
+        return price.astype(np.int64)
+    # Python regex semantics: ``\s`` has to match no-break spaces, which the RE2
+    # engine behind pyarrow-backed strings does not
+    price = price.astype(object)
+    digits = price.str.extract(r'(\d[\d\s]*)', expand=False).fillna('0')
+    return digits.str.replace(r'\s+', '', regex=True).astype(np.int64)
+
+
+def clean_rows(books: pd.DataFrame, image_root: str = WINDOWS_IMAGE_ROOT) -> pd.DataFrame:
+    """The notebook's per-row cleaning steps; extra columns, such as keys, pass through"""
+    books = books.assign(discount=parse_discount(books['discount']),
+                         publisher=books['publisher'].fillna("unknown"))
+    books = books.dropna(subset=FILTERED_COLUMNS + ['category']).reset_index(drop=True)
+    books['price_original'] = parse_price(books['price_original'])
+    books['reviews_count'] = books['reviews_count'].astype(np.int64)
+    books['image_relative_path'] = relative_image_paths(books['local_image_path'])
+    books['windows_image_path'] = resolve_image_paths(books['image_relative_path'], image_root)
+    return books
+
+
+def encode_columns(books: pd.DataFrame, codes: CodeBook = None) -> pd.DataFrame:
+    """Add publisher and binding codes from ``codes`` and category ids
+
+    Without a code book the codes are numbered over the whole cleaned table, as in the notebook.
+    """
+    codes = codes if codes is not None else CodeBook()
+    for column in CODED_COLUMNS:
+        books[f'{column}_code'] = codes.encode(column, books[column].astype('str'))
+    books['category_id'] = books['category'].map(CATEGORY_MAPPING).astype(np.int64)
+    books['binding'] = books['binding'].astype('str')
+    books['category'] = books['category'].astype('str')
+    return books[ENCODED_COLUMNS]
+
+
+def clean_books(books: pd.DataFrame, image_root: str = WINDOWS_IMAGE_ROOT, codes: CodeBook = None) -> pd.DataFrame:
+    """Apply the notebook's cleaning steps to the combined category frames and stat the covers"""
+    return add_image_status(encode_columns(clean_rows(books, image_root), codes))
+
+
+def run_clean(data_dir: str, output_path: Optional[str] = None, categories: List[str] = None,
+              image_root: str = WINDOWS_IMAGE_ROOT, workers: Optional[int] = None, codes_path: str = None,
+              typed: bool = False) -> Dict:
+    """Read, clean and (with ``output_path``) write the dataset; returns the table and stage timings
+
+    Codes come from the code book at ``codes_path``, by default next to the output.
+    """
+    timings = {}
+    start = time.perf_counter()
+    raw = load_categories(data_dir, categories, workers, typed)
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    books = clean_books(raw, image_root, CodeBook(codes_path or (output_path and codes_file_path(output_path))))
+    timings['clean'] = time.perf_counter() - start
+
+    if output_path:
+        start = time.perf_counter()
+        write_dataset(books, output_path)
+        timings['write'] = time.perf_counter() - start
+
+    return {
+        'books': books,
+        'raw_rows': len(raw),
+        'rows': len(books),
+        'output_file': output_path,
+        'timings': timings,
+    }
+
+
+# A book can be listed more than once in a category; ``listing`` numbers the repeats
+KEY_COLUMNS = ['category', 'book_url', 'listing']
+
+CLEANED_DTYPES = {
+    'title': 'str',
+    'price_original': np.int64,
+    'discount': np.int64,
+    'publisher': 'str',
+    'binding': 'str',
+    'reviews_count': np.int64,
+    'description': 'str',
+    'book_url': 'str',
+    'local_image_path': 'str',
+    'main_image_url': 'str',
+    'category': 'str',
+    'image_relative_path': 'str',
+    'windows_image_path': 'str',
+    'isbn': 'str',
+    'product_code': 'str',
+}
+
+
+def incremental_paths(output_path: str) -> Tuple[str, str]:
+    """Manifest and change list paths next to a cleaned output, e.g. ``x_manifest.csv``, ``x_changes.csv``"""
+    return sidecar_path(output_path, 'manifest.csv'), sidecar_path(output_path, 'changes.csv')
+
+
+def codes_file_path(output_path: str) -> str:
+    """The code book next to a cleaned output, e.g. ``x_codes.jsonl``"""
+    return sidecar_path(output_path, 'codes.jsonl')
+
+
+def row_hashes(raw: pd.DataFrame) -> np.ndarray:
+    """64-bit content hash of every raw row over the columns read; stable between runs"""
+    return pd.util.hash_pandas_object(raw[FILTERED_COLUMNS + ID_COLUMNS], index=False).to_numpy()
+
+
+def key_hashes(keys: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(keys[KEY_COLUMNS], index=False).to_numpy()
+
+
+def read_manifest(manifest_path: str) -> pd.DataFrame:
+    return pd.read_csv(manifest_path, dtype={'category': 'str', 'book_url': 'str', 'listing': np.int64,
+                                             'row_hash': np.uint64, 'kept': bool})
+
+
+def write_manifest(manifest: pd.DataFrame, manifest_path: str):
+    tmp_path = manifest_path + '.tmp'
+    manifest.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def run_incremental_clean(data_dir: str, output_path: str, categories: List[str] = None,
+                          image_root: str = WINDOWS_IMAGE_ROOT, workers: Optional[int] = None,
+                          codes_path: str = None, typed: bool = False) -> Dict:
+    """Clean only the raw rows that are new or changed since the last run and merge them by book URL
+
+    Every raw row is hashed; the manifest records the hash of each row last
+    cleaned and whether it survived cleaning. Rows with a known hash are taken
+    from the existing output instead of being cleaned again, rows gone from the
+    raw CSVs are dropped, and the result is the same table a full clean gives.
+    When nothing changed the output is left untouched. The change list
+    (``book_url``, ``category``, ``change`` of added/changed/removed) tells the
+    embedding and clustering stages which rows to redo. Publisher and binding
+    codes come from the code book, so unchanged rows keep theirs; the cover
+    files are checked over the whole table when it is rewritten.
+    """
+    manifest_path, changes_path = incremental_paths(output_path)
+    timings = {}
+    start = time.perf_counter()
+    raw = load_categories(data_dir, categories, workers, typed)
+    raw['listing'] = raw.groupby(['category', 'book_url'], observed=True).cumcount()
+    raw['position'] = np.arange(len(raw))
+    keys = raw[KEY_COLUMNS].astype({'category': 'str'})
+    keys['row_hash'] = row_hashes(raw)
+    if os.path.exists(manifest_path) and os.path.exists(output_path):
+        manifest = read_manifest(manifest_path)
+    else:
+        manifest = keys.iloc[:0].assign(kept=pd.Series(dtype=bool))
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # Match raw rows to manifest rows on a hash of their keys rather than joining strings
+    manifest_rows = pd.Index(key_hashes(manifest)).get_indexer(key_hashes(keys))
+    known = manifest_rows >= 0
+    raw_positions = np.full(len(manifest), -1, dtype=np.int64)
+    raw_positions[manifest_rows[known]] = np.flatnonzero(known)
+
+    manifest_kept = manifest['kept'].to_numpy()
+    was_kept = np.zeros(len(keys), dtype=bool)
+    was_kept[known] = manifest_kept[manifest_rows[known]]
+    dirty = ~known
+    dirty[known] = manifest['row_hash'].to_numpy()[manifest_rows[known]] != keys['row_hash'].to_numpy()[known]
+
+    fresh = clean_rows(raw[dirty], image_root).astype({'category': 'str', 'binding': 'str'})
+    is_kept = was_kept.copy()
+    is_kept[dirty] = False
+    is_kept[fresh['position'].to_numpy()] = True
+
+    # What the cleaned table gained, lost or had rewritten since the last run
+    change = np.select([is_kept & ~was_kept, is_kept & was_kept & dirty, ~is_kept & was_kept],
+                       ['added', 'changed', 'removed'], default='')
+    changes = keys.loc[change != '', ['book_url', 'category']].assign(change=change[change != ''])
+    gone = (raw_positions < 0) & manifest_kept
+    changes = pd.concat([changes, manifest.loc[gone, ['book_url', 'category']].assign(change='removed')],
+                        ignore_index=True)
+
+    books = None
+    if len(changes):
+        books = fresh
+        if manifest_kept.any():
+            existing = read_dataset(output_path, dtype=CLEANED_DTYPES)
+            if len(existing) != manifest_kept.sum():
+                # The output was rewritten without its manifest; trust neither
+                logger.warning("%s does not match %s, cleaning everything", manifest_path, output_path)
+                os.remove(manifest_path)
+                return run_incremental_clean(data_dir, output_path, categories, image_root, workers, codes_path,
+                                             typed)
+            # Existing output rows are the manifest's kept rows, in order
+            existing['position'] = raw_positions[manifest_kept]
+            existing = existing[existing['position'] >= 0]
+            existing = existing[~dirty[existing['position'].to_numpy()]]
+            books = pd.concat([existing, fresh], ignore_index=True)
+        books = books.sort_values('position', kind='stable')
+        columns = FILTERED_COLUMNS + ['category', 'image_relative_path', 'windows_image_path'] + ID_COLUMNS
+        codes = CodeBook(codes_path or codes_file_path(output_path))
+        books = add_image_status(encode_columns(books[columns].reset_index(drop=True), codes))
+    timings['clean'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if books is not None:
+        write_dataset(books, output_path)
+    if books is not None or dirty.any() or (raw_positions < 0).any():
+        write_manifest(keys.assign(kept=is_kept), manifest_path)
+    changes.to_csv(changes_path, index=False)
+    timings['write'] = time.perf_counter() - start
+
+    return {
+        'books': books,
+        'changes': changes,
+        'raw_rows': len(raw),
+        'rows_cleaned': int(dirty.sum()),
+        'rows_reused': len(raw) - int(dirty.sum()),
+        'rows': int(is_kept.sum()),
+        'output_file': output_path,
+        'manifest_file': manifest_path,
+        'changes_file': changes_path,
+        'timings': timings,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the scraped Flip.kz category CSVs")
+    parser.add_argument('data_dir', help="directory with <category>/flip_books_<category>.csv")
+    parser.add_argument('--output', default='flip_books_data_cleaned.parquet',
+                        help="cleaned dataset, .parquet or .csv(.gz)")
+    parser.add_argument('--categories', nargs='*', help="default: every category in CATEGORY_MAPPING")
+    parser.add_argument('--image-root', default=WINDOWS_IMAGE_ROOT,
+                        help="directory holding <category>/images/ on this machine; covers are checked there")
+    parser.add_argument('--incremental', action='store_true',
+                        help="clean only new or changed rows; writes a manifest and a change list next to --output")
+    parser.add_argument('--codes', help="publisher/binding code book (default: next to --output)")
+    parser.add_argument('--typed', action='store_true',
+                        help="read <category>/typed/ column files written by a --typed crawl where present")
+    parser.add_argument('--workers', type=int,
+                        help=f"processes reading the category CSVs (default: {INGEST_WORKERS} for "
+                             f"{PARALLEL_MIN_BYTES // 2 ** 20} MiB of CSV or more, else 1)")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    if args.incremental:
+        result = run_incremental_clean(args.data_dir, args.output, args.categories, args.image_root,
+                                       args.workers, args.codes, args.typed)
+        counts = result['changes']['change'].value_counts()
+        print(f"{result['rows_cleaned']} rows cleaned, {result['rows_reused']} reused; "
+              f"{counts.get('added', 0)} added, {counts.get('changed', 0)} changed, "
+              f"{counts.get('removed', 0)} removed -> {result['changes_file']}")
+    else:
+        result = run_clean(args.data_dir, args.output, args.categories, args.image_root, args.workers,
+                           args.codes, args.typed)
+    print(f"{result['rows']} cleaned books from {result['raw_rows']} rows -> {result['output_file']}")
+    print(', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in result['timings'].items()))
@@ -0,0 +1,89 @@
+"""Stable integer codes for publishers and bindings.
+
+``publisher_code`` and ``binding_code`` used to be ``cat.codes`` of each run,
+so one new publisher renumbered every publisher after it and silently broke
+embeddings, clusters and indexes built on the old codes. A ``CodeBook`` is
+an append-only dictionary kept next to the cleaned dataset,
+
+    flip_books_data_cleaned.parquet  ->  flip_books_data_cleaned_codes.jsonl
+
+with one ``{"column": ..., "value": ..., "code": ...}`` line per string. A
+string keeps its int32 code for good; strings first seen in a run are
+appended in sorted order, so a fresh code book numbers a table exactly as
+``cat.codes`` did. Lookups are a dict (string -> code) and a list
+(code -> string). The bot reads the same file to turn codes back into names.
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CODE_DTYPE = np.int32
+
+
+class CodeBook:
+    def __init__(self, path: Optional[str] = None):
+        """Load the code book at ``path``; without a path codes live in memory only"""
+        self.path = path
+        self.code_by_value: Dict[str, Dict[str, int]] = {}
+        self.values: Dict[str, List[str]] = {}
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as codes_file:
+            for line in codes_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                values = self.values.setdefault(entry['column'], [])
+                if entry['code'] != len(values):
+                    # Codes are dense per column; a gap means lines were lost or edited
+                    raise ValueError(f"{self.path}: {entry['column']} code {entry['code']} after {len(values)} codes")
+                self.code_by_value.setdefault(entry['column'], {})[entry['value']] = entry['code']
+                values.append(entry['value'])
+
+    def _append(self, column: str, new_values: List[str]):
+        code_by_value = self.code_by_value.setdefault(column, {})
+        values = self.values.setdefault(column, [])
+        entries = []
+        for value in new_values:
+            code_by_value[value] = len(values)
+            entries.append({'column': column, 'value': value, 'code': len(values)})
+            values.append(value)
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as codes_file:
+                codes_file.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+                codes_file.flush()
+                os.fsync(codes_file.fileno())
+
+    def code(self, column: str, value: str) -> int:
+        """The code of a known string; KeyError for an unknown one"""
+        return self.code_by_value[column][value]
+
+    def value(self, column: str, code: int) -> str:
+        return self.values[column][code]
+
+    def encode(self, column: str, values: pd.Series) -> np.ndarray:
+        """Codes for a column of strings, adding the strings not seen before; missing values are -1"""
+        value_codes, uniques = pd.factorize(values)
+        known = self.code_by_value.get(column, {})
+        new_values = sorted(value for value in uniques if value not in known)
+        if new_values:
+            logger.info("%d new %s codes", len(new_values), column)
+            self._append(column, new_values)
+        lookup = np.array([self.code_by_value[column][value] for value in uniques] + [-1], dtype=CODE_DTYPE)
+        return lookup[value_codes]
+
+    def decode(self, column: str, codes: np.ndarray) -> np.ndarray:
+        """Strings for an array of codes"""
+        return np.asarray(self.values.get(column, []), dtype=object)[np.asarray(codes)]
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self.values.values())
@@ -0,0 +1,228 @@
+"""Perceptual hashes of the cover images, for finding near-identical covers.
+
+The same cover is used for several editions and in several categories, and
+the embedding notebook encodes every copy. This stage computes a 64-bit DCT
+hash (pHash) of each distinct cover file and writes it next to the catalog,
+
+    flip_books_data_cleaned.parquet  ->  flip_books_data_cleaned_cover_hashes.parquet
+
+with a ``cover_group`` per book: the first row whose cover is within
+``MAX_DISTANCE`` bits of it. The embedding stage can encode one cover per
+group and the bot can skip a book that looks like the one it just sent:
+
+    python flip_book_data_cover_hash.py flip_books_data_cleaned.parquet
+
+Lookups go through ``CoverHashIndex``, a multi-index hash table: the hash is
+split into ``MAX_DISTANCE + 1`` blocks and, by the pigeonhole principle, a
+hash within ``MAX_DISTANCE`` bits of a query equals it exactly in at least
+one block. Only rows sharing a block are compared, so a query touches a few
+buckets instead of the whole catalog.
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from flip_book_data_dedup import bucket_pairs, group_labels
+from flip_book_data_io import dataset_columns, read_dataset, sidecar_path, write_dataset
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+# Re-encoded or re-scaled copies of a cover differ by a few bits, different covers by ~32
+MAX_DISTANCE = 6
+# Near-uniform covers (placeholders, plain colours) all land in one bucket; comparing
+# every pair there would be quadratic and says nothing about the books
+MAX_BUCKET_ROWS = 512
+
+_POPCOUNT8 = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so ``m @ x @ m.T`` is the 2D DCT of ``x``"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+
+def phash_pixels(gray: np.ndarray) -> np.int64:
+    """pHash of a ``(DCT_SIZE, DCT_SIZE)`` grayscale image: low DCT frequencies above their median
+
+    Returned as int64 bits; hashes are only compared bitwise.
+    """
+    low = (_DCT @ gray.astype(np.float64) @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low > np.median(low)
+    return np.packbits(bits).view('>u8')[0].astype(np.int64)
+
+
+def cover_phash(image_path: str) -> np.int64:
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        gray = image.convert('L').resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS)
+        return phash_pixels(np.asarray(gray))
+
+
+def hash_covers(image_paths: pd.Series) -> pd.Series:
+    """pHash of every cover as nullable ``Int64``; unreadable or missing covers are NA
+
+    Each distinct path is decoded once.
+    """
+    codes, unique_paths = pd.factorize(image_paths)
+    hashes = np.zeros(len(unique_paths), dtype=np.int64)
+    hashed = np.zeros(len(unique_paths), dtype=bool)
+    for position, image_path in enumerate(unique_paths):
+        try:
+            hashes[position] = cover_phash(image_path)
+            hashed[position] = True
+        except Exception as e:
+            logger.warning("Error hashing image %s: %s", image_path, e)
+    present = codes >= 0
+    values = np.zeros(len(codes), dtype=np.int64)
+    values[present] = hashes[codes[present]]
+    missing = ~present
+    missing[present] = ~hashed[codes[present]]
+    return pd.Series(pd.arrays.IntegerArray(values, missing), index=image_paths.index)
+
+
+def hamming_distance(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Bit differences between two int64 hash arrays"""
+    differing = np.ascontiguousarray(np.bitwise_xor(left, right), dtype=np.int64)
+    return _POPCOUNT8[differing.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _block_keys(hashes: np.ndarray, blocks: int) -> np.ndarray:
+    """``(blocks, len(hashes))`` keys; block ``b`` is bits ``[b * 64 // blocks, (b + 1) * 64 // blocks)``"""
+    unsigned = hashes.astype(np.int64).view(np.uint64)
+    edges = [block * 64 // blocks for block in range(blocks + 1)]
+    return np.stack([(unsigned >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+                     for low, high in zip(edges[:-1], edges[1:])])
+
+
+class CoverHashIndex:
+    """Multi-index hash table over 64-bit cover hashes for Hamming-radius queries"""
+
+    def __init__(self, hashes: np.ndarray, max_distance: int = MAX_DISTANCE):
+        self.hashes = np.asarray(hashes, dtype=np.int64)
+        self.max_distance = max_distance
+        self.blocks = max_distance + 1
+        keys = _block_keys(self.hashes, self.blocks)
+        self.order = np.argsort(keys, axis=1, kind='stable')
+        self.sorted_keys = np.take_along_axis(keys, self.order, axis=1)
+
+    def query(self, cover_hash: int, max_distance: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows within ``max_distance`` bits of ``cover_hash`` and their distances, nearest first"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        query_keys = _block_keys(np.array([cover_hash], dtype=np.int64), self.blocks)[:, 0]
+        candidates = []
+        for block, key in enumerate(query_keys):
+            start, end = np.searchsorted(self.sorted_keys[block], [key, key + np.uint64(1)])
+            candidates.append(self.order[block, start:end])
+        rows = np.unique(np.concatenate(candidates))
+        distances = hamming_distance(self.hashes[rows], np.full(len(rows), cover_hash, dtype=np.int64))
+        near = distances <= max_distance
+        rank = np.argsort(distances[near], kind='stable')
+        return rows[near][rank], distances[near][rank]
+
+    def near_pairs(self) -> pd.DataFrame:
+        """Every row pair (``left`` < ``right``) within ``max_distance`` bits, with its ``distance``
+
+        Buckets larger than ``MAX_BUCKET_ROWS`` are skipped.
+        """
+        left, right = [], []
+        keys = _block_keys(self.hashes, self.blocks)
+        for block in range(self.blocks):
+            block_left, block_right = bucket_pairs(keys[block], MAX_BUCKET_ROWS)
+            left.append(block_left)
+            right.append(block_right)
+        pairs = np.sort(np.column_stack([np.concatenate(left), np.concatenate(right)]), axis=1)
+        pairs = np.unique(pairs, axis=0)
+        distances = hamming_distance(self.hashes[pairs[:, 0]], self.hashes[pairs[:, 1]])
+        near = distances <= self.max_distance
+        return pd.DataFrame({'left': pairs[near, 0], 'right': pairs[near, 1], 'distance': distances[near]})
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+
+def cover_groups(cover_hashes: pd.Series, max_distance: int = MAX_DISTANCE) -> np.ndarray:
+    """Label every row with the first row whose cover is near-identical (connected by near pairs)
+
+    Rows without a hash are their own group.
+    """
+    present = np.flatnonzero(cover_hashes.notna().to_numpy())
+    # Shared covers have identical hashes; index each distinct hash once
+    hash_ids, unique_hashes = pd.factorize(cover_hashes.iloc[present].astype(np.int64))
+    pairs = CoverHashIndex(np.asarray(unique_hashes), max_distance).near_pairs()
+    hash_labels = group_labels(len(unique_hashes), pairs['left'].to_numpy(), pairs['right'].to_numpy())
+    # The first row of each hash, then of each group of hashes
+    first_row = np.full(len(unique_hashes), len(cover_hashes), dtype=np.int64)
+    np.minimum.at(first_row, hash_ids, present)
+    group_first = np.full(len(unique_hashes), len(cover_hashes), dtype=np.int64)
+    np.minimum.at(group_first, hash_labels, first_row)
+    labels = np.arange(len(cover_hashes))
+    labels[present] = group_first[hash_labels[hash_ids]]
+    return labels
+
+
+def cover_hashes_path(dataset_path: str) -> str:
+    """``x.parquet`` -> ``x_cover_hashes.parquet``"""
+    return sidecar_path(dataset_path, 'cover_hashes.parquet')
+
+
+def run_cover_hash(input_path: str, output_path: str = None, path_column: str = 'windows_image_path',
+                   max_distance: int = MAX_DISTANCE) -> Dict:
+    """Hash the covers of a dataset, group near-identical ones and write ``book_url``, ``cover_hash``, ``cover_group``"""
+    has_status = 'image_available' in dataset_columns(input_path)
+    books = read_dataset(input_path, columns=['book_url', path_column] + (['image_available'] if has_status else []))
+    image_paths = books[path_column]
+    if has_status:
+        # Covers the cleaning stage did not find are not opened again
+        image_paths = image_paths.where(books['image_available'].astype(bool))
+    timings = {}
+    start = time.perf_counter()
+    hashes = hash_covers(image_paths)
+    timings['hash'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    groups = cover_groups(hashes, max_distance)
+    timings['group'] = time.perf_counter() - start
+
+    covers = pd.DataFrame({'book_url': books['book_url'], 'cover_hash': hashes, 'cover_group': groups})
+    output_path = output_path or cover_hashes_path(input_path)
+    write_dataset(covers, output_path)
+    return {
+        'covers': covers,
+        'rows': len(covers),
+        'hashed': int(hashes.notna().sum()),
+        'distinct_hashes': int(hashes.nunique()),
+        'groups': int(pd.Series(groups).nunique()),
+        'output_file': output_path,
+        'timings': timings,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hash cover images and group near-identical covers")
+    parser.add_argument('input', help="cleaned dataset, .parquet or .csv(.gz)")
+    parser.add_argument('--output', help="cover hash table (default: next to the input)")
+    parser.add_argument('--path-column', default='windows_image_path', help="column with the cover file paths")
+    parser.add_argument('--max-distance', type=int, default=MAX_DISTANCE,
+                        help="covers within this many differing bits are near-identical")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    result = run_cover_hash(args.input, args.output, args.path_column, args.max_distance)
+    print(f"{result['hashed']} of {result['rows']} covers hashed, {result['distinct_hashes']} distinct, "
+          f"{result['groups']} cover groups -> {result['output_file']}")
+    print(', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in result['timings'].items()))
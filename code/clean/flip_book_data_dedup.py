@@ -0,0 +1,270 @@
+"""Merge books listed in several Flip.kz categories into one row.
+
+A book in both history and biography is scraped, cleaned, embedded and
+recommended once per category. This stage finds duplicate rows of a cleaned
+table by
+
+    exact keys     the product id in ``book_url``, the ISBN and the product code
+    near-text      the same normalised title and a MinHash similarity over word
+                   3-gram shingles of title and description; rows are bucketed
+                   by title and LSH band, and every pair within a bucket is
+                   compared
+
+and keeps the first row of each group with a ``categories`` column listing
+every category the book was found in ("history|biography"):
+
+    python flip_book_data_dedup.py flip_books_data_cleaned.parquet --output flip_books_data_dedup.parquet
+
+The duplicate pairs and why they matched are written next to the output.
+The deduplicated table is what the validation stage reads.
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from flip_book_data_io import read_dataset, sidecar_path, write_dataset
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs at Jaccard 0.8 become candidates ~95% of the time, at 0.5 under 7%
+LSH_BANDS = 16
+SIMILARITY_THRESHOLD = 0.8
+# A title-and-band bucket this large is a generic title ("Стихи") with a shared
+# description; comparing all its pairs would be quadratic
+MAX_BUCKET_ROWS = 256
+
+
+def product_ids(book_urls: pd.Series) -> pd.Series:
+    return book_urls.str.extract(r'[?&]prod=(\d+)', expand=False)
+
+
+def normalise_isbn(isbn: pd.Series) -> pd.Series:
+    """``"978-5-17-123456-1"`` -> ``"9785171234561"``; anything shorter than an ISBN-10 is missing"""
+    digits = isbn.str.replace(r'[^0-9Xx]', '', regex=True).str.upper()
+    return digits.where(digits.str.len() >= 10)
+
+
+def normalise_text(text: pd.Series) -> pd.Series:
+    """Lower-case, fold ё into е and reduce punctuation and whitespace runs to single spaces"""
+    # Python regex semantics: ``\W`` has to treat Cyrillic as letters, which the RE2
+    # engine behind pyarrow-backed strings does not
+    # Duplicates and boilerplate repeat texts; normalise each distinct one once
+    codes, uniques = pd.factorize(text.fillna(''))
+    uniques = pd.Series(uniques, dtype=object).str.lower().str.replace('ё', 'е', regex=False)
+    uniques = uniques.str.replace(r'[\W_]+', ' ', regex=True).str.strip()
+    return pd.Series(uniques.to_numpy()[codes], index=text.index)
+
+
+def shingle_hashes(texts: pd.Series, words: int = SHINGLE_WORDS) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash every run of ``words`` consecutive words; returns ``(hashes, row)`` arrays
+
+    Words are numbered once with ``factorize`` and shingles hashed from those
+    numbers, so no per-shingle Python code runs. Hashes are only comparable
+    within one call.
+    """
+    tokens = texts.str.split().explode()
+    rows = tokens.index.to_numpy()
+    word_ids = pd.factorize(tokens, use_na_sentinel=True)[0].astype(np.uint64)
+    count = len(word_ids) - words + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    # A shingle may not cross into the next row; empty rows explode to a missing word
+    valid = rows[:count] == rows[words - 1:]
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(words):
+        hashes = hashes * np.uint64(0x9E3779B97F4A7C15) + word_ids[offset:offset + count]
+        valid &= word_ids[offset:offset + count] != np.uint64(2 ** 64 - 1)
+    hashes ^= hashes >> np.uint64(29)
+    return hashes[valid], rows[:count][valid]
+
+
+def minhash_signatures(hashes: np.ndarray, rows: np.ndarray, row_count: int, num_perm: int = NUM_PERM,
+                       seed: int = 1) -> np.ndarray:
+    """``(row_count, num_perm)`` MinHash signatures; rows without shingles get unique signatures
+
+    Each permutation is ``x * a + b`` (``a`` odd) followed by an xorshift on
+    32-bit words; both are bijections and need no modulo, which made up most
+    of the time of the usual ``(a * x + b) % p``.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+    b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64).astype(np.uint32)
+    hashes = hashes.astype(np.uint32)
+    # Shingles arrive grouped by row; reduce each group with minimum.reduceat
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.empty(0, dtype=np.int64)
+    signatures = np.empty((row_count, num_perm), dtype=np.int64)
+    # Values above 32 bits never come out of the permutations, so these never match
+    empty = np.ones(row_count, dtype=bool)
+    empty[rows[starts]] = False
+    signatures[empty] = (1 << 32) + np.flatnonzero(empty)[:, None]
+    permuted = np.empty_like(hashes)
+    for perm in range(num_perm):
+        np.multiply(hashes, a[perm], out=permuted)
+        permuted += b[perm]
+        permuted ^= permuted >> np.uint32(15)
+        signatures[rows[starts], perm] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def _star_pairs(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair every row with the first row sharing its key; enough to connect each group"""
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    new_group = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    first = order[np.maximum.accumulate(np.where(new_group, np.arange(len(order)), 0))]
+    return first[~new_group], order[~new_group]
+
+
+def bucket_pairs(keys: np.ndarray, max_rows: int = MAX_BUCKET_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """Every pair of rows sharing a key; buckets larger than ``max_rows`` are skipped
+
+    Similarity is not transitive, so unlike ``_star_pairs`` each row is paired
+    with every other row of its bucket, one offset at a time.
+    """
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    oversized = sizes > max_rows
+    if oversized.any():
+        logger.info("Skipping %d buckets of more than %d rows", oversized.sum(), max_rows)
+    group_size = np.repeat(np.where(oversized, 1, sizes), sizes)
+    position = np.arange(len(keys)) - np.repeat(starts, sizes)
+    left, right = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    # Only rows with a partner at the current offset stay active
+    active = np.flatnonzero(group_size > 1)
+    offset = 1
+    while len(active):
+        active = active[position[active] + offset < group_size[active]]
+        left.append(order[active])
+        right.append(order[active + offset])
+        offset += 1
+    return np.concatenate(left), np.concatenate(right)
+
+
+def lsh_candidates(signatures: np.ndarray, bands: int = LSH_BANDS, blocks: np.ndarray = None,
+                   max_rows: int = MAX_BUCKET_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct row pairs (``left`` < ``right``) sharing a band of their signatures and their ``blocks`` id"""
+    rows_per_band = signatures.shape[1] // bands
+    blocks = np.zeros(len(signatures), dtype=np.uint64) if blocks is None else blocks.astype(np.uint64)
+    left, right = [], []
+    for band in range(bands):
+        band_keys = blocks.copy()
+        for column in signatures[:, band * rows_per_band:(band + 1) * rows_per_band].T:
+            band_keys = band_keys * np.uint64(1000003) ^ column.astype(np.uint64)
+        band_left, band_right = bucket_pairs(band_keys, max_rows)
+        left.append(band_left)
+        right.append(band_right)
+    # Near-identical rows share most bands; compare each pair once
+    pairs = np.unique(np.sort(np.column_stack([np.concatenate(left), np.concatenate(right)]), axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def exact_key_pairs(books: pd.DataFrame) -> pd.DataFrame:
+    keys = {'product_id': product_ids(books['book_url'])}
+    if 'isbn' in books:
+        keys['isbn'] = normalise_isbn(books['isbn'])
+    if 'product_code' in books:
+        keys['product_code'] = books['product_code'].str.strip().replace('', np.nan)
+    pairs = []
+    for reason, key in keys.items():
+        present = np.flatnonzero(key.notna().to_numpy())
+        codes = pd.factorize(key.iloc[present])[0]
+        left, right = _star_pairs(codes)
+        pairs.append(pd.DataFrame({'left': present[left], 'right': present[right], 'reason': reason,
+                                   'similarity': 1.0}))
+    return pd.concat(pairs, ignore_index=True)
+
+
+def find_duplicates(books: pd.DataFrame, threshold: float = SIMILARITY_THRESHOLD, num_perm: int = NUM_PERM,
+                    bands: int = LSH_BANDS) -> pd.DataFrame:
+    """Duplicate row pairs (positions ``left`` < ``right``) with the ``reason`` they matched"""
+    pairs = exact_key_pairs(books)
+
+    titles = normalise_text(books['title'].reset_index(drop=True))
+    texts = titles + ' ' + normalise_text(books['description'].reset_index(drop=True))
+    text_ids, unique_texts = pd.factorize(texts)
+    hashes, rows = shingle_hashes(pd.Series(unique_texts, dtype=object))
+    signatures = minhash_signatures(hashes, rows, len(unique_texts), num_perm)[text_ids]
+    # Volumes of a series and pages with boilerplate descriptions share most of their
+    # text; only books with the same title count as the same book, so titles block the buckets
+    title_ids = pd.factorize(titles)[0]
+    left, right = lsh_candidates(signatures, bands, title_ids)
+    similarity = (signatures[left] == signatures[right]).mean(axis=1)
+    similar = (similarity >= threshold) & (title_ids[left] == title_ids[right])
+    pairs = pd.concat([pairs, pd.DataFrame({'left': left[similar], 'right': right[similar], 'reason': 'minhash',
+                                            'similarity': similarity[similar]})], ignore_index=True)
+
+    pairs[['left', 'right']] = np.sort(pairs[['left', 'right']].to_numpy(), axis=1)
+    return pairs.drop_duplicates(['left', 'right']).sort_values(['left', 'right']).reset_index(drop=True)
+
+
+def group_labels(row_count: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Connected components of the pair graph, labelled by their first row"""
+    labels = np.arange(row_count)
+    while True:
+        lowest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, lowest)
+        np.minimum.at(updated, right, lowest)
+        # Pointer jumping: follow labels to their own labels until they settle
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def merge_duplicates(books: pd.DataFrame, pairs: pd.DataFrame) -> pd.DataFrame:
+    """Keep the first row of each duplicate group, with every category of the group in ``categories``"""
+    books = books.reset_index(drop=True)
+    labels = group_labels(len(books), pairs['left'].to_numpy(), pairs['right'].to_numpy())
+    categories = books['category'].astype('str').copy()
+    grouped = pd.Series(labels).duplicated(keep=False).to_numpy()
+    if grouped.any():
+        joined = categories[grouped].groupby(labels[grouped], sort=False).agg(lambda c: '|'.join(dict.fromkeys(c)))
+        categories[grouped] = joined.reindex(labels[grouped]).to_numpy()
+    keep = labels == np.arange(len(books))
+    return books[keep].assign(categories=categories[keep]).reset_index(drop=True)
+
+
+def run_dedup(input_path: str, output_path: str = None, pairs_path: str = None,
+              threshold: float = SIMILARITY_THRESHOLD) -> Dict:
+    books = read_dataset(input_path)
+    start = time.perf_counter()
+    pairs = find_duplicates(books, threshold)
+    find_seconds = time.perf_counter() - start
+    deduped = merge_duplicates(books, pairs)
+    if output_path:
+        write_dataset(deduped, output_path)
+    if pairs_path:
+        urls = books['book_url'].to_numpy()
+        pairs.assign(left_url=urls[pairs['left']], right_url=urls[pairs['right']]).to_csv(pairs_path, index=False)
+    return {
+        'books': deduped,
+        'pairs': pairs,
+        'rows': len(books),
+        'rows_after': len(deduped),
+        'pairs_by_reason': pairs['reason'].value_counts().to_dict(),
+        'find_seconds': find_seconds,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge books listed in several categories into one row")
+    parser.add_argument('input', help="cleaned dataset, .parquet or .csv(.gz)")
+    parser.add_argument('--output', default='flip_books_data_dedup.parquet')
+    parser.add_argument('--pairs', help="duplicate pairs CSV (default: next to the output)")
+    parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                        help="estimated Jaccard similarity for near-text duplicates")
+    args = parser.parse_args()
+    pairs_path = args.pairs or sidecar_path(args.output, 'pairs.csv')
+
+    result = run_dedup(args.input, args.output, pairs_path, args.threshold)
+    print(f"{result['rows']} rows -> {result['rows_after']} books; pairs {result['pairs_by_reason']} "
+          f"found in {result['find_seconds']:.2f}s -> {pairs_path}")
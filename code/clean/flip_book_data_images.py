@@ -0,0 +1,134 @@
+"""Resolve cover image paths onto a local image root and record which covers exist.
+
+The scraper stores absolute paths of the machine it ran on,
+``/home/.../flip_book/data/<category>/images/x.jpg``. Only the part after
+``SCRAPED_DATA_MARKER`` is kept, as ``image_relative_path``
+(``<category>/images/x.jpg``), and mapped onto an image root with that root's
+separator:
+
+    C:\\Users\\User\\...\\flip_book_data   ->  C:\\Users\\User\\...\\flip_book_data\\fantasy\\images\\x.jpg
+    /data/flip_book                    ->  /data/flip_book/fantasy/images/x.jpg
+
+The cleaning stage then stats every distinct file once and stores
+``image_available``, ``image_bytes`` and ``image_mtime`` with the books, so
+the embedding notebook, the cover hashes and the bot filter on those columns
+instead of touching the filesystem again. Parquet stores ``image_available``
+as a bitmap.
+
+    python flip_book_data_images.py flip_books_data_cleaned.parquet --image-root /data/flip_book
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from flip_book_data_io import read_dataset, write_dataset
+
+SCRAPED_DATA_MARKER = '/flip_book/data/'
+PATH_CHUNK_ROWS = 32768
+
+IMAGE_STATUS_COLUMNS = ['image_available', 'image_bytes', 'image_mtime']
+
+
+def _relative_image_path_chunk(local_image_paths: pd.Series) -> pd.Series:
+    # The scraper writes one prefix per machine; slice each group at its own offset
+    # instead of splitting every path into a list
+    markers = local_image_paths.str.find(SCRAPED_DATA_MARKER)
+    offsets = markers[markers >= 0].unique()
+    if len(offsets) == 0:
+        return pd.Series(np.nan, index=local_image_paths.index, dtype=object)
+    if len(offsets) == 1 and (markers >= 0).all():
+        return local_image_paths.str.slice(int(offsets[0]) + len(SCRAPED_DATA_MARKER))
+    return pd.concat([local_image_paths[markers == marker].str.slice(int(marker) + len(SCRAPED_DATA_MARKER))
+                      for marker in offsets]).reindex(local_image_paths.index)
+
+
+def relative_image_paths(local_image_paths: pd.Series) -> pd.Series:
+    """``.../flip_book/data/<category>/images/x.jpg`` -> ``<category>/images/x.jpg``
+
+    Paths lacking the marker map to NaN. Each string step materialises a whole
+    column of new strings, so the work is done in chunks to keep only one
+    chunk's intermediates alive.
+    """
+    chunks = [_relative_image_path_chunk(local_image_paths.iloc[start:start + PATH_CHUNK_ROWS])
+              for start in range(0, len(local_image_paths), PATH_CHUNK_ROWS)]
+    if not chunks:
+        return local_image_paths.copy()
+    return pd.concat(chunks)
+
+
+def root_separator(image_root: str) -> str:
+    """``\\`` for a Windows root such as ``C:\\Users\\...``, ``/`` otherwise"""
+    return '\\' if '\\' in image_root and '/' not in image_root else '/'
+
+
+def resolve_image_paths(relative_paths: pd.Series, image_root: str) -> pd.Series:
+    """Join ``<category>/images/x.jpg`` paths onto ``image_root`` with the root's separator"""
+    separator = root_separator(image_root)
+    if separator != '/':
+        relative_paths = relative_paths.str.replace('/', separator, regex=False)
+    return image_root.rstrip('/\\') + separator + relative_paths
+
+
+def stat_images(image_paths: pd.Series) -> pd.DataFrame:
+    """``IMAGE_STATUS_COLUMNS`` for every path, stating each distinct file once
+
+    Missing, unreadable and empty files (an interrupted download) are not
+    available; their size is 0 and their mtime NaT.
+    """
+    codes, unique_paths = pd.factorize(image_paths)
+    sizes = np.zeros(len(unique_paths) + 1, dtype=np.int64)
+    mtimes = np.full(len(unique_paths) + 1, np.iinfo(np.int64).min, dtype=np.int64)
+    for position, image_path in enumerate(unique_paths):
+        try:
+            stat = os.stat(image_path)
+        except (OSError, ValueError):
+            continue
+        sizes[position] = stat.st_size
+        mtimes[position] = stat.st_mtime_ns
+    # Missing paths have code -1, the zero entry appended at the end
+    return pd.DataFrame({
+        'image_available': sizes[codes] > 0,
+        'image_bytes': sizes[codes],
+        'image_mtime': mtimes[codes].view('datetime64[ns]'),
+    }, index=image_paths.index)
+
+
+def add_image_status(books: pd.DataFrame, path_column: str = 'windows_image_path') -> pd.DataFrame:
+    """Replace the ``IMAGE_STATUS_COLUMNS`` of ``books`` with a fresh stat of ``path_column``"""
+    status = stat_images(books[path_column])
+    return books.drop(columns=IMAGE_STATUS_COLUMNS, errors='ignore').join(status)
+
+
+def run_resolve(input_path: str, image_root: str, output_path: str = None) -> dict:
+    """Re-point a cleaned dataset's ``windows_image_path`` at ``image_root`` and restat the covers
+
+    For moving the images to another machine without cleaning again.
+    """
+    books = read_dataset(input_path)
+    start = time.perf_counter()
+    books['windows_image_path'] = resolve_image_paths(books['image_relative_path'], image_root)
+    books = add_image_status(books)
+    seconds = time.perf_counter() - start
+    output_path = output_path or input_path
+    write_dataset(books, output_path)
+    return {
+        'rows': len(books),
+        'available': int(books['image_available'].sum()),
+        'output_file': output_path,
+        'seconds': seconds,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Point a cleaned dataset's image paths at another image root")
+    parser.add_argument('input', help="cleaned dataset, .parquet or .csv(.gz)")
+    parser.add_argument('--image-root', required=True, help="directory holding <category>/images/")
+    parser.add_argument('--output', help="default: rewrite the input")
+    args = parser.parse_args()
+
+    result = run_resolve(args.input, args.image_root, args.output)
+    print(f"{result['available']} of {result['rows']} covers available under {args.image_root} "
+          f"({result['seconds']:.2f}s) -> {result['output_file']}")
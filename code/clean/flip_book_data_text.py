@@ -0,0 +1,160 @@
+"""Normalise book descriptions and encode each distinct text once.
+
+Scraped descriptions carry HTML remnants, no-break spaces and whitespace
+runs, "Читать далее" links and publisher blurbs repeated across many books
+(some books have nothing but the blurb). Sent to LaBSE as they are, the
+same text is encoded again for every book and edition that repeats it. Here
+each distinct description is
+
+    unescaped and NFKC normalised, with tags, links and boilerplate removed
+    stripped of blurb sentences, the long sentences found in ``BLURB_MIN_TEXTS``
+    or more distinct descriptions, unless nothing else is left
+    reduced to single spaces
+
+and given a 64-bit content hash, ``description_hash``. The embedding stage
+encodes one text per hash and maps the embeddings back to the rows:
+
+    texts = prepare_descriptions(books)
+    text_embeddings, report = encode_unique(texts, labse_transformer.encode)
+
+    python flip_book_data_text.py flip_books_data_validated.parquet
+
+writes the distinct texts next to the dataset (``<dataset>_texts.parquet``)
+and reports the unique-to-total ratio.
+"""
+import argparse
+import html
+import logging
+import time
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from flip_book_data_io import read_dataset, sidecar_path, write_dataset
+
+logger = logging.getLogger(__name__)
+
+# Python regex semantics throughout: ``\s`` has to match no-break spaces, which the
+# RE2 engine behind pyarrow-backed strings does not
+BOILERPLATE_PATTERN = (r'<[^>]+>'
+                       r'|https?://\S+'
+                       r'|(?i:читать (?:далее|полностью)|показать (?:полностью|ещё|еще)|свернуть)\W*$')
+SENTENCE_BOUNDARY = r'(?<=[.!?…])\s+'
+# A sentence this long in this many distinct descriptions is a blurb, not part of a book's text
+BLURB_MIN_CHARS = 40
+BLURB_MIN_TEXTS = 20
+
+
+def clean_texts(texts: pd.Series) -> pd.Series:
+    """Unescape, NFKC normalise, drop tags, links and boilerplate and collapse whitespace"""
+    texts = texts.astype(object).map(html.unescape, na_action='ignore').str.normalize('NFKC')
+    texts = texts.str.replace(BOILERPLATE_PATTERN, ' ', regex=True)
+    return texts.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def strip_blurbs(texts: pd.Series, min_chars: int = BLURB_MIN_CHARS, min_texts: int = BLURB_MIN_TEXTS) -> pd.Series:
+    """Remove sentences repeated across ``min_texts`` distinct texts; ``texts`` must be distinct
+
+    A text made only of blurb sentences is kept whole, so books whose only
+    description is the blurb still have a text.
+    """
+    sentences = texts.str.split(SENTENCE_BOUNDARY, regex=True).explode()
+    long_sentences = sentences[sentences.str.len() >= min_chars]
+    # Count each sentence once per text
+    per_text = pd.DataFrame({'text': long_sentences.index, 'sentence': long_sentences.to_numpy()}).drop_duplicates()
+    sentence_texts = per_text['sentence'].value_counts()
+    blurbs = sentence_texts.index[sentence_texts.to_numpy() >= min_texts]
+    if len(blurbs) == 0:
+        return texts
+    is_blurb = sentences.isin(blurbs)
+    affected = is_blurb.groupby(level=0).any()
+    affected = affected.index[affected.to_numpy()]
+    kept = sentences[~is_blurb & sentences.index.isin(affected)]
+    rebuilt = kept.groupby(level=0).agg(' '.join)
+    rebuilt = rebuilt[rebuilt.str.strip() != '']
+    logger.info("%d blurb sentences removed from %d texts", len(blurbs), len(rebuilt))
+    texts = texts.copy()
+    texts.loc[rebuilt.index] = rebuilt
+    return texts
+
+
+def normalise_descriptions(descriptions: pd.Series) -> Tuple[np.ndarray, pd.Series]:
+    """Per-row ids into the distinct normalised texts, and those texts
+
+    Each raw description is normalised once; raw texts that normalise the same
+    way share an id. Missing descriptions normalise to ``''``.
+    """
+    raw_ids, raw_uniques = pd.factorize(descriptions.fillna(''))
+    # Raw texts differing only in whitespace or markup clean to the same text; blurbs
+    # are counted over distinct cleaned texts
+    cleaned_ids, cleaned = pd.factorize(clean_texts(pd.Series(raw_uniques, dtype=object)))
+    normalised = strip_blurbs(pd.Series(cleaned, dtype=object))
+    text_ids, texts = pd.factorize(normalised)
+    return text_ids[cleaned_ids[raw_ids]], pd.Series(texts, dtype=object)
+
+
+def text_hashes(texts: pd.Series) -> np.ndarray:
+    """64-bit content hash of every text; stable between runs"""
+    return pd.util.hash_pandas_object(texts, index=False).to_numpy()
+
+
+def prepare_descriptions(books: pd.DataFrame, column: str = 'description') -> Dict:
+    """Normalise a dataset's descriptions into distinct hashed texts
+
+    Returns ``texts`` (``description_hash``, ``text``; one row per distinct
+    text), ``text_ids`` (each book's row in ``texts``), ``description_hash``
+    per book and the counts.
+    """
+    start = time.perf_counter()
+    text_ids, texts = normalise_descriptions(books[column])
+    hashes = text_hashes(texts)
+    return {
+        'texts': pd.DataFrame({'description_hash': hashes, 'text': texts}),
+        'text_ids': text_ids,
+        'description_hash': hashes[text_ids],
+        'rows': len(books),
+        'raw_unique': int(books[column].nunique(dropna=False)),
+        'unique': len(texts),
+        'unique_ratio': len(texts) / max(len(books), 1),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def encode_unique(prepared: Dict, encode: Callable) -> Tuple[np.ndarray, Dict]:
+    """Encode each distinct text once with ``encode`` (e.g. ``SentenceTransformer.encode``); one row per book
+
+    The time saved is estimated from the time per text: the rows sharing a
+    text would each have cost that much again.
+    """
+    start = time.perf_counter()
+    embeddings = np.asarray(encode(prepared['texts']['text'].tolist()))
+    seconds = time.perf_counter() - start
+    per_text = seconds / max(prepared['unique'], 1)
+    return embeddings[prepared['text_ids']], {
+        'rows': prepared['rows'],
+        'encoded': prepared['unique'],
+        'unique_ratio': prepared['unique_ratio'],
+        'encode_seconds': seconds,
+        'estimated_saved_seconds': per_text * (prepared['rows'] - prepared['unique']),
+    }
+
+
+def texts_path(dataset_path: str) -> str:
+    """``x.parquet`` -> ``x_texts.parquet``"""
+    return sidecar_path(dataset_path, 'texts.parquet')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalise descriptions and list the distinct texts to encode")
+    parser.add_argument('input', help="validated dataset, .parquet or .csv(.gz)")
+    parser.add_argument('--output', help="distinct texts with their hashes (default: next to the input)")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    prepared = prepare_descriptions(read_dataset(args.input, columns=['description']))
+    output_path = args.output or texts_path(args.input)
+    write_dataset(prepared['texts'], output_path)
+    print(f"{prepared['rows']} descriptions, {prepared['raw_unique']} distinct raw, {prepared['unique']} distinct "
+          f"normalised ({prepared['unique_ratio']:.1%}) in {prepared['seconds']:.2f}s -> {output_path}")
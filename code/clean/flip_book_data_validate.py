@@ -0,0 +1,185 @@
+"""Data-quality checks between cleaning and embedding.
+
+Every rule in ``RULES`` is a column check returning the rows that fail it.
+The stage runs on the deduplicated table (``flip_book_data_dedup.py``), so
+every book is checked, and later embedded, once with all its ``categories``.
+All rules run over the table in one pass; rows failing any of them
+are written to a quarantine file next to the output with the names of the
+rules they broke ("empty_description|missing_image"), and the rest go on to
+the embedding stage:
+
+    python flip_book_data_validate.py flip_books_data_dedup.parquet --output flip_books_data_validated.parquet
+
+A rule whose columns are not in the table is skipped, so older cleaned
+tables still validate; a table without ``categories`` is logged as not
+deduplicated.
+"""
+import argparse
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from flip_book_data_io import read_dataset, sidecar_path, write_dataset
+
+logger = logging.getLogger(__name__)
+
+# Shorter descriptions are a title repeated or a placeholder, too little text to embed
+MIN_DESCRIPTION_CHARS = 20
+
+
+# Bytes no whitespace character starts with: printable ASCII and every UTF-8 lead byte but
+# those of U+0085/U+00A0 (0xC2), U+1680 (0xE1), U+2000-U+205F (0xE2) and U+3000 (0xE3)
+_SOLID_START = np.zeros(256, dtype=bool)
+_SOLID_START[0x21:0x7F] = True
+_SOLID_START[0xC3:0xF5] = True
+_SOLID_START[[0xE1, 0xE2, 0xE3]] = False
+
+
+def _maybe_blank(text: pd.Series, min_chars: int) -> Optional[np.ndarray]:
+    """Rows that may strip to fewer than ``min_chars`` characters, read off the Arrow buffers
+
+    A string of ``4 * min_chars`` bytes or more whose first and last characters
+    are not whitespace strips to itself and has at least ``min_chars`` characters,
+    so only its length and edge bytes are looked at. None for non-Arrow strings.
+    """
+    if not isinstance(text.array, pd.arrays.ArrowStringArray):
+        return None
+    import pyarrow as pa
+
+    arrow = pa.array(text.array)
+    maybe = []
+    for chunk in (arrow.chunks if isinstance(arrow, pa.ChunkedArray) else [arrow]):
+        if not (pa.types.is_string(chunk.type) or pa.types.is_large_string(chunk.type)):
+            return None
+        _, offsets, data = chunk.buffers()
+        if data is None or data.size == 0:
+            maybe.append(np.ones(len(chunk), dtype=bool))
+            continue
+        offsets = np.frombuffer(offsets, dtype=np.int64 if pa.types.is_large_string(chunk.type) else np.int32)
+        starts = offsets[chunk.offset:chunk.offset + len(chunk)]
+        ends = offsets[chunk.offset + 1:chunk.offset + len(chunk) + 1]
+        data = np.frombuffer(data, dtype=np.uint8)
+        long = ends - starts >= 4 * max(min_chars, 1)
+        first = data[np.where(long, starts, 0)]
+        last, before_last = data[np.where(long, ends - 1, 0)], data[np.where(long, ends - 2, 0)]
+        # An ASCII last byte must be printable; a continuation byte must close a two-byte
+        # character above U+00BF (lead 0xC3-0xDF), none of which is whitespace
+        solid_end = np.where(last < 0x80, _SOLID_START[last],
+                             (last < 0xC0) & (before_last >= 0xC3) & (before_last < 0xE0))
+        solid = long & _SOLID_START[first] & solid_end
+        if chunk.null_count:
+            solid &= chunk.is_valid().to_numpy(zero_copy_only=False)
+        maybe.append(~solid)
+    return np.concatenate(maybe) if maybe else np.zeros(0, dtype=bool)
+
+
+def _blank_text(text: pd.Series, min_chars: int = 1) -> np.ndarray:
+    # Most texts are clearly long enough from their byte length and edges; strip the rest
+    maybe = _maybe_blank(text, min_chars)
+    if maybe is not None:
+        blank = np.zeros(len(text), dtype=bool)
+        blank[maybe] = _blank_distinct(text[maybe], min_chars)
+        return blank
+    return _blank_distinct(text, min_chars)
+
+
+def _blank_distinct(text: pd.Series, min_chars: int) -> np.ndarray:
+    # Descriptions repeat (boilerplate, books in several categories); check each distinct one once
+    codes, uniques = pd.factorize(text)
+    # Keep the column's string dtype: going through object costs more than the check
+    blank = (pd.Series(uniques).str.strip().str.len() < min_chars).to_numpy(bool)
+    # Missing values have code -1, the True appended at the end
+    return np.append(blank, True)[codes]
+
+
+# name -> (columns, check returning True for the rows that fail)
+RULES: Dict[str, Tuple[List[str], Callable[[pd.DataFrame], np.ndarray]]] = {
+    'empty_title': (['title'], lambda books: _blank_text(books['title'])),
+    'empty_description': (['description'],
+                          lambda books: _blank_text(books['description'], MIN_DESCRIPTION_CHARS)),
+    'zero_price': (['price_original'], lambda books: (books['price_original'] <= 0).to_numpy()),
+    'bad_discount': (['discount'], lambda books: ((books['discount'] < 0) | (books['discount'] >= 100)).to_numpy()),
+    'negative_reviews': (['reviews_count'], lambda books: (books['reviews_count'] < 0).to_numpy()),
+    'bad_book_url': (['book_url'],
+                     lambda books: ~books['book_url'].str.contains('prod=', regex=False).fillna(False).to_numpy(bool)),
+    'missing_image': (['image_available'], lambda books: ~books['image_available'].to_numpy(bool)),
+}
+
+
+def check_books(books: pd.DataFrame, rules: Dict = None) -> Tuple[np.ndarray, List[str]]:
+    """Evaluate every applicable rule; returns a bitmask per row (bit ``i`` = rule ``i`` failed) and the rule names"""
+    rules = RULES if rules is None else rules
+    names = [name for name, (columns, _) in rules.items() if all(column in books for column in columns)]
+    skipped = set(rules) - set(names)
+    if skipped:
+        logger.info("Skipping rules without their columns: %s", ', '.join(sorted(skipped)))
+    failures = np.zeros(len(books), dtype=np.uint32)
+    for bit, name in enumerate(names):
+        failures |= np.asarray(rules[name][1](books), dtype=bool).astype(np.uint32) << np.uint32(bit)
+    return failures, names
+
+
+def failure_reasons(failures: np.ndarray, names: List[str]) -> pd.api.extensions.ExtensionArray:
+    """``"rule|rule"`` for each bitmask, built once per distinct combination"""
+    # A handful of rules, so index a table of every combination seen rather than sorting the
+    # masks, and take from it instead of building a string per row
+    seen = np.bincount(failures, minlength=1)
+    reasons = ['|'.join(name for bit, name in enumerate(names) if combination >> bit & 1) if count else ''
+               for combination, count in enumerate(seen)]
+    return pd.Series(reasons).array[failures.astype(np.intp)]
+
+
+def validate_books(books: pd.DataFrame, rules: Dict = None) -> Dict:
+    """Split a cleaned table into passing rows and quarantined rows with a ``reasons`` column"""
+    start = time.perf_counter()
+    failures, names = check_books(books, rules)
+    failed = failures != 0
+    quarantined_rows = int(failed.sum())
+    # Masking copies every column even when the mask keeps no row; slice when one side is empty
+    if quarantined_rows == 0:
+        quarantined, passed = books.iloc[:0].assign(reasons=pd.Series(dtype=object)), books.reset_index(drop=True)
+    elif quarantined_rows == len(books):
+        quarantined, passed = books.assign(reasons=failure_reasons(failures, names)), books.iloc[:0].reset_index(drop=True)
+    else:
+        quarantined = books[failed].assign(reasons=failure_reasons(failures[failed], names))
+        passed = books[~failed].reset_index(drop=True)
+    return {
+        'books': passed,
+        'quarantined': quarantined,
+        'rows': len(books),
+        'passed': len(passed),
+        'quarantined_rows': quarantined_rows,
+        'failures_by_rule': {name: int((failures >> np.uint32(bit) & 1).sum()) for bit, name in enumerate(names)},
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def run_validate(input_path: str, output_path: str, quarantine_path: str = None) -> Dict:
+    """Validate a cleaned dataset; writes the passing rows and, next to them, the quarantined ones"""
+    books = read_dataset(input_path)
+    if 'categories' not in books:
+        logger.warning("%s has no categories column; run flip_book_data_dedup.py before validating", input_path)
+    result = validate_books(books)
+    quarantine_path = quarantine_path or sidecar_path(output_path, 'quarantine.csv')
+    write_dataset(result['books'], output_path)
+    write_dataset(result['quarantined'], quarantine_path)
+    result.update({'output_file': output_path, 'quarantine_file': quarantine_path})
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a cleaned dataset and quarantine rows unfit for embedding")
+    parser.add_argument('input', help="deduplicated dataset, .parquet or .csv(.gz)")
+    parser.add_argument('--output', default='flip_books_data_validated.parquet')
+    parser.add_argument('--quarantine', help="failing rows with their reasons (default: next to the output)")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    result = run_validate(args.input, args.output, args.quarantine)
+    print(f"{result['passed']} of {result['rows']} rows passed in {result['seconds']:.2f}s -> {result['output_file']}")
+    print(f"{result['quarantined_rows']} quarantined -> {result['quarantine_file']}")
+    print(', '.join(f"{name} {count}" for name, count in result['failures_by_rule'].items()))
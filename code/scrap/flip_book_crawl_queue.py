@@ -0,0 +1,466 @@
+"""SQLite work queue for crawling Flip.kz with many worker processes.
+
+Work items are catalog pages and book detail pages. A worker leases one item
+at a time; the lease is acked when the item is done, or failed to be retried
+up to ``max_attempts`` times. Leases of a worker that died expire after
+``lease_seconds`` and the item goes back to the queue, so any number of
+workers can pull from the same file without duplicating work. Several hosts
+can share the queue as long as the file sits on a filesystem with working
+POSIX locks (not most network shares).
+
+A lazy orchestrator crawl (``--lazy-details --defer-details queue.db``) writes
+books missing their detail fields from the catalog card and queues their detail
+pages here as low-priority items. The books workers finish are merged into the
+category datasets by the next lazy crawl, or right away with ``merge``.
+
+Finished books are stored in the queue database in the same transaction as
+the ack, so a crash never duplicates or loses a book; ``export`` writes them
+out in the usual JSON Lines/CSV layout.
+
+The request budget is kept in the queue database too: ``--rate`` is the rate of
+all workers of all hosts sharing the queue, so pass the same value everywhere
+(and keep the hosts' clocks in sync).
+
+    python flip_book_crawl_queue.py seed queue.db https://www.flip.kz/catalog?subsection=134
+    python flip_book_crawl_queue.py work queue.db output_dir --workers 4
+    python flip_book_crawl_queue.py export queue.db output_dir/books_data.jsonl --csv books.csv
+    python flip_book_crawl_queue.py merge queue.db output_dir/books_data.jsonl --csv books.csv
+    python flip_book_crawl_queue.py benchmark --workers 1 4 16
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import time
+import uuid
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from flip_book_data_scrapping import (BookInfo, FlipBooksScraper, StreamingBookWriter, catalog_page_url,
+                                      create_session, fill_missing_fields, page_fingerprint)
+from flip_book_image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 120.0
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 0.2
+# Catalog pages go first (1), then new detail pages (0), then deferred detail pages
+DEFERRED_PRIORITY = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    payload TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS items_ready ON items (state, priority DESC, id);
+CREATE TABLE IF NOT EXISTS books (
+    book_url TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_budget (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    next_request REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS page_fingerprints (
+    catalog_url TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    page_num INTEGER NOT NULL,
+    PRIMARY KEY (catalog_url, fingerprint)
+);
+"""
+
+
+class CrawlQueue:
+    def __init__(self, path: str, lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Autocommit mode: every write below opens its own BEGIN IMMEDIATE transaction
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def _transaction(self):
+        self.db.execute('BEGIN IMMEDIATE')
+
+    def put(self, kind: str, url: str, payload: Dict = None, priority: int = 0) -> bool:
+        """Queue an item unless its URL was queued before; returns True if it was added"""
+        cursor = self.db.execute(
+            'INSERT OR IGNORE INTO items (kind, url, payload, priority) VALUES (?, ?, ?, ?)',
+            (kind, url, json.dumps(payload or {}, ensure_ascii=False), priority))
+        return cursor.rowcount == 1
+
+    def defer_detail(self, catalog_book: Dict, page_url: str) -> bool:
+        """Queue the detail page of a book a lazy crawl wrote without it
+
+        It is leased only when nothing else is ready. A URL queued before, done or
+        not, is left alone; returns True if it was added.
+        """
+        return self.put('detail', catalog_book['book_url'], {'catalog_book': catalog_book, 'page_url': page_url},
+                        DEFERRED_PRIORITY)
+
+    def lease(self, worker_id: str) -> Optional[Dict]:
+        """Lease the next ready item, including ones whose lease has expired
+
+        An item whose worker died on each of its ``max_attempts`` leases never
+        reaches ``fail``; it is parked as failed here instead of leased again.
+        """
+        now = time.time()
+        self._transaction()
+        try:
+            self.db.execute(
+                "UPDATE items SET state = 'failed', lease_owner = NULL, lease_expires = NULL, "
+                "error = COALESCE(error, 'lease expired') "
+                "WHERE attempts >= ? AND (state = 'queued' OR (state = 'leased' AND lease_expires < ?))",
+                (self.max_attempts, now))
+            row = self.db.execute(
+                "SELECT id, kind, url, payload, attempts FROM items "
+                "WHERE state = 'queued' OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY priority DESC, id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                self.db.execute('COMMIT')
+                return None
+            item_id, kind, url, payload, attempts = row
+            self.db.execute(
+                "UPDATE items SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?", (worker_id, now + self.lease_seconds, item_id))
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        return {'id': item_id, 'kind': kind, 'url': url, 'payload': json.loads(payload), 'attempts': attempts + 1}
+
+    def ack(self, item: Dict, worker_id: str, book: BookInfo = None, new_items: List[Dict] = ()) -> bool:
+        """Complete a leased item, storing its book and follow-up items atomically
+
+        Returns False if the lease was lost (expired and taken by another worker),
+        in which case nothing is written.
+        """
+        self._transaction()
+        try:
+            cursor = self.db.execute(
+                "UPDATE items SET state = 'done', lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?", (item['id'], worker_id))
+            if cursor.rowcount != 1:
+                self.db.execute('ROLLBACK')
+                return False
+            if book is not None:
+                self.db.execute('INSERT OR REPLACE INTO books (book_url, data) VALUES (?, ?)',
+                                (book.book_url, json.dumps(asdict(book), ensure_ascii=False)))
+            for new_item in new_items:
+                self.put(new_item['kind'], new_item['url'], new_item.get('payload'), new_item.get('priority', 0))
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        return True
+
+    def fail(self, item: Dict, worker_id: str, error: str):
+        """Give a leased item back for a retry, or park it as failed after ``max_attempts``"""
+        state = 'failed' if item['attempts'] >= self.max_attempts else 'queued'
+        self.db.execute(
+            "UPDATE items SET state = ?, lease_owner = NULL, lease_expires = NULL, error = ? "
+            "WHERE id = ? AND lease_owner = ?", (state, error, item['id'], worker_id))
+
+    def claim_fingerprint(self, catalog_url: str, fingerprint: str, page_num: int) -> Optional[int]:
+        """Remember which page listed these products; returns the earlier page if another did"""
+        cursor = self.db.execute(
+            'INSERT OR IGNORE INTO page_fingerprints (catalog_url, fingerprint, page_num) VALUES (?, ?, ?)',
+            (catalog_url, fingerprint, page_num))
+        if cursor.rowcount == 1:
+            return None
+        earlier_page = self.db.execute(
+            'SELECT page_num FROM page_fingerprints WHERE catalog_url = ? AND fingerprint = ?',
+            (catalog_url, fingerprint)).fetchone()[0]
+        return None if earlier_page == page_num else earlier_page
+
+    def unfinished(self) -> int:
+        """Items still queued or leased; workers keep polling while others may add more"""
+        return self.db.execute("SELECT COUNT(*) FROM items WHERE state IN ('queued', 'leased')").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict(self.db.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall())
+        counts['books'] = self.db.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+        return counts
+
+    def books(self):
+        for (data,) in self.db.execute('SELECT data FROM books ORDER BY rowid'):
+            yield BookInfo(**json.loads(data))
+
+    def close(self):
+        self.db.close()
+
+
+class QueueRateLimiter:
+    """Request budget kept in the queue database, shared by every worker process on every host
+
+    Each request takes the next free slot, ``1 / requests_per_second`` after the
+    one before it, and sleeps until then. Same interface as ``RateLimiter``.
+    """
+
+    def __init__(self, queue: CrawlQueue, requests_per_second: float):
+        self.queue = queue
+        self.interval = 1.0 / requests_per_second
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        now = time.time()
+        self.queue._transaction()
+        try:
+            row = self.queue.db.execute('SELECT next_request FROM rate_budget WHERE id = 0').fetchone()
+            slot = max(now, row[0]) if row else now
+            self.queue.db.execute('INSERT OR REPLACE INTO rate_budget (id, next_request) VALUES (0, ?)',
+                                  (slot + self.interval,))
+            self.queue.db.execute('COMMIT')
+        except BaseException:
+            self.queue.db.execute('ROLLBACK')
+            raise
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def seed_catalog(queue: CrawlQueue, catalog_url: str, max_pages: int = 50) -> bool:
+    """Queue the first page of a catalog; later pages are queued as earlier ones turn out non-empty"""
+    return queue.put('catalog', catalog_page_url(catalog_url, 1),
+                     {'catalog_url': catalog_url, 'page_num': 1, 'max_pages': max_pages}, priority=1)
+
+
+def process_catalog_item(scraper: FlipBooksScraper, queue: CrawlQueue, item: Dict) -> List[Dict]:
+    """Fetch a catalog page; returns its detail items and, unless the catalog ended, the next page"""
+    payload = item['payload']
+    soup = scraper.get_page(item['url'])
+    if not soup:
+        raise IOError(f"failed to fetch {item['url']}")
+
+    with scraper.stats.stage('extract'):
+        catalog_books = scraper.extract_book_info_from_catalog(soup, item['url'])
+    if not catalog_books:
+        return []
+    fingerprint = page_fingerprint(catalog_books)
+    if fingerprint and queue.claim_fingerprint(payload['catalog_url'], fingerprint, payload['page_num']):
+        # Past the last page the catalog serves an earlier page again
+        return []
+
+    new_items = [
+        {'kind': 'detail', 'url': catalog_book['book_url'],
+         'payload': {'catalog_book': catalog_book, 'page_url': item['url']}}
+        for catalog_book in catalog_books if catalog_book.get('book_url')
+    ]
+    if payload['page_num'] < payload['max_pages']:
+        next_page = payload['page_num'] + 1
+        # Catalog pages go first so the frontier keeps growing while details are fetched
+        new_items.append({'kind': 'catalog', 'url': catalog_page_url(payload['catalog_url'], next_page),
+                          'payload': dict(payload, page_num=next_page), 'priority': 1})
+    return new_items
+
+
+def process_detail_item(scraper: FlipBooksScraper, image_store: ImageStore, item: Dict) -> BookInfo:
+    """Fetch a detail page and build its book; a page that cannot be fetched fails the item"""
+    payload = item['payload']
+    soup = scraper.get_page(item['url'])
+    if not soup:
+        # scrape_book would return an empty book for it, which must not be acked as done
+        raise IOError(f"failed to fetch {item['url']}")
+    with scraper.stats.stage('extract'):
+        detailed_book = scraper.parse_book_page(soup, item['url'])
+    book, _, _ = scraper.scrape_book(payload['catalog_book'], payload['page_url'], image_store, detailed_book)
+    return book
+
+
+def run_worker(queue_path: str, output_dir: str, base_url: str = "https://www.flip.kz",
+               requests_per_second: float = 2.0, worker_id: str = None,
+               lease_seconds: float = LEASE_SECONDS) -> Dict:
+    """Pull items until the queue is drained; safe to run in any number of processes
+
+    ``requests_per_second`` is the budget shared with every other worker on the queue.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    queue = CrawlQueue(queue_path, lease_seconds=lease_seconds)
+    image_store = ImageStore(os.path.join(output_dir, 'images'))
+    scraper = FlipBooksScraper(base_url, session=create_session(pool_size=2),
+                               rate_limiter=QueueRateLimiter(queue, requests_per_second), image_store=image_store)
+
+    items_done = 0
+    items_failed = 0
+    leases_lost = 0
+    try:
+        while True:
+            item = queue.lease(worker_id)
+            if item is None:
+                if not queue.unfinished():
+                    break
+                # Other workers still hold leases that may add more items
+                time.sleep(POLL_SECONDS)
+                continue
+
+            try:
+                if item['kind'] == 'catalog':
+                    book, new_items = None, process_catalog_item(scraper, queue, item)
+                else:
+                    book, new_items = process_detail_item(scraper, image_store, item), []
+            except Exception as e:
+                logger.warning("Worker %s failed on %s: %s", worker_id, item['url'], e)
+                queue.fail(item, worker_id, str(e))
+                items_failed += 1
+                continue
+
+            if queue.ack(item, worker_id, book, new_items):
+                items_done += 1
+            else:
+                leases_lost += 1
+    finally:
+        image_store.close()
+        queue.close()
+
+    return {
+        'worker_id': worker_id,
+        'items_done': items_done,
+        'items_failed': items_failed,
+        'leases_lost': leases_lost,
+        'requests_made': scraper.requests_made,
+        'stats': scraper.stats.report(),
+    }
+
+
+def run_workers(queue_path: str, output_dir: str, workers: int = 4, base_url: str = "https://www.flip.kz",
+                requests_per_second: float = 2.0) -> Dict:
+    """Drain the queue with local worker processes sharing one global request budget"""
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        reports = pool.starmap(run_worker, [(queue_path, output_dir, base_url, requests_per_second)] * workers)
+    elapsed = time.perf_counter() - start
+
+    queue = CrawlQueue(queue_path)
+    stats = queue.stats()
+    queue.close()
+    requests_made = sum(report['requests_made'] for report in reports)
+    return {
+        'workers': workers,
+        'seconds': elapsed,
+        'books': stats['books'],
+        'requests': requests_made,
+        'books_per_minute': stats['books'] * 60 / elapsed if elapsed else 0.0,
+        'requests_per_second': requests_made / elapsed if elapsed else 0.0,
+        'queue': stats,
+        'worker_reports': reports,
+    }
+
+
+def export_books(queue_path: str, jsonl_path: str, csv_path: str = None) -> int:
+    """Write every finished book from the queue to JSON Lines (and CSV)"""
+    queue = CrawlQueue(queue_path)
+    written = 0
+    with StreamingBookWriter(jsonl_path, csv_path, flush_every=1000, append=False) as writer:
+        for book in queue.books():
+            writer.write(book)
+            written += 1
+    queue.close()
+    return written
+
+
+def merge_books(queue_path: str, jsonl_path: str, csv_path: str = None) -> int:
+    """Fill the empty fields of an existing dataset from the queue's finished books"""
+    queue = CrawlQueue(queue_path)
+    try:
+        return fill_missing_fields(jsonl_path, csv_path, queue.books())
+    finally:
+        queue.close()
+
+
+def benchmark_workers(worker_counts: List[int] = (1, 4, 16), catalog_pages: int = 3, cards: int = 40,
+                      latency: float = 0.05) -> List[Dict]:
+    """Crawl the same local fake site with each worker count and compare throughput"""
+    from flip_book_scrapping_benchmark import serve_fake_site
+
+    server = serve_fake_site(catalog_pages=catalog_pages, cards=cards, latency=latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    reports = []
+    try:
+        for workers in worker_counts:
+            work_dir = tempfile.mkdtemp(prefix='flip_queue_bench_')
+            try:
+                queue_path = os.path.join(work_dir, 'queue.db')
+                queue = CrawlQueue(queue_path)
+                seed_catalog(queue, f"{base_url}/catalog?subsection=134", max_pages=catalog_pages + 1)
+                queue.close()
+                # Effectively unthrottled: the fake site's latency is what workers overlap
+                reports.append(run_workers(queue_path, work_dir, workers, base_url, requests_per_second=10000))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        server.shutdown()
+    return reports
+
+
+def print_queue_report(report: Dict):
+    print(f"{report['workers']:>3} workers {report['books']:>6} books {report['requests']:>7} requests "
+          f"{report['seconds']:>8.2f} s {report['books_per_minute']:>9.1f} books/min "
+          f"{report['requests_per_second']:>7.1f} req/s  queue {report['queue']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite work queue for parallel Flip.kz crawls")
+    parser.add_argument('--log-level', default='WARNING', help="DEBUG shows every fetch, INFO every page")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help="queue the first page of one or more catalogs")
+    seed.add_argument('queue')
+    seed.add_argument('catalog_urls', nargs='+')
+    seed.add_argument('--max-pages', type=int, default=50)
+
+    work = commands.add_parser('work', help="drain the queue with local worker processes")
+    work.add_argument('queue')
+    work.add_argument('output_dir', help="receives the shared image store")
+    work.add_argument('--workers', type=int, default=4)
+    work.add_argument('--base-url', default="https://www.flip.kz")
+    work.add_argument('--rate', type=float, default=2.0, help="request budget of all workers sharing the queue, on any host, requests per second")
+
+    export = commands.add_parser('export', help="write finished books to JSON Lines/CSV")
+    export.add_argument('queue')
+    export.add_argument('jsonl')
+    export.add_argument('--csv')
+
+    merge = commands.add_parser('merge', help="fill missing fields of an existing dataset from finished books")
+    merge.add_argument('queue')
+    merge.add_argument('jsonl')
+    merge.add_argument('--csv')
+
+    bench = commands.add_parser('benchmark', help="compare worker counts against a local fake site")
+    bench.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    bench.add_argument('--catalog-pages', type=int, default=3)
+    bench.add_argument('--cards', type=int, default=40)
+    bench.add_argument('--latency', type=float, default=0.05, help="seconds added to every fake response")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    if args.command == 'seed':
+        queue = CrawlQueue(args.queue)
+        for catalog_url in args.catalog_urls:
+            seed_catalog(queue, catalog_url, args.max_pages)
+        print(queue.stats())
+        queue.close()
+    elif args.command == 'work':
+        print_queue_report(run_workers(args.queue, args.output_dir, args.workers, args.base_url, args.rate))
+    elif args.command == 'export':
+        print(f"{export_books(args.queue, args.jsonl, args.csv)} books written to {args.jsonl}")
+    elif args.command == 'merge':
+        print(f"{merge_books(args.queue, args.jsonl, args.csv)} books filled in {args.jsonl}")
+    else:
+        for report in benchmark_workers(args.workers, args.catalog_pages, args.cards, args.latency):
+            print_queue_report(report)
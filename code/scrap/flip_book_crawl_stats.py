@@ -0,0 +1,128 @@
+"""Per-stage timing and resource counters for a crawl.
+
+Each scraper owns a CrawlStats; code paths are wrapped in ``stats.stage(name)``
+to accumulate wall and CPU time per stage:
+
+    fetch       page requests including reading the body
+    parse       building the BeautifulSoup tree
+    extract     catalog card and book page extraction (the regex work)
+    image_io    cover download, hashing and storing
+    rate_limit  waiting for the shared request budget
+    sleep       politeness delays and retry back-off
+    write       dataset and checkpoint writes
+
+A stage opened inside another (``rate_limit`` while storing a cover) is
+subtracted from the outer one, so every second is counted in one stage only.
+Per-URL latencies are kept per kind ('page', 'image') for percentiles. CPU
+time is per thread, so stages are comparable when scrapers run in parallel.
+"""
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class CrawlStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.bytes_downloaded = 0
+        self.retries = 0
+        # Per thread, the wall and CPU time of the stages nested in each open stage
+        self._nested = threading.local()
+
+    @contextmanager
+    def stage(self, name: str):
+        open_stages = self._nested.__dict__.setdefault('open_stages', [])
+        open_stages.append([0.0, 0.0])
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.thread_time() - cpu_start
+            nested_wall, nested_cpu = open_stages.pop()
+            if open_stages:
+                open_stages[-1][0] += wall_seconds
+                open_stages[-1][1] += cpu_seconds
+            self.add_stage(name, wall_seconds - nested_wall, cpu_seconds - nested_cpu)
+
+    def add_stage(self, name: str, wall_seconds: float, cpu_seconds: float, calls: int = 1):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            stage['calls'] += calls
+            stage['wall_seconds'] += wall_seconds
+            stage['cpu_seconds'] += cpu_seconds
+
+    def add_latency(self, kind: str, seconds: float, size: int = 0):
+        """Record one completed download of ``size`` bytes"""
+        with self.lock:
+            self.latencies.setdefault(kind, []).append(seconds)
+            self.bytes_downloaded += size
+
+    def add_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def merge(self, other: 'CrawlStats'):
+        """Add another scraper's counters, e.g. to total the categories of a crawl"""
+        with other.lock:
+            stages = {name: dict(stage) for name, stage in other.stages.items()}
+            latencies = {kind: list(values) for kind, values in other.latencies.items()}
+            bytes_downloaded, retries = other.bytes_downloaded, other.retries
+        for name, stage in stages.items():
+            self.add_stage(name, stage['wall_seconds'], stage['cpu_seconds'], stage['calls'])
+        with self.lock:
+            for kind, values in latencies.items():
+                self.latencies.setdefault(kind, []).extend(values)
+            self.bytes_downloaded += bytes_downloaded
+            self.retries += retries
+
+    def report(self) -> Dict:
+        with self.lock:
+            latency_ms = {}
+            for kind, values in self.latencies.items():
+                ordered = sorted(values)
+                latency_ms[kind] = {
+                    'count': len(ordered),
+                    'p50': percentile(ordered, 0.50) * 1000,
+                    'p90': percentile(ordered, 0.90) * 1000,
+                    'p99': percentile(ordered, 0.99) * 1000,
+                    'max': ordered[-1] * 1000,
+                }
+            return {
+                'stages': {name: dict(stage) for name, stage in sorted(self.stages.items())},
+                'bytes_downloaded': self.bytes_downloaded,
+                'retries': self.retries,
+                'latency_ms': latency_ms,
+            }
+
+    def write_report(self, path: str, extra: Dict = None):
+        """Write the report, plus any run counters in ``extra``, as JSON"""
+        report = dict(extra or {}, stats=self.report())
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
+
+
+def format_stage_report(report: Dict) -> str:
+    """Human-readable table of a ``CrawlStats.report()``"""
+    lines = [f"{'stage':<11} {'calls':>7} {'wall s':>9} {'cpu s':>9}"]
+    for name, stage in report['stages'].items():
+        lines.append(f"{name:<11} {stage['calls']:>7} {stage['wall_seconds']:>9.2f} {stage['cpu_seconds']:>9.2f}")
+    lines.append(f"{report['bytes_downloaded']} bytes downloaded, {report['retries']} retries")
+    for kind, latency in report['latency_ms'].items():
+        lines.append(f"{kind} latency ms: p50 {latency['p50']:.1f} p90 {latency['p90']:.1f} "
+                     f"p99 {latency['p99']:.1f} max {latency['max']:.1f} ({latency['count']} requests)")
+    return '\n'.join(lines)
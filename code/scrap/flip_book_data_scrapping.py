@@ -1,14 +1,74 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import csv
+import hashlib
 import os
 import time
 import random
+import threading
 from urllib.parse import urljoin, urlparse
 import json
-from typing import Dict, List, Optional
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import re
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
+
+from flip_book_crawl_stats import CrawlStats, format_stage_report
+from flip_book_http_archive import HttpArchive
+from flip_book_image_store import ImageStore
+from flip_book_typed_records import TypedBookWriter, to_typed
+
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+IMAGE_CHUNK_BYTES = 64 * 1024
+
+MONTHS = r'(?:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)'
+
+PRICE_PATTERN = re.compile(r'(\d+(?:\s*\d+)*)\s*₸')
+PRICE_PREFIX_PATTERN = re.compile(r'^\d+\s*₸')
+DISCOUNT_PREFIX_PATTERN = re.compile(r'^-?\d+%')
+YEAR_PATTERN = re.compile(r'^\d{4}$')
+PRODUCT_IMAGE_PATTERN = re.compile(r'prod/\d+.*\.(jpg|png|webp)')
+PRODUCT_CONTAINER_PATTERN = re.compile(r'product|item|book|card')
+LONG_TEXT_PATTERN = re.compile(r'.{200,}')
+TITLE_AUTHOR_PATTERN = re.compile(r'^(.+?)\s+[-–—]\s+(.+)$')
+
+# Labelled fields of a book page, e.g. "Издательство: ..." or "Язык: ..."
+INFO_PATTERNS = {
+    'publisher': re.compile(r'Издательство[:\s]+([^\n,]+)', re.IGNORECASE),
+    'language': re.compile(r'Язык[:\s]+([^\n,]+)', re.IGNORECASE),
+    'binding': re.compile(r'(?:Переплет|Обложка)[:\s]+([^\n,]+)', re.IGNORECASE),
+    'publication_date': re.compile(r'(?:Дата выхода|Год издания)[:\s]+([^\n,]+)', re.IGNORECASE),
+    'isbn': re.compile(r'ISBN[:\s]+([^\n,\s]+)', re.IGNORECASE),
+    'pages': re.compile(r'(?:Количество страниц|Страниц)[:\s]+([^\n,]+)', re.IGNORECASE),
+    'height': re.compile(r'Высота издания[:\s]+([^\n,]+)', re.IGNORECASE),
+    'width': re.compile(r'Ширина издания[:\s]+([^\n,]+)', re.IGNORECASE),
+    'thickness': re.compile(r'Толщина издания[:\s]+([^\n,]+)', re.IGNORECASE),
+    'product_code': re.compile(r'Код товара[:\s]+([^\n,]+)', re.IGNORECASE),
+}
+PRICE_CURRENT_PATTERN = re.compile(r'(?:Цена со скидкой:|Цена:)\s*(?:\*\*)?(\d+(?:\s*\d+)*)\s*₸')
+PRICE_ORIGINAL_PATTERN = re.compile(r'~~(\d+(?:\s*\d+)*)\s*₸~~')
+DISCOUNT_PATTERN = re.compile(r'\*\*(-\d+%)\*\*')
+DELIVERY_DATE_PATTERN = re.compile(r'\d+\s+' + MONTHS)
+RATING_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(?:из\s*5|★|⭐)')
+REVIEWS_PATTERN = re.compile(r'(\d+)\s*отзыв')
+
+# (class name, exact token match) pairs, mirroring `.name` / `[class*="name"]` selectors
+TITLE_CLASS_SELECTORS = [('title', True), ('title', False), ('name', False)]
+DESCRIPTION_CLASS_SELECTORS = [
+    ('description', True), ('description', False),
+    ('content', True), ('content', False),
+    ('summary', True), ('summary', False),
+    ('about', True), ('about', False),
+    ('details', True), ('details', False),
+]
+CLASS_HINT_PATTERN = re.compile(r'title|name|description|content|summary|about|details')
+DESCRIPTION_KEYWORDS = ('книга', 'автор', 'глава', 'история', 'читатель', 'произведение')
+# Fields only the detail page has that the cleaning stage keeps; lazy runs fetch details only when they are missing
+DETAIL_FIELDS = ('description', 'publisher')
 
 
 @dataclass
@@ -42,246 +102,690 @@ class BookInfo:
             self.additional_images = []
 
 
+BOOK_FIELDS = [f.name for f in fields(BookInfo)]
+
+
+def book_to_csv_row(book: BookInfo) -> Dict:
+    """Convert a book to a CSV row, joining the image list into one cell"""
+    book_dict = asdict(book)
+    book_dict['additional_images'] = '; '.join(book.additional_images)
+    return book_dict
+
+
+def export_books_json(jsonl_path: str, json_path: str) -> int:
+    """Write the books of a JSON Lines file as one JSON array, the ``books_data.json`` layout
+
+    Books are streamed one at a time; the output matches ``json.dump(books, indent=2)``.
+    Returns the number of books written.
+    """
+    count = 0
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as json_file:
+        json_file.write('[')
+        for book in read_books_jsonl(jsonl_path):
+            text = json.dumps(asdict(book), ensure_ascii=False, indent=2).replace('\n', '\n  ')
+            json_file.write((',\n  ' if count else '\n  ') + text)
+            count += 1
+        json_file.write('\n]' if count else ']')
+    os.replace(tmp_path, json_path)
+    return count
+
+
+def read_books_jsonl(jsonl_path: str) -> Iterator[BookInfo]:
+    """Read books back from a JSON Lines file, skipping a torn last line"""
+    with open(jsonl_path, encoding='utf-8') as jsonl_file:
+        for line in jsonl_file:
+            try:
+                yield BookInfo(**json.loads(line))
+            except (json.JSONDecodeError, TypeError):
+                continue
+
+
+def rewrite_books(books: List[BookInfo], jsonl_path: str, csv_path: str = None):
+    """Replace a dataset with ``books``: written next to it, then swapped in
+
+    ``books_data.json`` is exported again when it exists.
+    """
+    tmp_csv_path = csv_path + '.tmp' if csv_path else None
+    with StreamingBookWriter(jsonl_path + '.tmp', tmp_csv_path, flush_every=1000, append=False) as writer:
+        for book in books:
+            writer.write(book)
+    os.replace(jsonl_path + '.tmp', jsonl_path)
+    if csv_path:
+        os.replace(tmp_csv_path, csv_path)
+    json_path = os.path.join(os.path.dirname(jsonl_path), 'books_data.json')
+    if os.path.exists(json_path):
+        export_books_json(jsonl_path, json_path)
+
+
+def fill_missing_fields(jsonl_path: str, csv_path: str, books: Iterable[BookInfo]) -> int:
+    """Fill the empty fields of a dataset's rows from ``books`` with the same URL
+
+    Fields the dataset already has, such as prices from a later crawl, are kept.
+    The dataset is rewritten only if a row changed; returns the rows filled.
+    """
+    if not os.path.exists(jsonl_path):
+        return 0
+    rows = list(read_books_jsonl(jsonl_path))
+    urls = {row.book_url for row in rows if row.book_url}
+    sources = {book.book_url: book for book in books if book.book_url in urls}
+    filled = 0
+    for row in rows:
+        source = sources.get(row.book_url)
+        if source is None:
+            continue
+        missing = [field.name for field in fields(BookInfo)
+                   if not getattr(row, field.name) and getattr(source, field.name)]
+        for name in missing:
+            setattr(row, name, getattr(source, name))
+        filled += bool(missing)
+    if filled:
+        rewrite_books(rows, jsonl_path, csv_path)
+    return filled
+
+
+class StreamingBookWriter:
+    """Append books to CSV and JSON Lines as they are scraped, flushing periodically"""
+
+    def __init__(self, jsonl_path: str, csv_path: str = None, flush_every: int = 10, append: bool = True):
+        self.flush_every = flush_every
+        self.pending = 0
+        mode = 'a' if append else 'w'
+
+        os.makedirs(os.path.dirname(jsonl_path) or '.', exist_ok=True)
+        self.jsonl_file = open(jsonl_path, mode, encoding='utf-8')
+
+        self.csv_file = None
+        self.csv_writer = None
+        if csv_path:
+            os.makedirs(os.path.dirname(csv_path) or '.', exist_ok=True)
+            write_header = mode == 'w' or not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+            self.csv_file = open(csv_path, mode, newline='', encoding='utf-8')
+            self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=BOOK_FIELDS)
+            if write_header:
+                self.csv_writer.writeheader()
+
+    def write(self, book: BookInfo) -> bool:
+        """Write one book; returns True when this write triggered a flush"""
+        self.jsonl_file.write(json.dumps(asdict(book), ensure_ascii=False) + '\n')
+        if self.csv_writer:
+            self.csv_writer.writerow(book_to_csv_row(book))
+
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        self.jsonl_file.flush()
+        if self.csv_file:
+            self.csv_file.flush()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.jsonl_file.close()
+        if self.csv_file:
+            self.csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CrawlCheckpoint:
+    """Crawl frontier of a run: the catalog page in progress and the book URLs already written
+
+    The page state is rewritten atomically, processed URLs go to an append-only log
+    next to it, so saving stays cheap however long the run gets.
+    """
+
+    def __init__(self, path: str, catalog_url: str):
+        self.path = path
+        self.urls_path = path + '.urls'
+        self.catalog_url = catalog_url
+        self.page_num = 1
+        self.books_written = 0
+        self.completed = False
+        self.processed_urls = set()
+        self.page_fingerprints = {}
+        self.urls_file = None
+
+    def load(self) -> bool:
+        """Load a checkpoint for the same catalog URL; returns True if one was found"""
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, encoding='utf-8') as checkpoint_file:
+            state = json.load(checkpoint_file)
+        if state.get('catalog_url') != self.catalog_url:
+            return False
+
+        self.page_num = state.get('page_num', 1)
+        self.books_written = state.get('books_written', 0)
+        self.completed = state.get('completed', False)
+        self.page_fingerprints = state.get('page_fingerprints', {})
+        if os.path.exists(self.urls_path):
+            with open(self.urls_path, encoding='utf-8') as urls_file:
+                self.processed_urls = {line.rstrip('\n') for line in urls_file if line.strip()}
+            # The URL log can run ahead of the last saved state
+            self.books_written = max(self.books_written, len(self.processed_urls))
+        return True
+
+    def reset(self):
+        """Forget any previous progress"""
+        for path in (self.path, self.urls_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def mark_processed(self, book_url: str = None):
+        """Count a written book and remember its URL so a resumed run skips it"""
+        self.books_written += 1
+        if not book_url:
+            return
+        if self.urls_file is None:
+            os.makedirs(os.path.dirname(self.urls_path) or '.', exist_ok=True)
+            self.urls_file = open(self.urls_path, 'a', encoding='utf-8')
+        self.processed_urls.add(book_url)
+        self.urls_file.write(book_url + '\n')
+
+    def save(self):
+        """Persist the frontier; call right after the output writers are flushed"""
+        if self.urls_file:
+            self.urls_file.flush()
+
+        state = {
+            'catalog_url': self.catalog_url,
+            'page_num': self.page_num,
+            'books_written': self.books_written,
+            'completed': self.completed,
+            'page_fingerprints': self.page_fingerprints,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(state, checkpoint_file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        self.save()
+        if self.urls_file:
+            self.urls_file.close()
+            self.urls_file = None
+
+
+class RateLimiter:
+    """Token bucket shared by every scraper in a process to enforce a global request rate"""
+
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        self.interval = 1.0 / requests_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) / self.interval)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+def create_session(pool_size: int = 10, pool_hosts: int = 4) -> requests.Session:
+    """Create a browser-like HTTP session whose connection pool fits ``pool_size`` concurrent requests
+
+    ``pool_hosts`` is how many per-host pools are kept (site, image CDN, ...); each
+    keeps up to ``pool_size`` keep-alive connections, so size it to the crawl concurrency.
+    """
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+    })
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def connection_pool_stats(session: requests.Session) -> Dict:
+    """Count connections opened vs requests sent over a session's pools, to confirm keep-alive works"""
+    connections = 0
+    requests_sent = 0
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen or not isinstance(adapter, HTTPAdapter):
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+    return {
+        'connections_opened': connections,
+        'requests_sent': requests_sent,
+        'connections_reused': max(requests_sent - connections, 0),
+        'reuse_ratio': (requests_sent - connections) / requests_sent if requests_sent else 0.0,
+    }
+
+
+def catalog_page_url(catalog_url: str, page_num: int) -> str:
+    return f"{catalog_url}&page={page_num}" if '?' in catalog_url else f"{catalog_url}?page={page_num}"
+
+
+def apply_catalog_offer(book: BookInfo, catalog_book: Dict) -> bool:
+    """Take price, discount and availability from a catalog card; returns True if any changed"""
+    before = (book.price_current, book.price_original, book.discount, book.availability)
+    # A card with a price shows the full offer: a missing discount means it has ended
+    if catalog_book.get('price_current'):
+        book.price_current = catalog_book['price_current']
+        book.price_original = catalog_book.get('price_original', '')
+        book.discount = catalog_book.get('discount', '')
+    if catalog_book.get('availability'):
+        book.availability = catalog_book['availability']
+    return (book.price_current, book.price_original, book.discount, book.availability) != before
+
+
+def page_fingerprint(catalog_books: List[Dict]) -> Optional[str]:
+    """Identify a catalog page by the set of products it lists, or None if it links none"""
+    book_urls = sorted({book['book_url'] for book in catalog_books if book.get('book_url')})
+    if not book_urls:
+        return None
+    return hashlib.sha1('\n'.join(book_urls).encode('utf-8')).hexdigest()
+
+
 class FlipBooksScraper:
-    def __init__(self, base_url: str = "https://www.flip.kz"):
+    def __init__(self, base_url: str = "https://www.flip.kz", session: requests.Session = None,
+                 rate_limiter: RateLimiter = None, image_store: ImageStore = None,
+                 max_image_bytes: int = MAX_IMAGE_BYTES, archive: HttpArchive = None, replay: bool = False,
+                 cover_tensors=None):
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
-        
+        self.max_image_bytes = max_image_bytes
+        # Scrapers crawling in parallel share one session (and its connection pool) and one rate limiter
+        self.session = session or create_session()
+        self.rate_limiter = rate_limiter
+        # Shared image store; run_scraper opens one under its output directory when not given
+        self.image_store = image_store
+        # Responses are recorded to the archive, or with ``replay`` served from it without touching the network
+        if replay and archive is None:
+            raise ValueError("replay needs an archive to read responses from")
+        self.archive = archive
+        self.replay = replay
+        # Optional flip_book_image_tensors.CoverTensorShards: each stored cover is also decoded into it once
+        self.cover_tensors = cover_tensors
+        self.requests_made = 0
+        self.stats = CrawlStats()
+
+    def _wait_for_budget(self):
+        """Wait for the shared rate limit; callers do this before starting their fetch clock"""
+        if self.rate_limiter and not self.replay:
+            with self.stats.stage('rate_limit'):
+                self.rate_limiter.acquire()
+
+    def _request(self, url: str, stream: bool = False) -> requests.Response:
+        """Send a GET; the caller has already waited for the rate limit with ``_wait_for_budget``
+
+        Streamed responses are not archived here; the caller records the body once
+        it has read and checked it.
+        """
+        if self.replay:
+            return self.archive.response(url)
+        self.requests_made += 1
+        response = self.session.get(url, timeout=30, stream=stream)
+        if self.archive is not None and not stream:
+            self.archive.record_response(url, response)
+        return response
+
+    def _pause(self, low: float, high: float):
+        """Politeness delay between requests; a shared rate limiter already paces them"""
+        if not self.rate_limiter and not self.replay:
+            with self.stats.stage('sleep'):
+                time.sleep(random.uniform(low, high))
+
     def get_page(self, url: str, retries: int = 3) -> Optional[BeautifulSoup]:
         """Fetch and parse a web page with retry logic"""
         for attempt in range(retries):
             try:
-                print(f"Fetching: {url} (attempt {attempt + 1})")
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                return BeautifulSoup(response.content, 'html.parser')
+                logger.debug("Fetching: %s (attempt %d)", url, attempt + 1)
+                self._wait_for_budget()
+                start = time.perf_counter()
+                with self.stats.stage('fetch'):
+                    response = self._request(url)
+                    response.raise_for_status()
+                    content = response.content
+                self.stats.add_latency('page', time.perf_counter() - start, len(content))
+                with self.stats.stage('parse'):
+                    return BeautifulSoup(content, 'html.parser')
             except Exception as e:
-                print(f"Error fetching {url}: {e}")
+                logger.warning("Error fetching %s: %s", url, e)
                 if attempt < retries - 1:
-                    time.sleep(random.uniform(2, 5))
+                    self.stats.add_retry()
+                    if not self.replay:
+                        with self.stats.stage('sleep'):
+                            time.sleep(random.uniform(2, 5))
                 else:
-                    print(f"Failed to fetch {url} after {retries} attempts")
+                    logger.warning("Failed to fetch %s after %d attempts", url, retries)
                     return None
         return None
 
     def download_image(self, image_url: str, save_path: str) -> bool:
-        """Download an image from URL to local path"""
+        """Stream an image from URL to local path
+
+        The body is written in chunks to a temporary file that is renamed into place
+        only once complete, so a failed or oversized download never leaves a partial file.
+        """
+        tmp_path = save_path + '.part'
         try:
             if not image_url:
                 return False
                 
-            # Handle relative URLs
-            if image_url.startswith('//'):
-                image_url = 'https:' + image_url
-            elif image_url.startswith('/'):
-                image_url = self.base_url + image_url
-            elif not image_url.startswith('http'):
-                image_url = self.base_url + '/' + image_url.lstrip('/')
-            
-            print(f"Downloading image: {image_url}")
-            response = self.session.get(image_url, timeout=30)
-            response.raise_for_status()
+            image_url = self.absolute_url(image_url)
             
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            
-            with open(save_path, 'wb') as f:
-                f.write(response.content)
+            logger.debug("Downloading image: %s", image_url)
+            self._wait_for_budget()
+            start = time.perf_counter()
+            with self._request(image_url, stream=True) as response:
+                response.raise_for_status()
+
+                content_type = response.headers.get('Content-Type', '')
+                if not content_type.startswith('image/'):
+                    raise ValueError(f"unexpected content type {content_type!r}")
+                content_length = int(response.headers.get('Content-Length') or 0)
+                if content_length > self.max_image_bytes:
+                    raise ValueError(f"image is {content_length} bytes, limit is {self.max_image_bytes}")
+
+                os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+
+                size = 0
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=IMAGE_CHUNK_BYTES):
+                        size += len(chunk)
+                        if size > self.max_image_bytes:
+                            raise ValueError(f"image exceeds {self.max_image_bytes} bytes")
+                        f.write(chunk)
+                if self.archive is not None and not self.replay:
+                    # Archive the validated file, not the stream: the checks above still apply
+                    with open(tmp_path, 'rb') as f:
+                        self.archive.record(image_url, response.status_code, response.headers, f.read())
+            os.replace(tmp_path, save_path)
+            self.stats.add_latency('image', time.perf_counter() - start, size)
             
-            print(f"Image saved: {save_path}")
+            logger.debug("Image saved: %s", save_path)
             return True
             
         except Exception as e:
-            print(f"Error downloading image {image_url}: {e}")
+            logger.warning("Error downloading image %s: %s", image_url, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
 
+    def absolute_url(self, url: str) -> str:
+        """Handle relative and protocol-relative URLs"""
+        if url.startswith('//'):
+            return 'https:' + url
+        elif url.startswith('/'):
+            return self.base_url + url
+        elif not url.startswith('http'):
+            return self.base_url + '/' + url.lstrip('/')
+        return url
+
+    def store_image(self, image_url: str, book_url: str, image_store: ImageStore):
+        """Fetch a cover into the content-addressed store unless it is already there
+
+        Returns ``(path, status, size)`` where status is 'cached' (no request sent),
+        'new', 'duplicate' (downloaded, but the same bytes were already stored) or 'failed'.
+        """
+        with self.stats.stage('image_io'):
+            image_url = self.absolute_url(image_url)
+            cached_path = image_store.lookup(image_url, book_url)
+            if cached_path:
+                return cached_path, 'cached', image_store.blob_size(cached_path)
+
+            image_extension = os.path.splitext(urlparse(image_url).path)[1] or '.jpg'
+            tmp_path = image_store.temp_path(image_extension)
+            if not self.download_image(image_url, tmp_path):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return None, 'failed', 0
+
+            path, is_new = image_store.add_file(tmp_path, image_url, book_url)
+            return path, 'new' if is_new else 'duplicate', image_store.blob_size(path)
+
     def extract_book_info_from_catalog(self, soup: BeautifulSoup, page_url: str) -> List[Dict]:
         """Extract basic book info from catalog page"""
         book_data = []
-        
+
         # Method 1: Look for images with product URLs (most reliable for Flip.kz)
-        img_elements = soup.find_all('img', src=re.compile(r'prod/\d+.*\.(jpg|png|webp)'))
-        
+        img_elements = soup.find_all('img', src=PRODUCT_IMAGE_PATTERN)
+        # Cards share their row and grid ancestors; each container's text is built and
+        # parsed once per page
+        container_fields = {}
+
         for img in img_elements:
             try:
                 book_info = {
                     'image_url': img.get('src'),
                     'title': img.get('alt', '').strip(),
                 }
-                
+
                 # Find the parent link to get book URL
-                link_parent = img.find_parent('a')
-                if link_parent and link_parent.get('href'):
-                    href = link_parent.get('href')
-                    if 'catalog?prod=' in href or 'item' in href:
-                        book_info['book_url'] = urljoin(self.base_url, href)
-                
-                # Find container with price and other info
-                # Look for price in various parent containers
+                href = None
+                for parent in img.parents:
+                    if parent.name == 'a':
+                        href = parent.get('href')
+                        break
+                if href and ('catalog?prod=' in href or 'item' in href):
+                    book_info['book_url'] = urljoin(self.base_url, href)
+
+                # Look for price and other info in the parent containers. A card without
+                # price or availability is read up into the surrounding grid, as it always
+                # was; flip_book_scrapping_benchmark checks the output against the old parser
                 containers_to_check = []
                 current = img.parent
-                depth = 0
-                while current and depth < 5:  # Check up to 5 levels up
+                while current and len(containers_to_check) < 5:  # Check up to 5 levels up
                     containers_to_check.append(current)
                     current = current.parent
-                    depth += 1
-                
+
                 for container in containers_to_check:
-                    if not container:
-                        continue
-                        
-                    container_text = container.get_text()
-                    
-                    # Extract prices
-                    price_matches = re.findall(r'(\d+(?:\s*\d+)*)\s*₸', container_text)
-                    if price_matches:
-                        # Clean prices (remove spaces within numbers)
-                        prices = [price.replace(' ', '') for price in price_matches]
-                        # Remove duplicates and sort
-                        unique_prices = sorted(set(prices), key=lambda x: int(x))
-                        
-                        if len(unique_prices) >= 2:
-                            book_info['price_current'] = unique_prices[0] + ' ₸'
-                            book_info['price_original'] = unique_prices[-1] + ' ₸'
-                            # Calculate discount
-                            try:
-                                current_price = int(unique_prices[0])
-                                original_price = int(unique_prices[-1])
-                                if original_price > current_price:
-                                    discount = round((1 - current_price / original_price) * 100)
-                                    book_info['discount'] = f"-{discount}%"
-                            except:
-                                pass
-                        elif len(unique_prices) == 1:
-                            book_info['price_current'] = unique_prices[0] + ' ₸'
-                    
-                    # Extract availability
-                    if 'На складе' in container_text:
-                        book_info['availability'] = 'На складе'
-                    elif 'Завтра' in container_text:
-                        book_info['availability'] = 'Завтра'
-                    elif 'июня' in container_text or 'июля' in container_text:
-                        # Extract specific date
-                        date_match = re.search(r'(\d+)\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)', container_text)
-                        if date_match:
-                            book_info['availability'] = date_match.group(0)
-                    
+                    parsed = container_fields.get(id(container))
+                    if parsed is None:
+                        parsed = container_fields[id(container)] = self._parse_catalog_card_text(container.get_text())
+                    card_fields, title_line = parsed
+                    book_info.update(card_fields)
                     # Try to extract title if not found in alt text
-                    if not book_info.get('title'):
-                        # Look for text that could be a title
-                        lines = [line.strip() for line in container_text.split('\n') if line.strip()]
-                        for line in lines:
-                            # Skip prices, availability, and other metadata
-                            if (len(line) > 10 and 
-                                not re.match(r'^\d+\s*₸', line) and 
-                                'На складе' not in line and 
-                                'Завтра' not in line and
-                                not re.match(r'^-?\d+%', line) and
-                                'мягкая обложка' not in line and
-                                'твердый переплет' not in line and
-                                not re.match(r'^\d{4}$', line)):  # Not just a year
-                                
-                                book_info['title'] = line
-                                break
-                    
-                    # Extract binding type
-                    if 'мягкая обложка' in container_text:
-                        book_info['binding'] = 'мягкая обложка'
-                    elif 'твердый переплет' in container_text:
-                        book_info['binding'] = 'твердый переплет'
-                    
-                    # If we found some info, break out of container loop
+                    if not book_info.get('title') and title_line:
+                        book_info['title'] = title_line
+
+                    # If we found some info, stop at this container
                     if book_info.get('price_current') or book_info.get('availability'):
                         break
-                
+
                 # Only add if we have meaningful data
                 if book_info.get('image_url') or book_info.get('title') or book_info.get('book_url'):
                     book_data.append(book_info)
-                    
+
             except Exception as e:
-                print(f"Error extracting book info: {e}")
+                logger.warning("Error extracting book info: %s", e)
                 continue
-        
+
         # Method 2: Alternative approach - look for product containers
         if not book_data:
-            product_containers = soup.find_all(['div', 'article', 'section'], class_=re.compile(r'product|item|book|card'))
-            
+            product_containers = soup.find_all(['div', 'article', 'section'], class_=PRODUCT_CONTAINER_PATTERN)
+
             for container in product_containers:
                 try:
                     book_info = {}
-                    
+
                     # Find image
                     img = container.find('img', src=True)
                     if img:
                         book_info['image_url'] = img.get('src')
                         book_info['title'] = img.get('alt', '').strip()
-                    
+
                     # Find link
                     link = container.find('a', href=True)
                     if link:
                         book_info['book_url'] = urljoin(self.base_url, link.get('href'))
-                    
+
                     # Extract other info from container text
                     container_text = container.get_text()
-                    
+
                     # Extract prices
-                    price_matches = re.findall(r'(\d+(?:\s*\d+)*)\s*₸', container_text)
+                    price_matches = PRICE_PATTERN.findall(container_text)
                     if price_matches:
                         prices = [price.replace(' ', '') for price in price_matches]
                         unique_prices = sorted(set(prices), key=lambda x: int(x))
-                        
+
                         if len(unique_prices) >= 2:
                             book_info['price_current'] = unique_prices[0] + ' ₸'
                             book_info['price_original'] = unique_prices[-1] + ' ₸'
                         elif len(unique_prices) == 1:
                             book_info['price_current'] = unique_prices[0] + ' ₸'
-                    
+
                     if book_info:
                         book_data.append(book_info)
-                        
+
                 except Exception as e:
-                    print(f"Error in alternative extraction: {e}")
+                    logger.warning("Error in alternative extraction: %s", e)
                     continue
-        
+
         return book_data
 
+    @staticmethod
+    def _parse_catalog_card_text(container_text: str) -> Tuple[Dict, Optional[str]]:
+        """Prices, availability and binding found in a card container's text, and its first title-like line"""
+        book_info = {}
+        # Extract prices
+        price_matches = PRICE_PATTERN.findall(container_text)
+        if price_matches:
+            # Clean prices (remove spaces within numbers)
+            prices = [price.replace(' ', '') for price in price_matches]
+            # Remove duplicates and sort
+            unique_prices = sorted(set(prices), key=lambda x: int(x))
+
+            if len(unique_prices) >= 2:
+                book_info['price_current'] = unique_prices[0] + ' ₸'
+                book_info['price_original'] = unique_prices[-1] + ' ₸'
+                # Calculate discount
+                current_price = int(unique_prices[0])
+                original_price = int(unique_prices[-1])
+                if original_price > current_price:
+                    discount = round((1 - current_price / original_price) * 100)
+                    book_info['discount'] = f"-{discount}%"
+            elif len(unique_prices) == 1:
+                book_info['price_current'] = unique_prices[0] + ' ₸'
+
+        # Extract availability
+        if 'На складе' in container_text:
+            book_info['availability'] = 'На складе'
+        elif 'Завтра' in container_text:
+            book_info['availability'] = 'Завтра'
+        elif 'июня' in container_text or 'июля' in container_text:
+            # Extract specific date
+            date_match = DELIVERY_DATE_PATTERN.search(container_text)
+            if date_match:
+                book_info['availability'] = date_match.group(0)
+
+        # Look for text that could be a title
+        title_line = None
+        for line in container_text.split('\n'):
+            line = line.strip()
+            # Skip prices, availability, and other metadata
+            if (len(line) > 10 and
+                not PRICE_PREFIX_PATTERN.match(line) and
+                'На складе' not in line and
+                'Завтра' not in line and
+                not DISCOUNT_PREFIX_PATTERN.match(line) and
+                'мягкая обложка' not in line and
+                'твердый переплет' not in line and
+                not YEAR_PATTERN.match(line)):  # Not just a year
+
+                title_line = line
+                break
+
+        # Extract binding type
+        if 'мягкая обложка' in container_text:
+            book_info['binding'] = 'мягкая обложка'
+        elif 'твердый переплет' in container_text:
+            book_info['binding'] = 'твердый переплет'
+        return book_info, title_line
+
     def extract_detailed_book_info(self, book_url: str) -> BookInfo:
         """Extract detailed information from individual book page"""
         soup = self.get_page(book_url)
         if not soup:
             return BookInfo(book_url=book_url)
-        
+
+        with self.stats.stage('extract'):
+            return self.parse_book_page(soup, book_url)
+
+    def parse_book_page(self, soup: BeautifulSoup, book_url: str) -> BookInfo:
+        """Extract book fields from a parsed book page in a single pass"""
         book = BookInfo(book_url=book_url)
-        
+
         try:
+            # One DOM walk collects title, description and image candidates
+            title_candidates = [None] * len(TITLE_CLASS_SELECTORS)
+            first_h1 = None
+            paragraphs = []
+            desc_candidates = [[] for _ in DESCRIPTION_CLASS_SELECTORS]
+            text_blocks = []
+            prod_images = []
+
+            for elem in soup.find_all(True):
+                name = elem.name
+                classes = elem.get('class') or []
+                class_attr = ' '.join(classes)
+
+                if name == 'h1' and first_h1 is None:
+                    first_h1 = elem
+                elif name == 'img':
+                    src = elem.get('src')
+                    if src and 'prod/' in src:
+                        prod_images.append(src)
+                if name == 'p':
+                    paragraphs.append(elem)
+                if name in ('div', 'span', 'p'):
+                    string = elem.string
+                    if string is not None and LONG_TEXT_PATTERN.search(string):
+                        text_blocks.append(elem)
+
+                if not class_attr or not CLASS_HINT_PATTERN.search(class_attr):
+                    continue
+                for i, (token, exact) in enumerate(TITLE_CLASS_SELECTORS):
+                    if title_candidates[i] is None and (token in classes if exact else token in class_attr):
+                        title_candidates[i] = elem
+                for i, (token, exact) in enumerate(DESCRIPTION_CLASS_SELECTORS):
+                    if token in classes if exact else token in class_attr:
+                        desc_candidates[i].append(elem)
+
             # Extract title
-            title_selectors = ['h1', '.title', '[class*="title"]', '[class*="name"]']
-            for selector in title_selectors:
-                title_elem = soup.select_one(selector)
+            for title_elem in [first_h1] + title_candidates:
                 if title_elem:
                     book.title = title_elem.get_text().strip()
                     break
-            
-            # Extract description - Enhanced to find book descriptions
+
+            # Extract description - long paragraphs first, then description-like blocks
             description_found = False
-            
-            # Method 1: Look for specific description patterns
-            page_text = soup.get_text()
-            
-            # Find long paragraphs that look like book descriptions
-            paragraphs = soup.find_all('p')
             for p in paragraphs:
                 text = p.get_text().strip()
-                # Look for substantial text that might be a description
-                if (len(text) > 200 and 
-                    not re.match(r'^\d+\s*₸', text) and  # Not just price
+                if (len(text) > 200 and
+                    not PRICE_PREFIX_PATTERN.match(text) and
                     'Цена:' not in text and
                     'ISBN' not in text and
                     'Издательство' not in text and
@@ -289,19 +793,9 @@ class FlipBooksScraper:
                     book.description = text
                     description_found = True
                     break
-            
-            # Method 2: Look for description in div elements
+
             if not description_found:
-                desc_selectors = [
-                    '.description', '[class*="description"]', 
-                    '.content', '[class*="content"]',
-                    '.summary', '[class*="summary"]',
-                    '.about', '[class*="about"]',
-                    '.details', '[class*="details"]'
-                ]
-                
-                for selector in desc_selectors:
-                    elements = soup.select(selector)
+                for elements in desc_candidates:
                     for elem in elements:
                         text = elem.get_text().strip()
                         if len(text) > 100:  # Likely description
@@ -310,59 +804,38 @@ class FlipBooksScraper:
                             break
                     if description_found:
                         break
-            
-            # Method 3: Look for text blocks similar to your example
+
             if not description_found:
-                # Look for text that contains typical book description patterns
-                text_blocks = soup.find_all(['div', 'span', 'p'], string=re.compile(r'.{200,}'))
                 for block in text_blocks:
                     text = block.get_text().strip()
-                    # Check if it looks like a book description
-                    if (len(text) > 200 and
-                        ('книга' in text.lower() or 'автор' in text.lower() or 
-                         'глава' in text.lower() or 'история' in text.lower() or
-                         'читатель' in text.lower() or 'произведение' in text.lower())):
+                    lowered = text.lower()
+                    if len(text) > 200 and any(word in lowered for word in DESCRIPTION_KEYWORDS):
                         book.description = text
-                        description_found = True
-                        break
-            
-            # Extract main image
-            img_selectors = ['img[src*="prod/"]', '.main-image img', '.product-image img', 'img']
-            for selector in img_selectors:
-                img = soup.select_one(selector)
-                if img and img.get('src'):
-                    src = img.get('src')
-                    if 'prod/' in src:
-                        book.main_image_url = src
                         break
-            
-            # Extract additional images
-            all_images = soup.find_all('img', src=True)
-            for img in all_images:
-                src = img.get('src')
-                if src and 'prod/' in src and src != book.main_image_url:
-                    book.additional_images.append(src)
-            
-            # Extract prices with enhanced regex
+
+            # Extract main and additional images
+            if prod_images:
+                book.main_image_url = prod_images[0]
+                book.additional_images = [src for src in prod_images if src != book.main_image_url]
+
+            # Extract prices, labelled fields and availability from one text materialisation
             text = soup.get_text()
-            
-            # Look for crossed out prices and current prices
-            price_current_match = re.search(r'(?:Цена со скидкой:|Цена:)\s*(?:\*\*)?(\d+(?:\s*\d+)*)\s*₸', text)
+
+            price_current_match = PRICE_CURRENT_PATTERN.search(text)
             if price_current_match:
                 book.price_current = price_current_match.group(1).replace(' ', '') + ' ₸'
-            
-            price_original_match = re.search(r'~~(\d+(?:\s*\d+)*)\s*₸~~', text)
+
+            price_original_match = PRICE_ORIGINAL_PATTERN.search(text)
             if price_original_match:
                 book.price_original = price_original_match.group(1).replace(' ', '') + ' ₸'
-            
-            # Extract discount percentage
-            discount_match = re.search(r'\*\*(-\d+%)\*\*', text)
+
+            discount_match = DISCOUNT_PATTERN.search(text)
             if discount_match:
                 book.discount = discount_match.group(1)
-            
+
             # Fallback: general price extraction
             if not book.price_current:
-                price_matches = re.findall(r'(\d+(?:\s*\d+)*)\s*₸', text)
+                price_matches = PRICE_PATTERN.findall(text)
                 if price_matches:
                     prices = [price.replace(' ', '') for price in price_matches]
                     prices = sorted(set(prices), key=lambda x: int(x))
@@ -371,178 +844,470 @@ class FlipBooksScraper:
                         book.price_original = prices[-1] + ' ₸'
                     elif len(prices) == 1:
                         book.price_current = prices[0] + ' ₸'
-            
-            # Extract detailed information from the page text
-            # Look for patterns like "Издательство: ...", "Язык: ...", etc.
-            info_patterns = {
-                'publisher': r'Издательство[:\s]+([^\n,]+)',
-                'language': r'Язык[:\s]+([^\n,]+)',
-                'binding': r'(?:Переплет|Обложка)[:\s]+([^\n,]+)',
-                'publication_date': r'(?:Дата выхода|Год издания)[:\s]+([^\n,]+)',
-                'isbn': r'ISBN[:\s]+([^\n,\s]+)',
-                'pages': r'(?:Количество страниц|Страниц)[:\s]+([^\n,]+)',
-                'height': r'Высота издания[:\s]+([^\n,]+)',
-                'width': r'Ширина издания[:\s]+([^\n,]+)',
-                'thickness': r'Толщина издания[:\s]+([^\n,]+)',
-                'product_code': r'Код товара[:\s]+([^\n,]+)',
-            }
-            
-            for field, pattern in info_patterns.items():
-                match = re.search(pattern, text, re.IGNORECASE)
+
+            for field, pattern in INFO_PATTERNS.items():
+                match = pattern.search(text)
                 if match:
                     setattr(book, field, match.group(1).strip())
-            
+
             # Extract availability
             if 'На складе' in text:
                 book.availability = 'На складе'
             elif 'Завтра' in text:
                 book.availability = 'Завтра'
-            elif re.search(r'\d+\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)', text):
-                date_match = re.search(r'(\d+\s+(?:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря))', text)
+            else:
+                date_match = DELIVERY_DATE_PATTERN.search(text)
                 if date_match:
-                    book.availability = date_match.group(1)
-            
+                    book.availability = date_match.group(0)
+
             # Extract rating and reviews
-            rating_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:из\s*5|★|⭐)', text)
+            rating_match = RATING_PATTERN.search(text)
             if rating_match:
                 book.rating = rating_match.group(1)
-            
-            reviews_match = re.search(r'(\d+)\s*отзыв', text)
+
+            reviews_match = REVIEWS_PATTERN.search(text)
             if reviews_match:
                 book.reviews_count = reviews_match.group(1)
             elif 'Нет отзывов' in text:
                 book.reviews_count = '0'
-            
+
             # Extract author from title or description if present
             if book.title and not book.publisher:
                 # Sometimes author is in the title
-                author_match = re.search(r'^(.+?)\s+[-–—]\s+(.+)$', book.title)
+                author_match = TITLE_AUTHOR_PATTERN.search(book.title)
                 if author_match:
                     potential_author = author_match.group(2)
                     if len(potential_author.split()) <= 3:  # Likely an author name
                         book.publisher = potential_author
-            
+
         except Exception as e:
-            print(f"Error extracting detailed info from {book_url}: {e}")
-        
+            logger.warning("Error extracting detailed info from %s: %s", book_url, e)
+
         return book
 
-    def run_scraper(self, catalog_url: str, output_dir: str, max_pages: int = 10, csv_output_path: str = None) -> Dict:
-        """Main scraper function"""
-        print(f"Starting Flip.kz books scraper")
-        print(f"Catalog URL: {catalog_url}")
-        print(f"Output directory: {output_dir}")
-        print(f"Max pages: {max_pages}")
-        
+    def scrape_book(self, catalog_book: Dict, page_url: str, image_store: ImageStore,
+                    detailed_book: Optional[BookInfo] = None):
+        """Fetch a book's detail page, fill gaps from its catalog card and store its cover
+
+        ``detailed_book`` is the parsed detail page when the caller has already fetched it.
+        Returns ``(book, image_status, image_size)``; the status is None when the book has
+        no cover, otherwise as returned by ``store_image``.
+        """
+        # Get detailed information if we have a book URL
+        if detailed_book is None and catalog_book.get('book_url'):
+            detailed_book = self.extract_detailed_book_info(catalog_book['book_url'])
+        elif detailed_book is None:
+            detailed_book = BookInfo()
+            detailed_book.book_url = page_url
+
+        # Merge catalog info with detailed info
+        if not detailed_book.title and catalog_book.get('title'):
+            detailed_book.title = catalog_book['title']
+        if not detailed_book.main_image_url and catalog_book.get('image_url'):
+            detailed_book.main_image_url = catalog_book['image_url']
+        if not detailed_book.price_current and catalog_book.get('price_current'):
+            detailed_book.price_current = catalog_book['price_current']
+        if not detailed_book.price_original and catalog_book.get('price_original'):
+            detailed_book.price_original = catalog_book['price_original']
+        if not detailed_book.discount and catalog_book.get('discount'):
+            detailed_book.discount = catalog_book['discount']
+        if not detailed_book.availability and catalog_book.get('availability'):
+            detailed_book.availability = catalog_book['availability']
+        if not detailed_book.binding and catalog_book.get('binding'):
+            detailed_book.binding = catalog_book['binding']
+
+        # Download main image into the content-addressed store
+        if not detailed_book.main_image_url:
+            return detailed_book, None, 0
+        image_path, status, size = self.store_image(detailed_book.main_image_url, detailed_book.book_url, image_store)
+        if image_path:
+            detailed_book.local_image_path = image_path
+            if self.cover_tensors is not None:
+                with self.stats.stage('image_io'):
+                    self.cover_tensors.add(detailed_book.book_url, image_path)
+        return detailed_book, status, size
+
+    def reuse_book(self, known_book: BookInfo, catalog_book: Dict, image_store: ImageStore):
+        """Rebuild a book from its stored record and current catalog card without the detail page
+
+        Returns the same ``(book, image_status, image_size)`` as ``scrape_book``.
+        """
+        book = BookInfo(**asdict(known_book))
+        apply_catalog_offer(book, catalog_book)
+        if not book.main_image_url and catalog_book.get('image_url'):
+            book.main_image_url = catalog_book['image_url']
+        if not book.main_image_url:
+            return book, None, 0
+        # A stored cover is found in the image store without a request
+        image_path, status, size = self.store_image(book.main_image_url, book.book_url, image_store)
+        if image_path:
+            book.local_image_path = image_path
+            if self.cover_tensors is not None:
+                with self.stats.stage('image_io'):
+                    self.cover_tensors.add(book.book_url, image_path)
+        return book, status, size
+
+    def run_scraper(self, catalog_url: str, output_dir: str, max_pages: int = 10, csv_output_path: str = None,
+                    resume: bool = False, flush_every: int = 10, keep_dataset: bool = False,
+                    lazy_details: bool = False, report_path: str = None, typed_output: bool = False,
+                    json_output: bool = True, deferred_queue=None) -> Dict:
+        """Main scraper function
+
+        Books are appended to ``books_data.jsonl`` (and the CSV, if given) as soon as
+        they are scraped. With ``json_output`` the whole dataset is also written to
+        ``books_data.json`` at the end, as before streaming.
+
+        Only with ``resume`` is the checkpoint honoured: a run interrupted earlier
+        picks up at the catalog page it stopped on and skips book URLs it already
+        wrote, and a catalog the checkpoint marks complete is not crawled again.
+        Without it the checkpoint is reset and the crawl starts over.
+
+        ``result['dataset']`` holds the books of this run only with ``keep_dataset``;
+        otherwise it is empty and the books are read from ``jsonl_file`` or ``json_file``.
+
+        With ``lazy_details`` a book already in ``books_data.jsonl`` with all of
+        ``DETAIL_FIELDS`` filled is rebuilt from that record and its catalog card,
+        and its detail page is not fetched. With a ``deferred_queue`` (a
+        ``flip_book_crawl_queue.CrawlQueue``) the other books are not fetched
+        either: each is written from its stored record or catalog card, and its
+        detail page is queued as a low-priority item for queue workers. The
+        books those workers finished are merged into ``books_data.jsonl`` (and
+        the CSV) when the next run starts, see ``fill_missing_fields``.
+
+        With ``typed_output`` every book is also written with its numeric fields
+        parsed to ``<output_dir>/typed/``, see ``flip_book_typed_records``.
+
+        The result carries per-stage timings under ``stats``; ``report_path`` also
+        writes the result, without the dataset, there as JSON.
+        """
+        # Stage times and latencies are per run, also when the scraper is reused
+        self.stats = CrawlStats()
+        logger.info("Starting Flip.kz books scraper")
+        logger.info("Catalog URL: %s", catalog_url)
+        logger.info("Output directory: %s", output_dir)
+        logger.info("Max pages: %d", max_pages)
+
         # Create output directories
         os.makedirs(output_dir, exist_ok=True)
         images_dir = os.path.join(output_dir, 'images')
         os.makedirs(images_dir, exist_ok=True)
-        
+        jsonl_path = os.path.join(output_dir, 'books_data.jsonl')
+
+        checkpoint = CrawlCheckpoint(os.path.join(output_dir, 'crawl_checkpoint.json'), catalog_url)
+        resumed = resume and checkpoint.load()
+        if resumed:
+            logger.info("Resuming from page %d (%d books already written)",
+                        checkpoint.page_num, checkpoint.books_written)
+        else:
+            checkpoint.reset()
+
+        image_store = self.image_store or ImageStore(images_dir)
+
+        # Read before the writer opens, a fresh run truncates the file
+        if deferred_queue is not None:
+            merged = fill_missing_fields(jsonl_path, csv_output_path, deferred_queue.books())
+            logger.info("%d books completed from the deferred queue", merged)
+        known_books, incomplete_books = {}, {}
+        if lazy_details and os.path.exists(jsonl_path):
+            for book in read_books_jsonl(jsonl_path):
+                complete = all(getattr(book, field) for field in DETAIL_FIELDS)
+                (known_books if complete else incomplete_books)[book.book_url] = book
+
         all_books = []
-        successful_downloads = 0
-        failed_downloads = 0
-        
-        # Process pages
+        books_this_run = 0
+        skipped_books = 0
+        pages_avoided = 0
+        details_fetched = 0
+        details_skipped = 0
+        details_deferred = 0
+        image_counts = {'cached': 0, 'new': 0, 'duplicate': 0, 'failed': 0}
+        image_bytes_saved = 0
+
+        typed_writer = None
+        if typed_output:
+            typed_writer = TypedBookWriter(os.path.join(output_dir, 'typed'), flush_every, append=resumed)
+
+        with StreamingBookWriter(jsonl_path, csv_output_path, flush_every, append=resumed) as writer:
+            # Process pages
+            for page_num in range(checkpoint.page_num, max_pages + 1):
+                if checkpoint.completed:
+                    logger.info("Checkpoint says this catalog is already complete")
+                    break
+
+                checkpoint.page_num = page_num
+                page_url = catalog_page_url(catalog_url, page_num)
+
+                logger.info("--- Processing page %d ---", page_num)
+                soup = self.get_page(page_url)
+
+                if not soup:
+                    logger.warning("Failed to fetch page %d", page_num)
+                    continue
+
+                # Extract basic book info from catalog
+                with self.stats.stage('extract'):
+                    catalog_books = self.extract_book_info_from_catalog(soup, page_url)
+                logger.info("Found %d books on page %d", len(catalog_books), page_num)
+
+                # Past the last page some catalogs serve the last page again
+                fingerprint = page_fingerprint(catalog_books)
+                repeated_page = checkpoint.page_fingerprints.get(fingerprint)
+                if repeated_page is not None and repeated_page != page_num:
+                    logger.info("Page %d lists the same books as page %d, stopping", page_num, repeated_page)
+                    pages_avoided = max_pages - page_num
+                    checkpoint.completed = True
+                    break
+
+                # Process each book
+                for i, catalog_book in enumerate(catalog_books, 1):
+                    if catalog_book.get('book_url') in checkpoint.processed_urls:
+                        skipped_books += 1
+                        continue
+
+                    logger.debug("Processing book %d/%d on page %d", i, len(catalog_books), page_num)
+
+                    book_url = catalog_book.get('book_url')
+                    known_book = known_books.get(book_url)
+                    deferred = False
+                    if known_book:
+                        detailed_book, image_status, image_size = self.reuse_book(known_book, catalog_book, image_store)
+                        details_skipped += 1
+                    elif deferred_queue is not None and book_url:
+                        # Written from what is known now; queue workers fetch the detail page
+                        stored_book = incomplete_books.get(book_url)
+                        if stored_book:
+                            detailed_book, image_status, image_size = self.reuse_book(stored_book, catalog_book,
+                                                                                      image_store)
+                        else:
+                            detailed_book, image_status, image_size = self.scrape_book(
+                                catalog_book, page_url, image_store, BookInfo(book_url=book_url))
+                        deferred_queue.defer_detail(catalog_book, page_url)
+                        deferred = True
+                        details_deferred += 1
+                    else:
+                        detailed_book, image_status, image_size = self.scrape_book(catalog_book, page_url, image_store)
+                        if book_url:
+                            details_fetched += 1
+                    if image_status:
+                        image_counts[image_status] += 1
+                        if image_status in ('cached', 'duplicate'):
+                            image_bytes_saved += image_size
+
+                    with self.stats.stage('write'):
+                        checkpoint.mark_processed(catalog_book.get('book_url'))
+                        if typed_writer:
+                            typed_writer.write(to_typed(detailed_book))
+                        if writer.write(detailed_book):
+                            if typed_writer:
+                                typed_writer.flush()
+                            checkpoint.save()
+                    books_this_run += 1
+                    if keep_dataset:
+                        all_books.append(detailed_book)
+
+                    # Add delay between requests
+                    if not known_book and not deferred:
+                        self._pause(1, 3)
+
+                # Break if no books found (end of catalog)
+                if not catalog_books:
+                    logger.info("No books found on page %d, stopping", page_num)
+                    checkpoint.completed = True
+                    break
+
+                # Page done: the next run starts on the following page
+                if fingerprint:
+                    checkpoint.page_fingerprints[fingerprint] = page_num
+                with self.stats.stage('write'):
+                    writer.flush()
+                    if typed_writer:
+                        typed_writer.flush()
+                    checkpoint.page_num = page_num + 1
+                    checkpoint.save()
+
+                # Add delay between pages
+                self._pause(2, 5)
+
+            writer.flush()
+            if typed_writer:
+                typed_writer.close()
+        checkpoint.close()
+        if not self.image_store:
+            image_store.close()
+
+        stored_images = image_counts['cached'] + image_counts['new'] + image_counts['duplicate']
+
+        result = {
+            'dataset': all_books,
+            'csv_file': csv_output_path,
+            'jsonl_file': jsonl_path,
+            'json_file': os.path.join(output_dir, 'books_data.json') if json_output else None,
+            'typed_dir': typed_writer.directory if typed_writer else None,
+            'checkpoint_file': checkpoint.path,
+            'output_dir': output_dir,
+            'images_dir': image_store.root,
+            'total_books': checkpoint.books_written,
+            'books_this_run': books_this_run,
+            'skipped_books': skipped_books,
+            'pages_avoided': pages_avoided,
+            # Catalog pages not fetched past a repeated page, detail pages not fetched for books already written
+            'requests_avoided': pages_avoided + skipped_books,
+            'requests_made': self.requests_made,
+            'connection_pool': connection_pool_stats(self.session),
+            'detail_pages_fetched': details_fetched,
+            'detail_pages_skipped': details_skipped,
+            'detail_pages_deferred': details_deferred,
+            'detail_fetch_ratio': details_fetched / (details_fetched + details_skipped + details_deferred)
+                                  if details_fetched + details_skipped + details_deferred else 0.0,
+            'successful_image_downloads': image_counts['new'] + image_counts['duplicate'],
+            'failed_image_downloads': image_counts['failed'],
+            'images_reused': image_counts['cached'],
+            'duplicate_image_downloads': image_counts['duplicate'],
+            'image_dedup_ratio': (image_counts['cached'] + image_counts['duplicate']) / stored_images
+                                 if stored_images else 0.0,
+            'image_bytes_saved': image_bytes_saved,
+            'stats': self.stats.report(),
+        }
+        if json_output:
+            with self.stats.stage('write'):
+                export_books_json(jsonl_path, result['json_file'])
+        if report_path:
+            self.stats.write_report(report_path, {key: value for key, value in result.items() if key != 'dataset'})
+
+        return result
+
+    def refresh_prices(self, catalog_url: str, output_dir: str, max_pages: int = 10,
+                       csv_output_path: str = None) -> Dict:
+        """Update prices and availability of an existing dataset from catalog pages only
+
+        Books already in ``books_data.jsonl`` take price, discount and availability from
+        their catalog card and cost no extra request; detail pages and covers are fetched
+        only for book URLs not seen before. The dataset (and the CSV, if given) is
+        rewritten in place once the catalog has been walked: every existing row keeps
+        its position, rows sharing a URL are all updated, rows without a URL are kept
+        as they are, and new books are appended.
+        """
+        self.stats = CrawlStats()
+        logger.info("Refreshing prices from %s", catalog_url)
+        os.makedirs(output_dir, exist_ok=True)
+        jsonl_path = os.path.join(output_dir, 'books_data.jsonl')
+        json_path = os.path.join(output_dir, 'books_data.json')
+        books: List[BookInfo] = []
+        if os.path.exists(jsonl_path):
+            books = list(read_books_jsonl(jsonl_path))
+        rows_by_url: Dict[str, List[int]] = {}
+        for row, book in enumerate(books):
+            if book.book_url:
+                rows_by_url.setdefault(book.book_url, []).append(row)
+        logger.info("Existing dataset: %d books", len(books))
+
+        image_store = self.image_store or ImageStore(os.path.join(output_dir, 'images'))
+        requests_before = self.requests_made
+        seen_urls = set()
+        page_fingerprints = {}
+        pages_avoided = 0
+        added_urls = []
+        books_refreshed = 0
+        books_changed = 0
+        requests_saved = 0
+        image_counts = {'cached': 0, 'new': 0, 'duplicate': 0, 'failed': 0}
+        image_bytes_saved = 0
+
         for page_num in range(1, max_pages + 1):
-            page_url = f"{catalog_url}&page={page_num}" if '?' in catalog_url else f"{catalog_url}?page={page_num}"
-            
-            print(f"\n--- Processing page {page_num} ---")
+            page_url = catalog_page_url(catalog_url, page_num)
             soup = self.get_page(page_url)
-            
             if not soup:
-                print(f"Failed to fetch page {page_num}")
+                logger.warning("Failed to fetch page %d", page_num)
                 continue
-            
-            # Extract basic book info from catalog
-            catalog_books = self.extract_book_info_from_catalog(soup, page_url)
-            print(f"Found {len(catalog_books)} books on page {page_num}")
-            
-            # Process each book
-            for i, catalog_book in enumerate(catalog_books, 1):
-                print(f"\nProcessing book {i}/{len(catalog_books)} on page {page_num}")
-                
-                # Get detailed information if we have a book URL
-                if catalog_book.get('book_url'):
-                    detailed_book = self.extract_detailed_book_info(catalog_book['book_url'])
-                else:
-                    detailed_book = BookInfo()
-                    detailed_book.book_url = page_url
-                
-                # Merge catalog info with detailed info
-                if not detailed_book.title and catalog_book.get('title'):
-                    detailed_book.title = catalog_book['title']
-                if not detailed_book.main_image_url and catalog_book.get('image_url'):
-                    detailed_book.main_image_url = catalog_book['image_url']
-                if not detailed_book.price_current and catalog_book.get('price_current'):
-                    detailed_book.price_current = catalog_book['price_current']
-                if not detailed_book.price_original and catalog_book.get('price_original'):
-                    detailed_book.price_original = catalog_book['price_original']
-                if not detailed_book.discount and catalog_book.get('discount'):
-                    detailed_book.discount = catalog_book['discount']
-                if not detailed_book.availability and catalog_book.get('availability'):
-                    detailed_book.availability = catalog_book['availability']
-                if not detailed_book.binding and catalog_book.get('binding'):
-                    detailed_book.binding = catalog_book['binding']
-                
-                # Download main image
-                if detailed_book.main_image_url:
-                    # Create safe filename
-                    safe_title = re.sub(r'[^\w\s-]', '', detailed_book.title or f'book_{len(all_books)}')
-                    safe_title = re.sub(r'[-\s]+', '_', safe_title)[:50]
-                    
-                    image_extension = '.jpg'
-                    if detailed_book.main_image_url:
-                        parsed_url = urlparse(detailed_book.main_image_url)
-                        if parsed_url.path:
-                            image_extension = os.path.splitext(parsed_url.path)[1] or '.jpg'
-                    
-                    image_filename = f"{safe_title}_{len(all_books)}{image_extension}"
-                    image_path = os.path.join(images_dir, image_filename)
-                    
-                    if self.download_image(detailed_book.main_image_url, image_path):
-                        detailed_book.local_image_path = image_path
-                        successful_downloads += 1
-                    else:
-                        failed_downloads += 1
-                
-                all_books.append(detailed_book)
-                
-                # Add delay between requests
-                time.sleep(random.uniform(1, 3))
-            
-            # Add delay between pages
-            time.sleep(random.uniform(2, 5))
-            
-            # Break if no books found (end of catalog)
+
+            with self.stats.stage('extract'):
+                catalog_books = self.extract_book_info_from_catalog(soup, page_url)
             if not catalog_books:
-                print(f"No books found on page {page_num}, stopping")
+                logger.info("No books found on page %d, stopping", page_num)
                 break
-        
-        # Save to CSV
-        if csv_output_path:
-            self.save_to_csv(all_books, csv_output_path)
-        
-        # Save to JSON as backup
-        json_path = os.path.join(output_dir, 'books_data.json')
-        self.save_to_json(all_books, json_path)
-        
-        result = {
-            'dataset': all_books,
+            fingerprint = page_fingerprint(catalog_books)
+            if fingerprint in page_fingerprints:
+                logger.info("Page %d lists the same books as page %d, stopping", page_num, page_fingerprints[fingerprint])
+                pages_avoided = max_pages - page_num
+                break
+            if fingerprint:
+                page_fingerprints[fingerprint] = page_num
+
+            for catalog_book in catalog_books:
+                book_url = catalog_book.get('book_url')
+                if not book_url or book_url in seen_urls:
+                    continue
+                seen_urls.add(book_url)
+
+                rows = rows_by_url.get(book_url)
+                if rows is None:
+                    book, image_status, image_size = self.scrape_book(catalog_book, page_url, image_store)
+                    if image_status:
+                        image_counts[image_status] += 1
+                        if image_status in ('cached', 'duplicate'):
+                            image_bytes_saved += image_size
+                    rows_by_url[book_url] = [len(books)]
+                    books.append(book)
+                    added_urls.append(book_url)
+                    self._pause(1, 3)
+                    continue
+
+                # A full crawl would have fetched the detail page, and the cover unless it is stored
+                book = books[rows[0]]
+                requests_saved += 1
+                if book.main_image_url and not image_store.lookup(self.absolute_url(book.main_image_url), book_url):
+                    requests_saved += 1
+
+                books_refreshed += 1
+                changed = [apply_catalog_offer(books[row], catalog_book) for row in rows]
+                if any(changed):
+                    books_changed += 1
+
+            self._pause(2, 5)
+
+        # Write the merged dataset next to the old one and swap it in
+        rewrite_books(books, jsonl_path, csv_output_path)
+
+        # Keep a resumable crawl of this catalog from scraping the new books again
+        checkpoint = CrawlCheckpoint(os.path.join(output_dir, 'crawl_checkpoint.json'), catalog_url)
+        if checkpoint.load():
+            for book_url in added_urls:
+                checkpoint.mark_processed(book_url)
+            checkpoint.close()
+        if not self.image_store:
+            image_store.close()
+
+        requests_made = self.requests_made - requests_before
+        stored_images = image_counts['cached'] + image_counts['new'] + image_counts['duplicate']
+        return {
             'csv_file': csv_output_path,
-            'json_file': json_path,
+            'jsonl_file': jsonl_path,
+            'json_file': json_path if os.path.exists(json_path) else None,
             'output_dir': output_dir,
-            'images_dir': images_dir,
-            'total_books': len(all_books),
-            'successful_image_downloads': successful_downloads,
-            'failed_image_downloads': failed_downloads,
+            'images_dir': image_store.root,
+            'total_books': len(books),
+            'books_this_run': len(added_urls),
+            'books_refreshed': books_refreshed,
+            'books_changed': books_changed,
+            'books_not_listed': sum(1 for book in books if book.book_url not in seen_urls),
+            'requests_made': requests_made,
+            'requests_saved': requests_saved,
+            'pages_avoided': pages_avoided,
+            'request_reduction': (requests_made + requests_saved) / requests_made if requests_made else 0.0,
+            'connection_pool': connection_pool_stats(self.session),
+            'successful_image_downloads': image_counts['new'] + image_counts['duplicate'],
+            'failed_image_downloads': image_counts['failed'],
+            'images_reused': image_counts['cached'],
+            'duplicate_image_downloads': image_counts['duplicate'],
+            'image_dedup_ratio': (image_counts['cached'] + image_counts['duplicate']) / stored_images
+                                 if stored_images else 0.0,
+            'image_bytes_saved': image_bytes_saved,
+            'stats': self.stats.report(),
         }
-        
-        return result
 
     def save_to_csv(self, books: List[BookInfo], csv_path: str):
         """Save books data to CSV file"""
-        print(f"\nSaving {len(books)} books to CSV: {csv_path}")
+        logger.info("Saving %d books to CSV: %s", len(books), csv_path)
         
         os.makedirs(os.path.dirname(csv_path), exist_ok=True)
         
@@ -550,22 +1315,17 @@ class FlipBooksScraper:
             if not books:
                 return
             
-            # Get all field names
-            fieldnames = list(asdict(books[0]).keys())
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=BOOK_FIELDS)
             
             writer.writeheader()
             for book in books:
-                book_dict = asdict(book)
-                # Convert list to string for CSV
-                book_dict['additional_images'] = '; '.join(book.additional_images)
-                writer.writerow(book_dict)
+                writer.writerow(book_to_csv_row(book))
         
-        print(f"CSV saved successfully: {csv_path}")
+        logger.info("CSV saved successfully: %s", csv_path)
 
     def save_to_json(self, books: List[BookInfo], json_path: str):
         """Save books data to JSON file"""
-        print(f"\nSaving {len(books)} books to JSON: {json_path}")
+        logger.info("Saving %d books to JSON: %s", len(books), json_path)
         
         os.makedirs(os.path.dirname(json_path), exist_ok=True)
         
@@ -574,16 +1334,18 @@ class FlipBooksScraper:
         with open(json_path, 'w', encoding='utf-8') as jsonfile:
             json.dump(books_data, jsonfile, ensure_ascii=False, indent=2)
         
-        print(f"JSON saved successfully: {json_path}")
+        logger.info("JSON saved successfully: %s", json_path)
 
 
-def run_flip_scraper(catalog_url: str, output_dir: str, max_pages: int = 10, csv_output_path: str = None) -> Dict:
+def run_flip_scraper(catalog_url: str, output_dir: str, max_pages: int = 10, csv_output_path: str = None,
+                     resume: bool = False) -> Dict:
     """Convenience function to run the scraper"""
     scraper = FlipBooksScraper()
-    return scraper.run_scraper(catalog_url, output_dir, max_pages, csv_output_path)
+    return scraper.run_scraper(catalog_url, output_dir, max_pages, csv_output_path, resume=resume)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     result = run_flip_scraper(
         catalog_url="https://www.flip.kz/catalog?subsection=134",  
         output_dir=r"C:\Users\User\Desktop\flip_book\data\fantasy",
@@ -592,17 +1354,21 @@ if __name__ == "__main__":
     )
     
     print(f"\n=== SCRAPING COMPLETED ===")
-    print(f"Total books collected: {result['total_books']}")
+    print(f"Total books collected: {result['total_books']} ({result['books_this_run']} in this run)")
     print(f"Successful image downloads: {result['successful_image_downloads']}")
     print(f"Failed image downloads: {result['failed_image_downloads']}")
+    print(f"Images reused without a request: {result['images_reused']}, "
+          f"dedup ratio {result['image_dedup_ratio']:.1%}, {result['image_bytes_saved']} bytes saved")
     print(f"Data saved to CSV: {result['csv_file']}")
+    print(f"Data saved to JSON Lines: {result['jsonl_file']}")
     print(f"Data saved to JSON: {result['json_file']}")
     print(f"Images saved in: {result['images_dir']}")
+    print(format_stage_report(result['stats']))
     
     # Print sample of collected data
-    if result['dataset']:
+    sample_book = next(read_books_jsonl(result['jsonl_file']), None)
+    if sample_book:
         print(f"\n=== SAMPLE BOOK DATA ===")
-        sample_book = result['dataset'][0]
         print(f"Title: {sample_book.title}")
         print(f"Price: {sample_book.price_current}")
         print(f"Publisher: {sample_book.publisher}")
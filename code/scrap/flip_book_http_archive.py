@@ -0,0 +1,167 @@
+"""Append-only, compressed archive of crawled HTTP responses.
+
+In record mode every response the scraper receives (URL, status, headers and
+body) is appended to the archive; in replay mode the scraper answers requests
+from it instead of the network, so extraction can be re-run offline and
+deterministically over a whole crawl.
+
+Layout: ``<path>`` holds one frame per response,
+``MAGIC | header length | body length | header JSON | zlib body``;
+``<path>.idx`` maps each URL to the offset of its latest frame. The index is
+only a cache: frames written after it (e.g. on a crash) are picked up by
+scanning the data file from the last indexed frame.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+MAGIC = b'FBA1'
+FRAME_HEADER = struct.Struct('>4sII')
+
+
+class HttpArchive:
+    def __init__(self, path: str, mode: str = 'r'):
+        """Open an archive for replay (``'r'``) or for recording (``'a'``)"""
+        if mode not in ('r', 'a'):
+            raise ValueError(f"mode must be 'r' or 'a', not {mode!r}")
+        self.path = path
+        self.index_path = path + '.idx'
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.offsets: Dict[str, int] = {}
+
+        if mode == 'a':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.data_file = open(path, 'ab+')
+            self.index_file = open(self.index_path, 'a', encoding='utf-8')
+        else:
+            self.data_file = open(path, 'rb')
+            self.index_file = None
+        self._load_index()
+
+    def _load_index(self):
+        scan_from = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as index_file:
+                for line in index_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.offsets[entry['url']] = entry['offset']
+                    scan_from = max(scan_from, entry['end'])
+
+        # Pick up frames appended after the index was last written
+        for offset, header, end in self._scan(scan_from):
+            self.offsets[header['url']] = offset
+            scan_from = end
+            if self.index_file:
+                self._write_index(header['url'], offset, end)
+
+        # Drop a torn frame so new records are appended right after the last complete one
+        if self.mode == 'a':
+            self.data_file.truncate(scan_from)
+
+    def _scan(self, offset: int):
+        """Yield ``(offset, header, end)`` for every complete frame from ``offset``"""
+        self.data_file.seek(0, os.SEEK_END)
+        size = self.data_file.tell()
+        while offset + FRAME_HEADER.size <= size:
+            self.data_file.seek(offset)
+            magic, header_len, body_len = FRAME_HEADER.unpack(self.data_file.read(FRAME_HEADER.size))
+            end = offset + FRAME_HEADER.size + header_len + body_len
+            if magic != MAGIC or end > size:
+                break  # torn frame at the end of an interrupted recording
+            header = json.loads(self.data_file.read(header_len).decode('utf-8'))
+            yield offset, header, end
+            offset = end
+
+    def _write_index(self, url: str, offset: int, end: int):
+        self.index_file.write(json.dumps({'url': url, 'offset': offset, 'end': end}, ensure_ascii=False) + '\n')
+
+    def record(self, url: str, status: int, headers: Dict[str, str], body: bytes):
+        """Append one response"""
+        header = json.dumps({
+            'url': url,
+            'status': status,
+            'headers': dict(headers),
+            'fetched_at': time.time(),
+        }, ensure_ascii=False).encode('utf-8')
+        compressed = zlib.compress(body)
+
+        with self.lock:
+            self.data_file.seek(0, os.SEEK_END)
+            offset = self.data_file.tell()
+            self.data_file.write(FRAME_HEADER.pack(MAGIC, len(header), len(compressed)))
+            self.data_file.write(header)
+            self.data_file.write(compressed)
+            self.data_file.flush()
+            end = self.data_file.tell()
+            self._write_index(url, offset, end)
+            self.index_file.flush()
+            self.offsets[url] = offset
+
+    def record_response(self, url: str, response: requests.Response):
+        """Archive a live response under the URL it was requested with
+
+        Reads the whole body; streamed responses (cover downloads) are recorded
+        with ``record`` once their body has been written and checked.
+        """
+        self.record(url, response.status_code, response.headers, response.content)
+
+    def _read(self, offset: int) -> Dict:
+        with self.lock:
+            self.data_file.seek(offset)
+            _, header_len, body_len = FRAME_HEADER.unpack(self.data_file.read(FRAME_HEADER.size))
+            header = json.loads(self.data_file.read(header_len).decode('utf-8'))
+            header['body'] = zlib.decompress(self.data_file.read(body_len))
+        return header
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Latest archived record for ``url``, or None"""
+        offset = self.offsets.get(url)
+        return self._read(offset) if offset is not None else None
+
+    def response(self, url: str) -> requests.Response:
+        """Rebuild a ``requests.Response`` for ``url``; unknown URLs replay as 404"""
+        record = self.get(url)
+        response = requests.Response()
+        response.url = url
+        response.raw = None
+        response._content_consumed = True
+        if record is None:
+            response.status_code = 404
+            response.reason = 'Not in archive'
+            response._content = b''
+            return response
+        response.status_code = record['status']
+        response.headers = CaseInsensitiveDict(record['headers'])
+        # Bodies are stored decoded, so drop the transfer encoding the server used
+        response.headers.pop('Content-Encoding', None)
+        response._content = record['body']
+        return response
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Latest record of every archived URL, in recording order"""
+        for offset in sorted(self.offsets.values()):
+            yield self._read(offset)
+
+    def close(self):
+        with self.lock:
+            self.data_file.close()
+            if self.index_file:
+                self.index_file.close()
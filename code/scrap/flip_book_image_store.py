@@ -0,0 +1,124 @@
+"""Content-addressed store for downloaded cover images.
+
+Covers are saved once under the SHA-1 of their bytes,
+``<root>/<first two hex chars>/<sha1><ext>``, so a cover scraped in several
+categories or runs is kept once and its path never depends on crawl order.
+``index.jsonl`` maps image URLs to their blob, which lets the scraper skip
+the download entirely for a cover it has seen before. Product URLs are
+mapped too, for callers that do not know a book's image URL; a book without
+a product URL of its own (cards without a link carry their catalog page URL)
+is never looked up that way.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from typing import Dict, Optional
+
+PRODUCT_URL_PATTERN = re.compile(r'[?&]prod=\d+')
+
+
+def is_product_url(url: Optional[str]) -> bool:
+    return bool(url) and PRODUCT_URL_PATTERN.search(url) is not None
+
+
+class ImageStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.jsonl')
+        self.lock = threading.Lock()
+        self.blob_by_image_url: Dict[str, str] = {}
+        self.blob_by_book_url: Dict[str, str] = {}
+        self.blob_sizes: Dict[str, int] = {}
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+        self.index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding='utf-8') as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._remember(entry)
+
+    def _remember(self, entry: Dict):
+        blob = entry['blob']
+        if entry.get('image_url'):
+            self.blob_by_image_url[entry['image_url']] = blob
+        if is_product_url(entry.get('book_url')):
+            self.blob_by_book_url[entry['book_url']] = blob
+        self.blob_sizes[blob] = entry.get('bytes', 0)
+
+    def _record(self, image_url: str, book_url: str, blob: str, size: int):
+        entry = {'image_url': image_url, 'book_url': book_url, 'blob': blob, 'bytes': size}
+        self._remember(entry)
+        self.index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.index_file.flush()
+
+    def blob_path(self, blob: str) -> str:
+        return os.path.join(self.root, blob[:2], blob)
+
+    def lookup(self, image_url: str, book_url: str = None) -> Optional[str]:
+        """Return the stored path for a known cover, or None if it has to be downloaded
+
+        Covers are found by image URL, so a book whose cover URL changed downloads
+        the new cover. The product URL is only used when no image URL is given.
+        """
+        with self.lock:
+            if image_url:
+                blob = self.blob_by_image_url.get(image_url)
+            elif is_product_url(book_url):
+                blob = self.blob_by_book_url.get(book_url)
+            else:
+                blob = None
+            if not blob:
+                return None
+            path = self.blob_path(blob)
+            if not os.path.exists(path):
+                return None
+            if is_product_url(book_url) and self.blob_by_book_url.get(book_url) != blob:
+                self._record(image_url, book_url, blob, self.blob_sizes.get(blob, 0))
+            return path
+
+    def blob_size(self, path: str) -> int:
+        return self.blob_sizes.get(os.path.basename(path), 0)
+
+    def temp_path(self, extension: str = '.jpg') -> str:
+        """A scratch path inside the store for an in-flight download"""
+        return os.path.join(self.root, f".tmp_{uuid.uuid4().hex}{extension}")
+
+    def add_file(self, tmp_path: str, image_url: str, book_url: str = None):
+        """Move a downloaded file into the store
+
+        Returns ``(path, is_new)``; ``is_new`` is False when the same bytes were
+        already stored under another URL, in which case the download is dropped.
+        """
+        sha1 = hashlib.sha1()
+        size = 0
+        with open(tmp_path, 'rb') as tmp_file:
+            for chunk in iter(lambda: tmp_file.read(1 << 16), b''):
+                sha1.update(chunk)
+                size += len(chunk)
+        extension = os.path.splitext(tmp_path)[1].lower() or '.jpg'
+        blob = sha1.hexdigest() + extension
+        path = self.blob_path(blob)
+
+        with self.lock:
+            is_new = not os.path.exists(path)
+            if is_new:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+            self._record(image_url, book_url, blob, size)
+        return path, is_new
+
+    def close(self):
+        with self.lock:
+            self.index_file.close()
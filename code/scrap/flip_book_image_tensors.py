@@ -0,0 +1,170 @@
+"""Model-ready cover tensors written while covers are downloaded.
+
+Every stored cover is decoded once, resized to 224x224 RGB and appended as
+uint8 to fixed-size shards, ``<root>/shard_00000.npy``, ... Each shard is a
+plain ``.npy`` file of shape ``(shard_rows, height, width, 3)``, so training and
+embedding code can memory-map it instead of decoding JPEGs again:
+
+    shards = CoverTensorShards(root)
+    images = shards.load(book_urls)  # uint8, divide by 255 for the encoder
+
+``index.jsonl`` maps product URLs to ``(shard, row)``; covers are keyed by
+their content-addressed blob, so a cover shared by several products is
+decoded and stored once. As in the image store, a book without a product URL
+of its own (cards without a link carry their catalog page URL) still gets its
+cover stored but is never looked up by that URL: every book of the page would
+share it.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from flip_book_image_store import is_product_url
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZE = (224, 224)
+SHARD_ROWS = 1024
+
+
+def decode_cover(image_path: str, size: Tuple[int, int] = IMAGE_SIZE) -> np.ndarray:
+    """Decode and resize a cover the way the embedding notebook does, as uint8 RGB"""
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        return np.asarray(image.convert("RGB").resize(size), dtype=np.uint8)
+
+
+class CoverTensorShards:
+    def __init__(self, root: str, size: Tuple[int, int] = IMAGE_SIZE, shard_rows: int = SHARD_ROWS):
+        self.root = root
+        self.size = size
+        self.shard_rows = shard_rows
+        self.index_path = os.path.join(root, 'index.jsonl')
+        self.lock = threading.Lock()
+        self.row_by_book_url: Dict[str, Tuple[int, int]] = {}
+        self.row_by_blob: Dict[str, Tuple[int, int]] = {}
+        self.rows = 0
+        self.decode_failures = 0
+        self.open_shard = None
+        self.open_shard_num = None
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+        self.index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding='utf-8') as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                location = (entry['shard'], entry['row'])
+                self.row_by_blob[entry['blob']] = location
+                if is_product_url(entry.get('book_url')):
+                    self.row_by_book_url[entry['book_url']] = location
+                self.rows = max(self.rows, entry['shard'] * self.shard_rows + entry['row'] + 1)
+
+    def shard_path(self, shard_num: int) -> str:
+        return os.path.join(self.root, f"shard_{shard_num:05d}.npy")
+
+    def _writable_shard(self, shard_num: int) -> np.memmap:
+        if self.open_shard_num != shard_num:
+            if self.open_shard is not None:
+                self.open_shard.flush()
+            path = self.shard_path(shard_num)
+            if os.path.exists(path):
+                self.open_shard = np.lib.format.open_memmap(path, mode='r+')
+            else:
+                self.open_shard = np.lib.format.open_memmap(
+                    path, mode='w+', dtype=np.uint8, shape=(self.shard_rows, *self.size[::-1], 3))
+            self.open_shard_num = shard_num
+        return self.open_shard
+
+    def _record(self, book_url: str, blob: str, location: Tuple[int, int]):
+        self.row_by_blob[blob] = location
+        if is_product_url(book_url):
+            self.row_by_book_url[book_url] = location
+        entry = {'book_url': book_url, 'blob': blob, 'shard': location[0], 'row': location[1]}
+        self.index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.index_file.flush()
+
+    def _needs_book_url(self, book_url: str, location: Tuple[int, int]) -> bool:
+        return is_product_url(book_url) and self.row_by_book_url.get(book_url) != location
+
+    def add_array(self, book_url: str, blob: str, image: np.ndarray) -> Tuple[int, int]:
+        """Append an already decoded ``(height, width, 3)`` uint8 cover"""
+        with self.lock:
+            location = self.row_by_blob.get(blob)
+            is_new = location is None
+            if is_new:
+                location = divmod(self.rows, self.shard_rows)
+                shard = self._writable_shard(location[0])
+                shard[location[1]] = image
+                # The row must be on disk before the index points at it
+                shard.flush()
+                self.rows += 1
+            if is_new or self._needs_book_url(book_url, location):
+                self._record(book_url, blob, location)
+            return location
+
+    def add(self, book_url: str, image_path: str) -> Optional[Tuple[int, int]]:
+        """Decode a stored cover into the shards unless its blob is already there
+
+        Returns the ``(shard, row)`` of the cover, or None if it could not be decoded.
+        """
+        blob = os.path.basename(image_path)
+        with self.lock:
+            location = self.row_by_blob.get(blob)
+            if location is not None:
+                if self._needs_book_url(book_url, location):
+                    self._record(book_url, blob, location)
+                return location
+
+        try:
+            image = decode_cover(image_path, self.size)
+        except Exception as e:
+            logger.warning("Error decoding image %s: %s", image_path, e)
+            with self.lock:
+                self.decode_failures += 1
+            return None
+        return self.add_array(book_url, blob, image)
+
+    def shard(self, shard_num: int) -> np.ndarray:
+        """Read-only memory map of the filled rows of one shard"""
+        filled = min(self.shard_rows, self.rows - shard_num * self.shard_rows)
+        return np.load(self.shard_path(shard_num), mmap_mode='r')[:filled]
+
+    def load(self, book_urls: List[str]) -> np.ndarray:
+        """Gather the covers of the given products, in order, as one uint8 array
+
+        Products without a cover row raise KeyError; filter with ``in`` first.
+        """
+        shards = {}
+        images = np.empty((len(book_urls), *self.size[::-1], 3), dtype=np.uint8)
+        for i, book_url in enumerate(book_urls):
+            shard_num, row = self.row_by_book_url[book_url]
+            if shard_num not in shards:
+                shards[shard_num] = self.shard(shard_num)
+            images[i] = shards[shard_num][row]
+        return images
+
+    def __contains__(self, book_url: str) -> bool:
+        return book_url in self.row_by_book_url
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def close(self):
+        with self.lock:
+            if self.open_shard is not None:
+                self.open_shard.flush()
+                self.open_shard = None
+                self.open_shard_num = None
+            self.index_file.close()
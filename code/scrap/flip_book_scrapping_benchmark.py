@@ -0,0 +1,629 @@
+"""Parser benchmarks for the Flip.kz scraper.
+
+Runs the current parsers against frozen reference copies of the previous
+implementations, checks that both produce the same records and reports the
+per-page parse time. Pass saved HTML pages on the command line, or a crawl
+recorded with ``--archive``, to benchmark real pages; otherwise synthetic
+Flip.kz-like pages are generated.
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from bs4 import BeautifulSoup
+from requests.structures import CaseInsensitiveDict
+
+from flip_book_data_scrapping import BookInfo, FlipBooksScraper
+from flip_book_http_archive import HttpArchive
+
+
+def legacy_parse_book_page(soup: BeautifulSoup, book_url: str) -> BookInfo:
+    """Reference copy of the original multi-pass book page parser"""
+    book = BookInfo(book_url=book_url)
+
+    try:
+        # Extract title
+        title_selectors = ['h1', '.title', '[class*="title"]', '[class*="name"]']
+        for selector in title_selectors:
+            title_elem = soup.select_one(selector)
+            if title_elem:
+                book.title = title_elem.get_text().strip()
+                break
+
+        # Extract description - Enhanced to find book descriptions
+        description_found = False
+
+        # Method 1: Look for specific description patterns
+        page_text = soup.get_text()
+
+        # Find long paragraphs that look like book descriptions
+        paragraphs = soup.find_all('p')
+        for p in paragraphs:
+            text = p.get_text().strip()
+            # Look for substantial text that might be a description
+            if (len(text) > 200 and
+                not re.match(r'^\d+\s*₸', text) and  # Not just price
+                'Цена:' not in text and
+                'ISBN' not in text and
+                'Издательство' not in text and
+                'Количество страниц' not in text):
+                book.description = text
+                description_found = True
+                break
+
+        # Method 2: Look for description in div elements
+        if not description_found:
+            desc_selectors = [
+                '.description', '[class*="description"]',
+                '.content', '[class*="content"]',
+                '.summary', '[class*="summary"]',
+                '.about', '[class*="about"]',
+                '.details', '[class*="details"]'
+            ]
+
+            for selector in desc_selectors:
+                elements = soup.select(selector)
+                for elem in elements:
+                    text = elem.get_text().strip()
+                    if len(text) > 100:  # Likely description
+                        book.description = text
+                        description_found = True
+                        break
+                if description_found:
+                    break
+
+        # Method 3: Look for text blocks similar to your example
+        if not description_found:
+            # Look for text that contains typical book description patterns
+            text_blocks = soup.find_all(['div', 'span', 'p'], string=re.compile(r'.{200,}'))
+            for block in text_blocks:
+                text = block.get_text().strip()
+                # Check if it looks like a book description
+                if (len(text) > 200 and
+                    ('книга' in text.lower() or 'автор' in text.lower() or
+                     'глава' in text.lower() or 'история' in text.lower() or
+                     'читатель' in text.lower() or 'произведение' in text.lower())):
+                    book.description = text
+                    description_found = True
+                    break
+
+        # Extract main image
+        img_selectors = ['img[src*="prod/"]', '.main-image img', '.product-image img', 'img']
+        for selector in img_selectors:
+            img = soup.select_one(selector)
+            if img and img.get('src'):
+                src = img.get('src')
+                if 'prod/' in src:
+                    book.main_image_url = src
+                    break
+
+        # Extract additional images
+        all_images = soup.find_all('img', src=True)
+        for img in all_images:
+            src = img.get('src')
+            if src and 'prod/' in src and src != book.main_image_url:
+                book.additional_images.append(src)
+
+        # Extract prices with enhanced regex
+        text = soup.get_text()
+
+        # Look for crossed out prices and current prices
+        price_current_match = re.search(r'(?:Цена со скидкой:|Цена:)\s*(?:\*\*)?(\d+(?:\s*\d+)*)\s*₸', text)
+        if price_current_match:
+            book.price_current = price_current_match.group(1).replace(' ', '') + ' ₸'
+
+        price_original_match = re.search(r'~~(\d+(?:\s*\d+)*)\s*₸~~', text)
+        if price_original_match:
+            book.price_original = price_original_match.group(1).replace(' ', '') + ' ₸'
+
+        # Extract discount percentage
+        discount_match = re.search(r'\*\*(-\d+%)\*\*', text)
+        if discount_match:
+            book.discount = discount_match.group(1)
+
+        # Fallback: general price extraction
+        if not book.price_current:
+            price_matches = re.findall(r'(\d+(?:\s*\d+)*)\s*₸', text)
+            if price_matches:
+                prices = [price.replace(' ', '') for price in price_matches]
+                prices = sorted(set(prices), key=lambda x: int(x))
+                if len(prices) >= 2:
+                    book.price_current = prices[0] + ' ₸'
+                    book.price_original = prices[-1] + ' ₸'
+                elif len(prices) == 1:
+                    book.price_current = prices[0] + ' ₸'
+
+        # Extract detailed information from the page text
+        # Look for patterns like "Издательство: ...", "Язык: ...", etc.
+        info_patterns = {
+            'publisher': r'Издательство[:\s]+([^\n,]+)',
+            'language': r'Язык[:\s]+([^\n,]+)',
+            'binding': r'(?:Переплет|Обложка)[:\s]+([^\n,]+)',
+            'publication_date': r'(?:Дата выхода|Год издания)[:\s]+([^\n,]+)',
+            'isbn': r'ISBN[:\s]+([^\n,\s]+)',
+            'pages': r'(?:Количество страниц|Страниц)[:\s]+([^\n,]+)',
+            'height': r'Высота издания[:\s]+([^\n,]+)',
+            'width': r'Ширина издания[:\s]+([^\n,]+)',
+            'thickness': r'Толщина издания[:\s]+([^\n,]+)',
+            'product_code': r'Код товара[:\s]+([^\n,]+)',
+        }
+
+        for field, pattern in info_patterns.items():
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                setattr(book, field, match.group(1).strip())
+
+        # Extract availability
+        if 'На складе' in text:
+            book.availability = 'На складе'
+        elif 'Завтра' in text:
+            book.availability = 'Завтра'
+        elif re.search(r'\d+\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)', text):
+            date_match = re.search(r'(\d+\s+(?:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря))', text)
+            if date_match:
+                book.availability = date_match.group(1)
+
+        # Extract rating and reviews
+        rating_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:из\s*5|★|⭐)', text)
+        if rating_match:
+            book.rating = rating_match.group(1)
+
+        reviews_match = re.search(r'(\d+)\s*отзыв', text)
+        if reviews_match:
+            book.reviews_count = reviews_match.group(1)
+        elif 'Нет отзывов' in text:
+            book.reviews_count = '0'
+
+        # Extract author from title or description if present
+        if book.title and not book.publisher:
+            # Sometimes author is in the title
+            author_match = re.search(r'^(.+?)\s+[-–—]\s+(.+)$', book.title)
+            if author_match:
+                potential_author = author_match.group(2)
+                if len(potential_author.split()) <= 3:  # Likely an author name
+                    book.publisher = potential_author
+
+    except Exception as e:
+        print(f"Error extracting detailed info from {book_url}: {e}")
+
+    return book
+
+
+def legacy_extract_book_info_from_catalog(soup: BeautifulSoup, base_url: str) -> List[Dict]:
+    """Reference copy of the original catalog parser with its 5-level parent walk"""
+    book_data = []
+
+    # Method 1: Look for images with product URLs (most reliable for Flip.kz)
+    img_elements = soup.find_all('img', src=re.compile(r'prod/\d+.*\.(jpg|png|webp)'))
+
+    for img in img_elements:
+        try:
+            book_info = {
+                'image_url': img.get('src'),
+                'title': img.get('alt', '').strip(),
+            }
+
+            # Find the parent link to get book URL
+            link_parent = img.find_parent('a')
+            if link_parent and link_parent.get('href'):
+                href = link_parent.get('href')
+                if 'catalog?prod=' in href or 'item' in href:
+                    book_info['book_url'] = urljoin(base_url, href)
+
+            # Find container with price and other info
+            # Look for price in various parent containers
+            containers_to_check = []
+            current = img.parent
+            depth = 0
+            while current and depth < 5:  # Check up to 5 levels up
+                containers_to_check.append(current)
+                current = current.parent
+                depth += 1
+
+            for container in containers_to_check:
+                if not container:
+                    continue
+
+                container_text = container.get_text()
+
+                # Extract prices
+                price_matches = re.findall(r'(\d+(?:\s*\d+)*)\s*₸', container_text)
+                if price_matches:
+                    # Clean prices (remove spaces within numbers)
+                    prices = [price.replace(' ', '') for price in price_matches]
+                    # Remove duplicates and sort
+                    unique_prices = sorted(set(prices), key=lambda x: int(x))
+
+                    if len(unique_prices) >= 2:
+                        book_info['price_current'] = unique_prices[0] + ' ₸'
+                        book_info['price_original'] = unique_prices[-1] + ' ₸'
+                        # Calculate discount
+                        try:
+                            current_price = int(unique_prices[0])
+                            original_price = int(unique_prices[-1])
+                            if original_price > current_price:
+                                discount = round((1 - current_price / original_price) * 100)
+                                book_info['discount'] = f"-{discount}%"
+                        except:
+                            pass
+                    elif len(unique_prices) == 1:
+                        book_info['price_current'] = unique_prices[0] + ' ₸'
+
+                # Extract availability
+                if 'На складе' in container_text:
+                    book_info['availability'] = 'На складе'
+                elif 'Завтра' in container_text:
+                    book_info['availability'] = 'Завтра'
+                elif 'июня' in container_text or 'июля' in container_text:
+                    # Extract specific date
+                    date_match = re.search(r'(\d+)\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)', container_text)
+                    if date_match:
+                        book_info['availability'] = date_match.group(0)
+
+                # Try to extract title if not found in alt text
+                if not book_info.get('title'):
+                    # Look for text that could be a title
+                    lines = [line.strip() for line in container_text.split('\n') if line.strip()]
+                    for line in lines:
+                        # Skip prices, availability, and other metadata
+                        if (len(line) > 10 and
+                            not re.match(r'^\d+\s*₸', line) and
+                            'На складе' not in line and
+                            'Завтра' not in line and
+                            not re.match(r'^-?\d+%', line) and
+                            'мягкая обложка' not in line and
+                            'твердый переплет' not in line and
+                            not re.match(r'^\d{4}$', line)):  # Not just a year
+
+                            book_info['title'] = line
+                            break
+
+                # Extract binding type
+                if 'мягкая обложка' in container_text:
+                    book_info['binding'] = 'мягкая обложка'
+                elif 'твердый переплет' in container_text:
+                    book_info['binding'] = 'твердый переплет'
+
+                # If we found some info, break out of container loop
+                if book_info.get('price_current') or book_info.get('availability'):
+                    break
+
+            # Only add if we have meaningful data
+            if book_info.get('image_url') or book_info.get('title') or book_info.get('book_url'):
+                book_data.append(book_info)
+
+        except Exception as e:
+            print(f"Error extracting book info: {e}")
+            continue
+
+    # Method 2: Alternative approach - look for product containers
+    if not book_data:
+        product_containers = soup.find_all(['div', 'article', 'section'], class_=re.compile(r'product|item|book|card'))
+
+        for container in product_containers:
+            try:
+                book_info = {}
+
+                # Find image
+                img = container.find('img', src=True)
+                if img:
+                    book_info['image_url'] = img.get('src')
+                    book_info['title'] = img.get('alt', '').strip()
+
+                # Find link
+                link = container.find('a', href=True)
+                if link:
+                    book_info['book_url'] = urljoin(base_url, link.get('href'))
+
+                # Extract other info from container text
+                container_text = container.get_text()
+
+                # Extract prices
+                price_matches = re.findall(r'(\d+(?:\s*\d+)*)\s*₸', container_text)
+                if price_matches:
+                    prices = [price.replace(' ', '') for price in price_matches]
+                    unique_prices = sorted(set(prices), key=lambda x: int(x))
+
+                    if len(unique_prices) >= 2:
+                        book_info['price_current'] = unique_prices[0] + ' ₸'
+                        book_info['price_original'] = unique_prices[-1] + ' ₸'
+                    elif len(unique_prices) == 1:
+                        book_info['price_current'] = unique_prices[0] + ' ₸'
+
+                if book_info:
+                    book_data.append(book_info)
+
+            except Exception as e:
+                print(f"Error in alternative extraction: {e}")
+                continue
+
+    return book_data
+
+
+def build_book_page(seed: int = 0) -> str:
+    """Generate a synthetic book page shaped like a Flip.kz product page"""
+    rng = random.Random(seed)
+    months = ['января', 'марта', 'июня', 'июля', 'октября']
+    related = []
+    for i in range(60):
+        prod_id = rng.randint(100000, 2000000)
+        related.append(
+            f'<div class="product-card"><a href="/catalog?prod={prod_id}">'
+            f'<img src="//s.f.kz/prod/{prod_id % 1000}/{prod_id}_150.jpg" alt="Книга {i}"></a>'
+            f'<span class="product-name">Похожая книга номер {i}</span>'
+            f'<span class="price">{rng.randint(1, 9)} {rng.randint(100, 999)} ₸</span>'
+            f'<span>{rng.randint(1, 28)} {rng.choice(months)}</span></div>'
+        )
+    description = ' '.join(
+        rng.choice(['Эта книга', 'автор', 'рассказывает', 'историю', 'героя', 'мира', 'глава', 'читатель'])
+        for _ in range(80)
+    )
+    # Half of the pages keep the description outside <p>, as many Flip.kz pages do
+    if seed % 2:
+        description_block = f'<div class="descr"><span class="product-description">{description}</span></div>'
+    else:
+        description_block = f'<p>{description}</p>'
+    prod_id = rng.randint(100000, 2000000)
+    return f"""<html><head><title>Книга {seed} - купить</title></head><body>
+<div class="header"><a href="/">Flip.kz</a><div class="menu-name">Книги</div></div>
+<h1>Книга номер {seed} - Иван Петров</h1>
+<div class="gallery"><img src="//s.f.kz/prod/{prod_id % 1000}/{prod_id}_1.jpg" alt="cover">
+<img src="//s.f.kz/prod/{prod_id % 1000}/{prod_id}_2.jpg" alt="back"></div>
+<div class="price-block">Цена: {rng.randint(1, 9)} {rng.randint(100, 999)} ₸
+Старая цена: {rng.randint(10, 20)} {rng.randint(100, 999)} ₸ На складе</div>
+<table class="params">
+<tr><td>Издательство:</td><td>Издательство {seed % 7}</td></tr>
+<tr><td>Язык:</td><td>Русский</td></tr>
+<tr><td>Переплет:</td><td>твердый переплет</td></tr>
+<tr><td>Дата выхода:</td><td>{rng.randint(1, 12)}.{rng.randint(2015, 2024)}</td></tr>
+<tr><td>ISBN:</td><td>978-5-17-{rng.randint(100000, 999999)}-1</td></tr>
+<tr><td>Количество страниц:</td><td>{rng.randint(100, 900)} стр.</td></tr>
+<tr><td>Высота издания:</td><td>{rng.randint(150, 250)} мм</td></tr>
+<tr><td>Ширина издания:</td><td>{rng.randint(100, 180)} мм</td></tr>
+<tr><td>Толщина издания:</td><td>{rng.randint(10, 60)} мм</td></tr>
+<tr><td>Код товара:</td><td>{prod_id}</td></tr>
+</table>
+<div class="rating">{rng.randint(1, 4)}.{rng.randint(0, 9)} из 5, {rng.randint(1, 99)} отзывов</div>
+{description_block}
+<div class="related">{''.join(related)}</div>
+<div class="footer"><p>Интернет-магазин Flip.kz</p></div>
+</body></html>"""
+
+
+def build_catalog_page(seed: int = 0, cards: int = 40, unpriced_every: int = 0, row_size: int = 4) -> str:
+    """Generate a synthetic catalog page with deeply nested product cards, ``row_size`` per row
+
+    With ``unpriced_every`` set, every n-th card has no price or availability,
+    which sends the parent walk climbing into the surrounding row; with a large
+    ``row_size`` that row is most of the page.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for row_start in range(0, cards, row_size):
+        row_cards = []
+        for i in range(row_start, min(row_start + row_size, cards)):
+            prod_id = rng.randint(100000, 2000000)
+            current = rng.randint(1000, 9000)
+            original = current + rng.randint(0, 3000)
+            if unpriced_every and i % unpriced_every == 0:
+                info = '<div class="note">Нет в наличии</div>'
+            else:
+                info = (
+                    f'<div class="price"><span class="new">{current // 1000} {current % 1000:03d} ₸</span>'
+                    f'<span class="old">{original // 1000} {original % 1000:03d} ₸</span></div>'
+                    f'<div class="delivery">{rng.choice(["На складе", "Завтра", "12 июня"])}</div>'
+                )
+            row_cards.append(
+                f'<div class="card"><div class="pic"><a href="/catalog?prod={prod_id}"><picture>'
+                f'<img src="//s.f.kz/prod/{prod_id % 1000}/{prod_id}_150.jpg" alt="Книга номер {i}">'
+                f'</picture></a></div><div class="info">\n<div class="author">{rng.choice(["Иван Петров", "Анна Смирнова"])}</div>\n'
+                f'{info}\n<div class="binding">{rng.choice(["мягкая обложка", "твердый переплет"])}</div>'
+                f'\n<div class="year">{rng.randint(2000, 2024)}</div></div></div>'
+            )
+        rows.append(f'<div class="row">{"".join(row_cards)}</div>')
+    return (
+        '<html><body><div class="header"><a href="/">Flip.kz</a></div>'
+        f'<div class="catalog"><div class="grid">{"".join(rows)}</div></div>'
+        '<div class="footer">Интернет-магазин Flip.kz</div></body></html>'
+    )
+
+
+def build_sitemap(urls: List[str], index: bool = False) -> str:
+    """Generate a sitemap, or with ``index`` a sitemap index, listing ``urls``"""
+    tag, entry = ('sitemapindex', 'sitemap') if index else ('urlset', 'url')
+    entries = ''.join(f'<{entry}><loc>{url}</loc></{entry}>' for url in urls)
+    return (f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<{tag} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</{tag}>')
+
+
+class FakeFlipSiteHandler(BaseHTTPRequestHandler):
+    """Serve synthetic catalog pages, book pages, covers and sitemaps from one local host
+
+    ``/sitemap.xml`` is an index of ``sitemaps`` sitemaps listing ``sitemap_products``
+    product pages each, ids counting up from 1000000, plus a few non-product pages.
+    """
+    catalog_pages = 2
+    cards = 40
+    latency = 0.0
+    sitemaps = 2
+    sitemap_products = 50
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        host = f"http://{self.headers.get('Host')}"
+        if url.path == '/sitemap.xml':
+            sitemaps = [f"{host}/sitemap-{n}.xml" for n in range(1, self.sitemaps + 1)]
+            return self._send(build_sitemap(sitemaps, index=True).encode('utf-8'), 'application/xml')
+        if url.path.startswith('/sitemap-'):
+            n = int(url.path[len('/sitemap-'):-len('.xml')])
+            first_id = 1000000 + (n - 1) * self.sitemap_products
+            urls = [f"{host}/catalog?prod={prod_id}" for prod_id in range(first_id, first_id + self.sitemap_products)]
+            urls += [f"{host}/", f"{host}/catalog?subsection={n}"]
+            return self._send(build_sitemap(urls).encode('utf-8'), 'application/xml')
+        if 'subsection' in query:
+            page = int(query.get('page', ['1'])[0])
+            seed = int(query['subsection'][0]) * 1000 + page
+            html = build_catalog_page(seed, self.cards) if page <= self.catalog_pages else '<html><body></body></html>'
+        elif 'prod' in query:
+            html = build_book_page(int(query['prod'][0]))
+        else:
+            # A distinct fake JPEG per cover path
+            body = b'\xff\xd8\xff\xe0' + url.path.encode('utf-8') * 64
+            return self._send(body, 'image/jpeg')
+        # Serve covers from this host instead of the CDN
+        self._send(html.replace('//s.f.kz', '').encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_fake_site(port: int = 0, catalog_pages: int = 2, cards: int = 40, latency: float = 0.0,
+                    sitemaps: int = 2, sitemap_products: int = 50) -> ThreadingHTTPServer:
+    """Start a local Flip.kz stand-in in a background thread; ``server.server_address`` has the port
+
+    Every category lists ``catalog_pages`` pages of ``cards`` books, then empty pages.
+    ``/sitemap.xml`` lists ``sitemaps * sitemap_products`` products.
+    ``latency`` seconds are added to every response.
+    """
+    handler = type('FakeFlipSite', (FakeFlipSiteHandler,),
+                   {'catalog_pages': catalog_pages, 'cards': cards, 'latency': latency,
+                    'sitemaps': sitemaps, 'sitemap_products': sitemap_products})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_archived_pages(archive_path: str) -> Tuple[List[str], List[str]]:
+    """Split the HTML pages of a recorded crawl into book pages and catalog pages"""
+    book_pages, catalog_pages = [], []
+    archive = HttpArchive(archive_path)
+    try:
+        for record in archive:
+            content_type = CaseInsensitiveDict(record['headers']).get('Content-Type', '')
+            if record['status'] != 200 or 'html' not in content_type:
+                continue
+            html = record['body'].decode('utf-8', errors='replace')
+            if 'prod=' in record['url']:
+                book_pages.append(html)
+            elif 'subsection=' in record['url']:
+                catalog_pages.append(html)
+    finally:
+        archive.close()
+    return book_pages, catalog_pages
+
+
+def time_parser(parse: Callable, pages: List[str], repeats: int) -> float:
+    """Return the mean parse time per page in milliseconds"""
+    soups = [BeautifulSoup(page, 'html.parser') for page in pages]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for soup in soups:
+            parse(soup)
+    return (time.perf_counter() - start) * 1000 / (repeats * len(soups))
+
+
+def benchmark_book_page_parser(pages: List[str], repeats: int = 5) -> Dict:
+    """Compare the single-pass book page parser with the legacy one"""
+    scraper = FlipBooksScraper()
+    url = 'https://www.flip.kz/catalog?prod=1'
+
+    mismatches = 0
+    for page in pages:
+        soup = BeautifulSoup(page, 'html.parser')
+        if asdict(scraper.parse_book_page(soup, url)) != asdict(legacy_parse_book_page(soup, url)):
+            mismatches += 1
+
+    legacy_ms = time_parser(lambda soup: legacy_parse_book_page(soup, url), pages, repeats)
+    current_ms = time_parser(lambda soup: scraper.parse_book_page(soup, url), pages, repeats)
+    return {
+        'pages': len(pages),
+        'mismatches': mismatches,
+        'legacy_ms_per_page': legacy_ms,
+        'current_ms_per_page': current_ms,
+        'speedup': legacy_ms / current_ms if current_ms else 0.0,
+    }
+
+
+def benchmark_catalog_parser(pages: List[str], repeats: int = 5) -> Dict:
+    """Compare the catalog parser with the legacy one"""
+    scraper = FlipBooksScraper()
+    url = 'https://www.flip.kz/catalog?subsection=134'
+
+    mismatches = 0
+    for page in pages:
+        soup = BeautifulSoup(page, 'html.parser')
+        if scraper.extract_book_info_from_catalog(soup, url) != legacy_extract_book_info_from_catalog(soup, scraper.base_url):
+            mismatches += 1
+
+    legacy_ms = time_parser(lambda soup: legacy_extract_book_info_from_catalog(soup, scraper.base_url), pages, repeats)
+    current_ms = time_parser(lambda soup: scraper.extract_book_info_from_catalog(soup, url), pages, repeats)
+    return {
+        'pages': len(pages),
+        'mismatches': mismatches,
+        'legacy_ms_per_page': legacy_ms,
+        'current_ms_per_page': current_ms,
+        'speedup': legacy_ms / current_ms if current_ms else 0.0,
+    }
+
+
+def print_report(name: str, report: Dict):
+    print(f"\n=== {name} ===")
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Flip.kz page parsers")
+    parser.add_argument('book_pages', nargs='*', help="saved book page HTML files")
+    parser.add_argument('--catalog-pages', nargs='*', default=[], help="saved catalog page HTML files")
+    parser.add_argument('--pages', type=int, default=20, help="number of synthetic pages")
+    parser.add_argument('--archive', help="HTTP archive recorded by the scraper, used as the page corpus")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.archive:
+        book_pages, catalog_pages = load_archived_pages(args.archive)
+        print(f"Archive corpus: {len(book_pages)} book pages, {len(catalog_pages)} catalog pages")
+        if book_pages:
+            print_report('Book page parser', benchmark_book_page_parser(book_pages, args.repeats))
+        if catalog_pages:
+            print_report('Catalog parser', benchmark_catalog_parser(catalog_pages, args.repeats))
+        raise SystemExit
+
+    if args.book_pages:
+        book_pages = [open(path, encoding='utf-8').read() for path in args.book_pages]
+    else:
+        book_pages = [build_book_page(seed) for seed in range(args.pages)]
+
+    print_report('Book page parser', benchmark_book_page_parser(book_pages, args.repeats))
+
+    if args.catalog_pages:
+        catalog_pages = [open(path, encoding='utf-8').read() for path in args.catalog_pages]
+        print_report('Catalog parser', benchmark_catalog_parser(catalog_pages, args.repeats))
+    else:
+        catalog_pages = [build_catalog_page(seed) for seed in range(args.pages)]
+        print_report('Catalog parser', benchmark_catalog_parser(catalog_pages, args.repeats))
+        # Cards without prices are where the parent walk climbs into the grid and picks up
+        # a neighbouring card's prices; the current parser has to do the same
+        unpriced_pages = [build_catalog_page(seed, unpriced_every=5) for seed in range(args.pages)]
+        print_report('Catalog parser, unpriced cards', benchmark_catalog_parser(unpriced_pages, args.repeats))
+        # One flat row: every unpriced card reads the text of the whole grid
+        flat_pages = [build_catalog_page(seed, unpriced_every=5, row_size=40) for seed in range(args.pages)]
+        print_report('Catalog parser, unpriced cards in one row', benchmark_catalog_parser(flat_pages, args.repeats))
@@ -0,0 +1,278 @@
+"""Crawl every Flip.kz category listed in genres.txt in parallel.
+
+Each category gets its own FlipBooksScraper; all of them share one HTTP
+session (one connection pool) and one global rate limit. Output follows the
+layout the cleaning notebook reads:
+
+    <output_root>/<category>/flip_books_<category>.csv
+
+Covers from every category go to one content-addressed store,
+``<output_root>/images/``, so a book listed in several categories is
+downloaded once. With ``--archive`` every response is recorded to an HTTP
+archive; ``--replay`` re-runs the crawl from that archive without the network.
+``--cover-tensors`` also decodes every cover once into 224x224 uint8 shards
+under ``<output_root>/cover_tensors/`` for the embedding and training stages.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from flip_book_crawl_queue import CrawlQueue
+from flip_book_crawl_stats import CrawlStats, format_stage_report
+from flip_book_data_scrapping import FlipBooksScraper, RateLimiter, connection_pool_stats, create_session
+from flip_book_http_archive import HttpArchive
+from flip_book_image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+GENRES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'genres.txt')
+BASE_URL = "https://www.flip.kz"
+CATALOG_URL = "{base_url}/catalog?subsection={subsection}"
+
+# Category folder names the cleaning stage reads, shared with flip_book_data_clean_prepare
+CATEGORIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'categories.json')
+with open(CATEGORIES_PATH, encoding='utf-8') as categories_file:
+    CATEGORY_MAPPING: Dict[str, int] = json.load(categories_file)
+
+
+def read_genres(genres_path: str = GENRES_PATH) -> Dict[str, int]:
+    """Parse genres.txt, e.g. ``{ Fantasy : 134, Education, Textbooks : 279 }``"""
+    with open(genres_path, encoding='utf-8') as genres_file:
+        text = genres_file.read()
+    # Entries are separated by ",", which can also appear inside a genre name
+    return {name.strip().lstrip(',').strip(): int(subsection)
+            for name, subsection in re.findall(r'([^{}:\d]+?)\s*:\s*(\d+)', text)}
+
+
+def load_category_mapping(genres_path: str = GENRES_PATH) -> Dict[str, int]:
+    """Map category folder names to subsections for every genre in genres.txt
+
+    Folder names follow the cleaning stage's category names; a genre missing
+    from that mapping gets a slug of its own name.
+    """
+    category_by_subsection = {subsection: category for category, subsection in CATEGORY_MAPPING.items()}
+    mapping = {}
+    for name, subsection in read_genres(genres_path).items():
+        category = category_by_subsection.get(subsection)
+        if not category:
+            category = re.sub(r'\W+', '_', name.lower()).strip('_')
+        mapping[category] = subsection
+    return mapping
+
+
+def crawl_category(category: str, subsection: int, output_root: str, session, rate_limiter: RateLimiter,
+                   image_store: ImageStore, max_pages: int, resume: bool, base_url: str = BASE_URL,
+                   archive: HttpArchive = None, replay: bool = False, refresh: bool = False,
+                   cover_tensors=None, lazy_details: bool = False, stats: CrawlStats = None,
+                   typed_output: bool = False, deferred_queue_path: str = None) -> Dict:
+    """Crawl one category into its own folder and measure its throughput
+
+    With ``refresh`` only the catalog pages are walked to update prices of the
+    category's existing dataset, see ``FlipBooksScraper.refresh_prices``;
+    ``lazy_details`` skips detail pages of books the dataset already describes;
+    with ``deferred_queue_path`` the other detail pages are queued in that crawl
+    queue instead of fetched.
+    The scraper's stage timings are added to ``stats`` when given.
+    """
+    output_dir = os.path.join(output_root, category)
+    scraper = FlipBooksScraper(base_url, session=session, rate_limiter=rate_limiter, image_store=image_store,
+                               archive=archive, replay=replay, cover_tensors=cover_tensors)
+    catalog_url = CATALOG_URL.format(base_url=base_url, subsection=subsection)
+    csv_output_path = os.path.join(output_dir, f"flip_books_{category}.csv")
+
+    start = time.perf_counter()
+    if refresh:
+        result = scraper.refresh_prices(catalog_url, output_dir, max_pages, csv_output_path)
+    else:
+        # One connection per category thread, SQLite connections are not shared between threads
+        deferred_queue = CrawlQueue(deferred_queue_path) if deferred_queue_path else None
+        try:
+            result = scraper.run_scraper(
+                catalog_url=catalog_url,
+                output_dir=output_dir,
+                max_pages=max_pages,
+                csv_output_path=csv_output_path,
+                resume=resume,
+                lazy_details=lazy_details,
+                typed_output=typed_output,
+                deferred_queue=deferred_queue,
+            )
+        finally:
+            if deferred_queue is not None:
+                deferred_queue.close()
+    elapsed = time.perf_counter() - start
+    if stats is not None:
+        stats.merge(scraper.stats)
+
+    return {
+        'category': category,
+        'subsection': subsection,
+        'books': result['books_this_run'],
+        'total_books': result['total_books'],
+        'requests': result['requests_made'],
+        'requests_saved': result.get('requests_saved', 0),
+        'requests_avoided': result.get('requests_avoided', 0),
+        'detail_fetch_ratio': result.get('detail_fetch_ratio', 0.0),
+        'detail_pages_deferred': result.get('detail_pages_deferred', 0),
+        'seconds': elapsed,
+        'books_per_minute': result['books_this_run'] * 60 / elapsed if elapsed else 0.0,
+        'requests_per_second': result['requests_made'] / elapsed if elapsed else 0.0,
+        'images_stored': result['successful_image_downloads'] + result['images_reused'],
+        'images_deduplicated': result['images_reused'] + result['duplicate_image_downloads'],
+        'image_bytes_saved': result['image_bytes_saved'],
+        'csv_file': result['csv_file'],
+    }
+
+
+def run_all_categories(output_root: str, categories: Dict[str, int] = None, workers: int = 4,
+                       requests_per_second: float = 2.0, max_pages: int = 50, resume: bool = False,
+                       base_url: str = BASE_URL, archive_path: str = None, replay: bool = False,
+                       refresh: bool = False, cover_tensors: bool = False, lazy_details: bool = False,
+                       typed_output: bool = False, deferred_queue_path: str = None) -> Dict:
+    """Crawl all categories with parallel workers under one global rate budget
+
+    ``archive_path`` records every response there, or with ``replay`` serves
+    them from it instead of the network. ``refresh`` updates prices of the
+    existing datasets instead of crawling them again. ``cover_tensors`` also
+    writes every cover into model-ready tensor shards. ``lazy_details`` skips
+    detail pages of books the existing datasets already describe; with
+    ``deferred_queue_path`` the rest are queued there for ``flip_book_crawl_queue.py work``.
+    ``typed_output`` also writes each category's books with parsed numeric fields.
+    """
+    categories = categories or load_category_mapping()
+    archive = HttpArchive(archive_path, 'r' if replay else 'a') if archive_path else None
+    # Every worker can have a page fetch in flight, keep enough pooled connections for all of them
+    session = create_session(pool_size=workers)
+    rate_limiter = RateLimiter(requests_per_second, burst=workers)
+    image_store = ImageStore(os.path.join(output_root, 'images'))
+    tensor_shards = None
+    if cover_tensors:
+        # numpy and Pillow are only needed for this stage
+        from flip_book_image_tensors import CoverTensorShards
+        tensor_shards = CoverTensorShards(os.path.join(output_root, 'cover_tensors'))
+
+    logger.info("Crawling %d categories with %d workers at %s req/s", len(categories), workers, requests_per_second)
+    stats = CrawlStats()
+    start = time.perf_counter()
+    reports: List[Dict] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(crawl_category, category, subsection, output_root, session,
+                            rate_limiter, image_store, max_pages, resume, base_url, archive, replay, refresh,
+                            tensor_shards, lazy_details, stats, typed_output, deferred_queue_path): category
+            for category, subsection in categories.items()
+        }
+        for future in as_completed(futures):
+            category = futures[future]
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                logger.error("Category %s failed: %s", category, e)
+                reports.append({'category': category, 'error': str(e)})
+    elapsed = time.perf_counter() - start
+    image_store.close()
+    if archive is not None:
+        archive.close()
+    if tensor_shards is not None:
+        tensor_shards.close()
+
+    books = sum(report.get('books', 0) for report in reports)
+    requests_made = sum(report.get('requests', 0) for report in reports)
+    images_stored = sum(report.get('images_stored', 0) for report in reports)
+    images_deduplicated = sum(report.get('images_deduplicated', 0) for report in reports)
+    return {
+        'output_root': output_root,
+        'categories': sorted(reports, key=lambda report: report['category']),
+        'books': books,
+        'requests': requests_made,
+        'requests_saved': sum(report.get('requests_saved', 0) for report in reports),
+        'requests_avoided': sum(report.get('requests_avoided', 0) for report in reports),
+        'detail_pages_deferred': sum(report.get('detail_pages_deferred', 0) for report in reports),
+        'seconds': elapsed,
+        'books_per_minute': books * 60 / elapsed if elapsed else 0.0,
+        'requests_per_second': requests_made / elapsed if elapsed else 0.0,
+        'image_dedup_ratio': images_deduplicated / images_stored if images_stored else 0.0,
+        'image_bytes_saved': sum(report.get('image_bytes_saved', 0) for report in reports),
+        'connection_pool': connection_pool_stats(session),
+        'cover_tensor_rows': len(tensor_shards) if tensor_shards is not None else 0,
+        'stats': stats.report(),
+    }
+
+
+def print_throughput(report: Dict):
+    print(f"\n=== CRAWL THROUGHPUT ===")
+    for category in report['categories']:
+        if 'error' in category:
+            print(f"{category['category']:<12} FAILED: {category['error']}")
+            continue
+        print(f"{category['category']:<12} {category['books']:>6} books {category['requests']:>7} requests "
+              f"{category['seconds']:>9.1f} s {category['books_per_minute']:>8.1f} books/min "
+              f"{category['requests_per_second']:>6.2f} req/s {category['detail_fetch_ratio']:>6.1%} details fetched")
+    print(f"{'TOTAL':<12} {report['books']:>6} books {report['requests']:>7} requests "
+          f"{report['seconds']:>9.1f} s {report['books_per_minute']:>8.1f} books/min "
+          f"{report['requests_per_second']:>6.2f} req/s")
+    if report['requests_avoided']:
+        print(f"Requests avoided by end-of-catalog detection and URL dedup: {report['requests_avoided']}")
+    if report['detail_pages_deferred']:
+        print(f"Detail pages deferred to the crawl queue: {report['detail_pages_deferred']}")
+    if report['requests_saved']:
+        print(f"Requests saved by the price refresh: {report['requests_saved']} "
+              f"({(report['requests'] + report['requests_saved']) / max(report['requests'], 1):.1f}x fewer)")
+    print(f"Image dedup ratio: {report['image_dedup_ratio']:.1%}, {report['image_bytes_saved']} bytes saved")
+    pool = report['connection_pool']
+    print(f"Connections: {pool['connections_opened']} opened for {pool['requests_sent']} requests "
+          f"({pool['reuse_ratio']:.1%} reused)")
+    print(format_stage_report(report['stats']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl all Flip.kz categories from genres.txt")
+    parser.add_argument('output_root', help="directory that receives one folder per category")
+    parser.add_argument('--genres', default=GENRES_PATH, help="subsection map, defaults to the repo's genres.txt")
+    parser.add_argument('--categories', nargs='*', help="crawl only these categories")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2.0, help="global request budget, requests per second")
+    parser.add_argument('--max-pages', type=int, default=50)
+    parser.add_argument('--resume', action='store_true',
+                        help="continue from existing checkpoints; completed categories are skipped")
+    parser.add_argument('--report', help="also write the throughput and stage timing report to this JSON file")
+    parser.add_argument('--log-level', default='INFO', help="DEBUG shows every fetch, WARNING only problems")
+    parser.add_argument('--archive', help="record every HTTP response to this archive file")
+    parser.add_argument('--replay', action='store_true', help="serve responses from --archive instead of the network")
+    parser.add_argument('--cover-tensors', action='store_true',
+                        help="also decode covers into 224x224 uint8 tensor shards")
+    parser.add_argument('--lazy-details', action='store_true',
+                        help="fetch detail pages only for books missing description or publisher")
+    parser.add_argument('--defer-details', metavar='QUEUE',
+                        help="with --lazy-details, queue the detail pages of books missing description or "
+                             "publisher in this crawl queue (flip_book_crawl_queue.py) instead of fetching them")
+    parser.add_argument('--typed', action='store_true',
+                        help="also write books with parsed numeric fields to <category>/typed/")
+    parser.add_argument('--refresh', action='store_true',
+                        help="only update prices and availability of the existing datasets")
+    args = parser.parse_args()
+    if args.replay and not args.archive:
+        parser.error("--replay needs --archive")
+    if args.defer_details and not args.lazy_details:
+        parser.error("--defer-details needs --lazy-details")
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    categories = load_category_mapping(args.genres)
+    if args.categories:
+        categories = {category: categories[category] for category in args.categories}
+
+    report = run_all_categories(args.output_root, categories, args.workers, args.rate,
+                                args.max_pages, resume=args.resume,
+                                archive_path=args.archive, replay=args.replay, refresh=args.refresh,
+                                cover_tensors=args.cover_tensors, lazy_details=args.lazy_details,
+                                typed_output=args.typed, deferred_queue_path=args.defer_details)
+    print_throughput(report)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
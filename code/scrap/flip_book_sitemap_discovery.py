@@ -0,0 +1,182 @@
+"""Discover Flip.kz books from sitemaps or product-id ranges instead of catalog pages.
+
+Paging through ``catalog?subsection=...&page=N`` costs a catalog fetch per
+page of cards. This mode collects product URLs (``catalog?prod=<id>``)
+straight from the sitemap files, or enumerates a known range of product ids,
+drops the ones already in the dataset and sends the rest to detail
+extraction. Books land in the usual ``books_data.jsonl`` (and CSV) layout.
+
+    python flip_book_sitemap_discovery.py data/all --sitemap https://www.flip.kz/sitemap.xml
+    python flip_book_sitemap_discovery.py data/all --ids 1000000-1000500
+"""
+import argparse
+import gzip
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, Set
+
+from flip_book_crawl_stats import CrawlStats, format_stage_report
+from flip_book_data_scrapping import (CrawlCheckpoint, FlipBooksScraper, RateLimiter, StreamingBookWriter,
+                                      read_books_jsonl)
+from flip_book_image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_URL_PATTERN = re.compile(r'[?&]prod=(\d+)')
+PRODUCT_URL = "{base_url}/catalog?prod={prod_id}"
+
+
+def parse_sitemap(content: bytes):
+    """Return ``(page_urls, child_sitemap_urls)`` of a sitemap or sitemap index"""
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    root = ET.fromstring(content)
+    # Sitemaps are namespaced; match on the local tag name only
+    locs = [elem.text.strip() for elem in root.iter() if elem.tag.rsplit('}', 1)[-1] == 'loc' and elem.text]
+    if root.tag.rsplit('}', 1)[-1] == 'sitemapindex':
+        return [], locs
+    return locs, []
+
+
+def iter_sitemap_product_urls(scraper: FlipBooksScraper, sitemap_url: str) -> Iterator[str]:
+    """Yield product URLs from a sitemap, following sitemap indexes"""
+    pending = [sitemap_url]
+    seen_sitemaps = set()
+    while pending:
+        url = pending.pop()
+        if url in seen_sitemaps:
+            continue
+        seen_sitemaps.add(url)
+        try:
+            scraper._wait_for_budget()
+            response = scraper._request(url)
+            response.raise_for_status()
+            with scraper.stats.stage('extract'):
+                page_urls, child_sitemaps = parse_sitemap(response.content)
+        except Exception as e:
+            logger.warning("Error reading sitemap %s: %s", url, e)
+            continue
+        pending.extend(child_sitemaps)
+        for page_url in page_urls:
+            if PRODUCT_URL_PATTERN.search(page_url):
+                yield page_url
+
+
+def product_urls_from_ids(base_url: str, first_id: int, last_id: int) -> Iterator[str]:
+    """Product URLs for every id in ``[first_id, last_id]``; unused ids are skipped when fetched"""
+    for prod_id in range(first_id, last_id + 1):
+        yield PRODUCT_URL.format(base_url=base_url, prod_id=prod_id)
+
+
+def canonical_product_url(base_url: str, url: str) -> str:
+    """Sitemaps and catalog cards spell product URLs differently; key both by product id"""
+    match = PRODUCT_URL_PATTERN.search(url)
+    return PRODUCT_URL.format(base_url=base_url, prod_id=match.group(1)) if match else url
+
+
+def known_product_urls(scraper: FlipBooksScraper, output_dir: str, checkpoint: CrawlCheckpoint) -> Set[str]:
+    jsonl_path = os.path.join(output_dir, 'books_data.jsonl')
+    known = {canonical_product_url(scraper.base_url, url) for url in checkpoint.processed_urls}
+    if os.path.exists(jsonl_path):
+        known.update(canonical_product_url(scraper.base_url, book.book_url) for book in read_books_jsonl(jsonl_path))
+    return known
+
+
+def crawl_products(scraper: FlipBooksScraper, product_urls: Iterable[str], output_dir: str,
+                   csv_output_path: str = None, flush_every: int = 10) -> Dict:
+    """Scrape every product URL not already in ``output_dir``'s dataset
+
+    Ids whose page has no title are not books; they are remembered in the
+    checkpoint's URL log so a later run does not probe them again. Pages that
+    could not be fetched at all are counted as ``fetch_failures`` and left for
+    the next run to retry.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = CrawlCheckpoint(os.path.join(output_dir, 'discovery_checkpoint.json'), 'discovery')
+    checkpoint.load()
+    known = known_product_urls(scraper, output_dir, checkpoint)
+    image_store = scraper.image_store or ImageStore(os.path.join(output_dir, 'images'))
+    requests_before = scraper.requests_made
+    # The sitemaps are read lazily from ``product_urls``, so they count towards this run
+    scraper.stats = CrawlStats()
+
+    discovered = 0
+    already_known = 0
+    books_written = 0
+    missing = 0
+    fetch_failures = 0
+    with StreamingBookWriter(os.path.join(output_dir, 'books_data.jsonl'), csv_output_path, flush_every) as writer:
+        for url in product_urls:
+            url = canonical_product_url(scraper.base_url, url)
+            discovered += 1
+            if url in known:
+                already_known += 1
+                continue
+            known.add(url)
+
+            soup = scraper.get_page(url)
+            if soup is None:
+                fetch_failures += 1
+                scraper._pause(1, 3)
+                continue
+            with scraper.stats.stage('extract'):
+                book = scraper.parse_book_page(soup, url)
+            if book.title:
+                book, _, _ = scraper.scrape_book({'book_url': url}, url, image_store, book)
+            with scraper.stats.stage('write'):
+                checkpoint.mark_processed(url)
+                if not book.title:
+                    missing += 1
+                else:
+                    books_written += 1
+                    if writer.write(book):
+                        checkpoint.save()
+            scraper._pause(1, 3)
+    checkpoint.close()
+    if not scraper.image_store:
+        image_store.close()
+
+    return {
+        'output_dir': output_dir,
+        'jsonl_file': writer.jsonl_file.name,
+        'csv_file': csv_output_path,
+        'urls_discovered': discovered,
+        'urls_already_known': already_known,
+        'books_this_run': books_written,
+        'missing_products': missing,
+        'fetch_failures': fetch_failures,
+        'requests_made': scraper.requests_made - requests_before,
+        'stats': scraper.stats.report(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discover Flip.kz books from sitemaps or product-id ranges")
+    parser.add_argument('output_dir')
+    parser.add_argument('--sitemap', action='append', default=[], help="sitemap or sitemap index URL, repeatable")
+    parser.add_argument('--ids', help="inclusive product id range, e.g. 1000000-1000500")
+    parser.add_argument('--base-url', default="https://www.flip.kz")
+    parser.add_argument('--csv', help="also append the books to this CSV")
+    parser.add_argument('--rate', type=float, default=2.0, help="requests per second")
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    if not args.sitemap and not args.ids:
+        parser.error("give --sitemap and/or --ids")
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    scraper = FlipBooksScraper(args.base_url, rate_limiter=RateLimiter(args.rate))
+
+    def product_urls():
+        for sitemap_url in args.sitemap:
+            yield from iter_sitemap_product_urls(scraper, sitemap_url)
+        if args.ids:
+            first_id, last_id = (int(part) for part in args.ids.split('-'))
+            yield from product_urls_from_ids(args.base_url, first_id, last_id)
+
+    result = crawl_products(scraper, product_urls(), args.output_dir, args.csv)
+    print(f"{result['urls_discovered']} product URLs discovered, {result['urls_already_known']} already known, "
+          f"{result['books_this_run']} books written, {result['missing_products']} missing, "
+          f"{result['fetch_failures']} fetch failures (retried next run), {result['requests_made']} requests")
+    print(format_stage_report(result['stats']))
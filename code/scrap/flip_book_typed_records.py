@@ -0,0 +1,236 @@
+"""Typed book records: numeric fields parsed once, at scrape time.
+
+``BookInfo`` keeps the page text ("5 172 ₸", "-20%", "320 стр."), which the
+cleaning stage used to re-parse on every run. ``to_typed`` converts a book
+into a ``TypedBookInfo`` with ints and floats, and ``TypedBookWriter`` appends
+those records column by column:
+
+    <directory>/meta.json          row count, column names and dtypes
+    <directory>/<field>.int64      raw native-endian int64, one value per row
+    <directory>/<field>.float64    raw native-endian float64, one value per row
+    <directory>/text.jsonl         the text columns, one JSON list per row
+
+A numeric column loads without any text processing, e.g.
+``np.fromfile('typed/price_original.int64', dtype=np.int64, count=rows)``.
+Missing ints are -1 and missing floats NaN; a missing discount is 0, as in
+the cleaning notebook.
+"""
+import json
+import math
+import os
+import re
+import sys
+from array import array
+from dataclasses import dataclass, fields
+from typing import Dict, Optional
+
+
+INT_MISSING = -1
+INT_FIELDS = ('price_current', 'price_original', 'discount', 'pages', 'reviews_count')
+FLOAT_FIELDS = ('height', 'width', 'thickness', 'rating')
+
+# Same number pattern the cleaning notebook extracts prices with
+GROUPED_INT_PATTERN = re.compile(r'\d[\d\s]*')
+INT_PATTERN = re.compile(r'\d+')
+FLOAT_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def parse_price(text: str) -> int:
+    """``"5 172 ₸"`` -> 5172"""
+    match = GROUPED_INT_PATTERN.search(text or '')
+    return int(re.sub(r'\s+', '', match.group())) if match else INT_MISSING
+
+
+def parse_discount(text: str) -> int:
+    """``"-20%"`` -> 20; no discount is 0"""
+    match = INT_PATTERN.search(text or '')
+    return int(match.group()) if match else 0
+
+
+def parse_int(text: str) -> int:
+    """``"320 стр."`` -> 320"""
+    match = INT_PATTERN.search(text or '')
+    return int(match.group()) if match else INT_MISSING
+
+
+def parse_float(text: str) -> float:
+    """``"4.5"``, ``"12,5 мм"`` -> 4.5, 12.5"""
+    match = FLOAT_PATTERN.search(text or '')
+    return float(match.group().replace(',', '.')) if match else math.nan
+
+
+@dataclass
+class TypedBookInfo:
+    """A BookInfo with its numeric fields parsed"""
+    title: str = ""
+    price_current: int = INT_MISSING
+    price_original: int = INT_MISSING
+    discount: int = 0
+    publisher: str = ""
+    language: str = ""
+    binding: str = ""
+    publication_date: str = ""
+    isbn: str = ""
+    pages: int = INT_MISSING
+    height: float = math.nan
+    width: float = math.nan
+    thickness: float = math.nan
+    product_code: str = ""
+    availability: str = ""
+    rating: float = math.nan
+    reviews_count: int = INT_MISSING
+    description: str = ""
+    main_image_url: str = ""
+    additional_images: str = ""
+    local_image_path: str = ""
+    book_url: str = ""
+
+
+TYPED_FIELDS = [f.name for f in fields(TypedBookInfo)]
+TEXT_FIELDS = [name for name in TYPED_FIELDS if name not in INT_FIELDS and name not in FLOAT_FIELDS]
+
+
+def to_typed(book) -> TypedBookInfo:
+    """Parse the numeric fields of a ``BookInfo``"""
+    return TypedBookInfo(
+        title=book.title,
+        price_current=parse_price(book.price_current),
+        price_original=parse_price(book.price_original),
+        discount=parse_discount(book.discount),
+        publisher=book.publisher,
+        language=book.language,
+        binding=book.binding,
+        publication_date=book.publication_date,
+        isbn=book.isbn,
+        pages=parse_int(book.pages),
+        height=parse_float(book.height),
+        width=parse_float(book.width),
+        thickness=parse_float(book.thickness),
+        product_code=book.product_code,
+        availability=book.availability,
+        rating=parse_float(book.rating),
+        reviews_count=parse_int(book.reviews_count),
+        description=book.description,
+        main_image_url=book.main_image_url,
+        additional_images='; '.join(book.additional_images),
+        local_image_path=book.local_image_path,
+        book_url=book.book_url,
+    )
+
+
+def _column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.{'int64' if name in INT_FIELDS else 'float64'}")
+
+
+class TypedBookWriter:
+    """Append typed books as column files, buffering ``flush_every`` rows in arrays"""
+
+    def __init__(self, directory: str, flush_every: int = 10, append: bool = True):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.text_path = os.path.join(directory, 'text.jsonl')
+        self.flush_every = flush_every
+        os.makedirs(directory, exist_ok=True)
+
+        self.rows = 0
+        if append and os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding='utf-8') as meta_file:
+                self.rows = json.load(meta_file)['rows']
+        self._truncate_to_rows()
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self.int_columns = {name: array('q') for name in INT_FIELDS}
+        self.float_columns = {name: array('d') for name in FLOAT_FIELDS}
+        self.text_rows = []
+
+    def _truncate_to_rows(self):
+        """Drop anything written after the last flush recorded in meta.json"""
+        for name in INT_FIELDS + FLOAT_FIELDS:
+            path = _column_path(self.directory, name)
+            with open(path, 'ab') as column_file:
+                column_file.truncate(self.rows * 8)
+        kept = []
+        if self.rows and os.path.exists(self.text_path):
+            with open(self.text_path, encoding='utf-8') as text_file:
+                for line in text_file:
+                    if len(kept) == self.rows:
+                        break
+                    kept.append(line)
+        with open(self.text_path, 'w', encoding='utf-8') as text_file:
+            text_file.writelines(kept)
+
+    def write(self, book: TypedBookInfo) -> bool:
+        """Buffer one book; returns True when this write triggered a flush"""
+        for name, column in self.int_columns.items():
+            column.append(getattr(book, name))
+        for name, column in self.float_columns.items():
+            column.append(getattr(book, name))
+        self.text_rows.append([getattr(book, name) for name in TEXT_FIELDS])
+        if len(self.text_rows) >= self.flush_every:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        if not self.text_rows:
+            return
+        for name, column in list(self.int_columns.items()) + list(self.float_columns.items()):
+            with open(_column_path(self.directory, name), 'ab') as column_file:
+                column.tofile(column_file)
+        with open(self.text_path, 'a', encoding='utf-8') as text_file:
+            for row in self.text_rows:
+                text_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.rows += len(self.text_rows)
+
+        # meta.json is the commit point: readers and a resumed writer trust only its row count
+        meta = {
+            'rows': self.rows,
+            'byteorder': sys.byteorder,
+            'int_fields': list(INT_FIELDS),
+            'float_fields': list(FLOAT_FIELDS),
+            'text_fields': TEXT_FIELDS,
+            'int_missing': INT_MISSING,
+        }
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_path, self.meta_path)
+        self._reset_buffers()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_typed_columns(directory: str, columns: Optional[list] = None) -> Dict:
+    """Load typed columns: numeric ones as ``array`` objects, text ones as lists"""
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+    rows = meta['rows']
+    columns = columns or TYPED_FIELDS
+    result = {}
+    for name in columns:
+        if name in TEXT_FIELDS:
+            continue
+        column = array('q' if name in INT_FIELDS else 'd')
+        with open(_column_path(directory, name), 'rb') as column_file:
+            column.fromfile(column_file, rows)
+        result[name] = column
+
+    text_columns = [name for name in columns if name in TEXT_FIELDS]
+    if text_columns:
+        positions = [TEXT_FIELDS.index(name) for name in text_columns]
+        values = {name: [] for name in text_columns}
+        with open(os.path.join(directory, 'text.jsonl'), encoding='utf-8') as text_file:
+            for _, line in zip(range(rows), text_file):
+                row = json.loads(line)
+                for name, position in zip(text_columns, positions):
+                    values[name].append(row[position])
+        result.update(values)
+    return result